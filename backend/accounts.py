@@ -0,0 +1,77 @@
+import random
+import time
+from sqlalchemy.exc import OperationalError
+from database import db
+
+# Attempts for a unit of work that keeps hitting "database is locked"
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 0.02
+
+class InsufficientFunds(Exception):
+    pass
+
+class StateConflict(Exception):
+    pass
+
+# Balance changes are single conditional UPDATE statements evaluated by the database,
+# never read-modify-write in Python, so concurrent requests cannot lose updates or
+# overdraw an account.
+def _apply(model, account_id, delta, condition=None):
+    conditions = [model.id == account_id]
+    if condition is not None:
+        conditions.append(condition)
+
+    row = db.session.execute(
+        db.update(model)
+        .where(*conditions)
+        .values(account_balance=model.account_balance + delta)
+        .returning(model.account_balance)
+        .execution_options(synchronize_session='fetch')
+    ).first()
+    if row is not None:
+        return row.account_balance
+
+    exists = db.session.execute(db.select(model.id).where(model.id == account_id)).first()
+    if exists is None:
+        raise LookupError(f'{model.__name__} {account_id} not found')
+    raise InsufficientFunds(f'{model.__name__} {account_id} has insufficient balance')
+
+# Debit only if the balance covers the amount; returns the new balance
+def debit(model, account_id, amount):
+    return _apply(model, account_id, -amount, model.account_balance >= amount)
+
+def credit(model, account_id, amount):
+    return _apply(model, account_id, amount)
+
+# Move money between two accounts inside the current transaction
+def transfer(source_model, source_id, target_model, target_id, amount):
+    debit(source_model, source_id, amount)
+    return credit(target_model, target_id, amount)
+
+# Atomically move a row from one status to another; fails if someone else got there first
+def transition(model, row_id, from_statuses, **values):
+    claimed = db.session.execute(
+        db.update(model)
+        .where(model.id == row_id, model.status.in_(from_statuses))
+        .values(**values)
+        .execution_options(synchronize_session='fetch')
+    ).rowcount
+    if not claimed:
+        raise StateConflict(f'{model.__name__} {row_id} is no longer {" or ".join(from_statuses)}')
+
+# Run `work` and commit, retrying the whole unit with jittered exponential backoff when
+# SQLite reports the database as locked. Any other error rolls back and propagates.
+def run_transaction(work, max_attempts=MAX_ATTEMPTS):
+    for attempt in range(max_attempts):
+        try:
+            result = work()
+            db.session.commit()
+            return result
+        except OperationalError as e:
+            db.session.rollback()
+            if 'locked' not in str(e.orig) or attempt == max_attempts - 1:
+                raise
+            time.sleep(BACKOFF_SECONDS * (2 ** attempt) * (1 + random.random()))
+        except Exception:
+            db.session.rollback()
+            raise
@@ -1,66 +1,125 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, Response, request, jsonify, send_file, session, stream_with_context
 from flask_cors import CORS
 from datetime import datetime, timedelta
 import os
-import hashlib
 import uuid
 import json
 import pytz
-from database import db
-from models import User, Lender, Borrower, Collateral, Loan, Block
+from database import db, create_schema
+from models import User, Lender, Borrower, Collateral, CollateralJob, Loan, LoanSchedule
+from ledger import block_payload, iter_blocks, ledger_appender, normalize_ledger_time, verify_chain
+from outbox import ledger_writer, record
+from merkle import build_proofs
+from accounts import InsufficientFunds, StateConflict, credit, debit, run_transaction, transfer, transition
+from matching import lender_book
+from cache import cached, invalidates, response_cache
+from collateral_jobs import collateral_workers, enqueue, job_to_dict
+from collateral_store import add_reference, ingest, release_reference
+from storage import init_storage, read_only
+from queries import InvalidQuery, list_borrowers, list_lenders, list_loans
+from portfolio import contributions, get_summary, record_change
+from serializers import BORROWER, BORROWER_LOAN, LENDER, LENDER_LOAN, LOAN, LOAN_REQUEST
+from schedules import SCHEDULE_TYPES, Overpayment, apply_payment, create_schedules, outstanding, schedule_to_dict
 
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///defi_loan.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///defi_loan.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLITE_PROFILE'] = 'production'  # See storage.PROFILES; 'default' keeps SQLite's defaults
+app.config['SQLITE_READ_POOL_SIZE'] = 4  # Connections serving read-only endpoints
 app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['COLLATERAL_WORKERS'] = 2  # Threads processing uploaded collateral; 0 leaves it to collateral_worker.py
+app.config['COLLATERAL_MAX_AGE_SECONDS'] = 365 * 24 * 3600  # Stored files never change, so browsers may keep them
+app.config['LEDGER_FULL_VERIFY_INTERVAL_HOURS'] = 24  # Periodic full re-audit of checkpointed blocks
+app.config['LEDGER_VERIFY_WORKERS'] = 1  # Processes used for full verification inside a request
+app.config['LEDGER_PAGE_SIZE'] = 500  # Default /api/ledger page size
+app.config['LEDGER_MAX_PAGE_SIZE'] = 5000
+app.config['MERKLE_SIGNING_KEY'] = None  # Falls back to SECRET_KEY
+app.config['LEDGER_SEGMENT_FOLDER'] = 'ledger_segments'  # Archived (cold) ledger blocks
+app.config['LOAN_BATCH_MAX_SIZE'] = 1000  # Decisions accepted by /api/loans/batch/approve
+app.config['LOAN_AUTO_APPROVE'] = False  # Approve new requests with the matched lender right away
+app.config['LOAN_TERM_DAYS'] = 30  # Due date is this many days after disbursement
+app.config['LOAN_MAX_INSTALLMENTS'] = 360
+app.config['LIST_PAGE_SIZE'] = 100  # Default page size of the lender, borrower and loan lists
+app.config['LIST_MAX_PAGE_SIZE'] = 1000
+app.config['RESPONSE_CACHE_MAX_ENTRIES'] = 1024
+app.config['RESPONSE_CACHE_MAX_AGE_SECONDS'] = 60  # Bounds staleness from writes made by other processes
 
 # Enable CORS
 CORS(app, supports_credentials=True)
 
 # Initialize database
-db.init_app(app)
+init_storage(app, db)
 
 # Create uploads directory if it doesn't exist
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
 
+# Loan states from which a repayment is accepted
+REPAYABLE_STATUSES = ['approved', 'disbursed', 'overdue']
+
 # Helper function to get IST timezone
 def get_ist_time():
     ist = pytz.timezone('Asia/Kolkata')
     return datetime.now(ist)
 
-# Helper function to create a new block in the ledger
+# Helper function to create a new block in the ledger. The block is recorded in the outbox as
+# part of the current transaction and appended to the chain by the ledger writer after commit.
 def create_block(unique_data_id, actor, event_type, metadata=None):
-    # Get the previous block's hash
-    prev_block = Block.query.order_by(Block.id.desc()).first()
-    prev_hash = prev_block.hash if prev_block else "0" * 64
-    
-    # Create new block data
-    timestamp = get_ist_time().isoformat()
-    nonce = 0
-    
-    # Generate hash
-    data_string = prev_hash + unique_data_id + timestamp + str(nonce)
-    hash_result = hashlib.sha256(data_string.encode()).hexdigest()
-    
-    # Create and save block
-    block = Block(
-        unique_data_id=unique_data_id,
-        prev_hash=prev_hash,
-        hash=hash_result,
-        timestamp=timestamp,
-        nonce=nonce,
-        actor=actor,
-        event_type=event_type,
-        block_metadata=json.dumps(metadata) if metadata else None
+    record(unique_data_id, actor, event_type, metadata)
+
+# Approve a loan and move its principal from the lender to the borrower inside the current
+# transaction. Raises StateConflict if the loan was already decided and InsufficientFunds if
+# the lender's balance doesn't cover it.
+def disburse_loan(loan, lender, borrower, interest_rate=None, schedule=None):
+    # Claim the loan first so two concurrent approvals cannot both disburse it
+    disbursed_at = get_ist_time()
+    interest_rate = interest_rate if interest_rate is not None else lender.interest_rate
+    transition(Loan, loan.id, ['requested'], status='approved', lender_id=lender.id, interest_rate=interest_rate,
+               disbursed_at=disbursed_at, due_date=disbursed_at + timedelta(days=app.config['LOAN_TERM_DAYS']))
+    
+    # Transfer funds from lender to borrower; the debit only happens if the balance covers it
+    transfer(Lender, lender.id, Borrower, borrower.id, loan.amount)
+    
+    # Installment loans get an amortization schedule; others are repaid in one payment
+    if schedule:
+        schedule_type, installments = schedule
+        create_schedules([{
+            'loan_id': loan.id,
+            'amount': loan.amount,
+            'annual_rate': interest_rate,
+            'installments': installments,
+            'schedule_type': schedule_type
+        }], disbursed_at)
+    
+    # The loan was only requested before, so it contributed nothing to the lender's summary
+    record_change({}, Loan.id == loan.id)
+    
+    # Reduce borrower's credit score when loan is approved (as a form of credit check)
+    # Reduce by 25 points for taking a loan to reflect the risk
+    db.session.execute(
+        db.update(Borrower).where(Borrower.id == borrower.id).values(credit_score=Borrower.credit_score - 25)
     )
-    
-    db.session.add(block)
-    db.session.commit()
-    
-    return block
+
+# Ids taken from a JSON body must be integers (bool is a subclass of int)
+def is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+# Installment terms requested with an approval, as (schedule_type, installments).
+# Returns (None, None) for a single bullet repayment and (None, message) for invalid terms.
+def requested_schedule(data):
+    schedule_type = data.get('schedule_type')
+    if schedule_type is None:
+        return None, None
+    if schedule_type not in SCHEDULE_TYPES:
+        return None, f"schedule_type must be one of {', '.join(SCHEDULE_TYPES)}"
+    
+    installments = data.get('installments')
+    max_installments = app.config['LOAN_MAX_INSTALLMENTS']
+    if not isinstance(installments, int) or isinstance(installments, bool) or not 1 <= installments <= max_installments:
+        return None, f'installments must be between 1 and {max_installments}'
+    return (schedule_type, installments), None
 
 # Authentication routes
 @app.route('/api/login', methods=['POST'])
@@ -80,6 +139,7 @@ def login():
         if wallet_address:
             user.wallet_address = wallet_address
             db.session.commit()
+            response_cache.bump('lenders', 'borrowers')
         
         return jsonify({
             'success': True,
@@ -101,6 +161,7 @@ def logout():
 
 # Admin-only routes
 @app.route('/api/register', methods=['POST'])
+@invalidates('lenders', 'borrowers', 'ledger')
 def register_user():
     # Check if user is admin
     if session.get('role') != 'admin':
@@ -131,6 +192,7 @@ def register_user():
             remarks=data.get('remarks', '')
         )
         db.session.add(lender)
+        db.session.flush()
     elif role == 'borrower':
         borrower = Borrower(
             user_id=user.id,
@@ -138,8 +200,6 @@ def register_user():
         )
         db.session.add(borrower)
     
-    db.session.commit()
-    
     # Create block for user creation in blockchain ledger
     unique_data_id = str(uuid.uuid4()) + "_" + get_ist_time().isoformat()
     create_block(unique_data_id, "admin", "User Created", {
@@ -149,62 +209,56 @@ def register_user():
         "email": user.email
     })
     
+    db.session.commit()
+    
+    if role == 'lender':
+        lender_book.refresh_lender(lender.id)
+    
     return jsonify({'success': True, 'message': 'User created successfully'})
 
 @app.route('/api/lenders', methods=['GET'])
+@cached('lenders')
+@read_only
 def get_lenders():
     # Admin, lenders, and borrowers can view lenders
     if not session.get('user_id'):
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    lenders = Lender.query.join(User).all()
-    result = []
-    
-    for lender in lenders:
-        result.append({
-            'id': lender.id,
-            'user_id': lender.user_id,
-            'name': lender.user.name,
-            'email': lender.user.email,
-            'wallet_address': lender.user.wallet_address,
-            'min_amount': lender.min_amount,
-            'max_amount': lender.max_amount,
-            'interest_rate': lender.interest_rate,
-            'account_balance': lender.account_balance,
-            'remarks': lender.remarks,
-            'created_at': lender.created_at.isoformat()
-        })
+    try:
+        lenders, next_cursor = list_lenders(request.args, LENDER)
+    except InvalidQuery as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    return jsonify({'success': True, 'lenders': result})
+    return jsonify({'success': True, 'lenders': LENDER.many(lenders), 'next_cursor': next_cursor})
 
 @app.route('/api/borrowers', methods=['GET'])
+@cached('borrowers')
+@read_only
 def get_borrowers():
     # Only admin can view borrowers
     if session.get('role') != 'admin':
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    borrowers = Borrower.query.join(User).all()
-    result = []
-    
-    for borrower in borrowers:
-        result.append({
-            'id': borrower.id,
-            'user_id': borrower.user_id,
-            'name': borrower.user.name,
-            'email': borrower.user.email,
-            'wallet_address': borrower.user.wallet_address,
-            'credit_score': borrower.credit_score,
-            'account_balance': borrower.account_balance,
-            'created_at': borrower.created_at.isoformat()
-        })
+    try:
+        borrowers, next_cursor = list_borrowers(request.args, BORROWER)
+    except InvalidQuery as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    return jsonify({'success': True, 'borrowers': result})
+    return jsonify({'success': True, 'borrowers': BORROWER.many(borrowers), 'next_cursor': next_cursor})
 
 # Borrower routes
+# Id of the logged-in borrower's borrower record (None for other roles)
+def session_borrower_id():
+    if session.get('role') != 'borrower':
+        return None
+    borrower = Borrower.query.filter_by(user_id=session.get('user_id')).first()
+    return borrower.id if borrower else None
+
 @app.route('/api/borrowers/<int:borrower_id>/collateral', methods=['POST'])
+@invalidates('borrowers', 'ledger')
 def upload_collateral(borrower_id):
-    # Check if user is authorized
-    if session.get('user_id') != borrower_id and session.get('role') != 'admin':
+    # Check if user is authorized (the borrower themselves or admin)
+    if session.get('role') != 'admin' and session_borrower_id() != borrower_id:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
     # Check if file is present
@@ -215,39 +269,172 @@ def upload_collateral(borrower_id):
     if file.filename == '':
         return jsonify({'success': False, 'message': 'No file selected'}), 400
     
-    # Sanitize filename
-    if file.filename:
-        filename = hashlib.md5(file.filename.encode()).hexdigest()[:10] + "_" + file.filename
-    else:
-        filename = hashlib.md5(str(uuid.uuid4()).encode()).hexdigest()[:10] + "_upload"
+    # Stream the file into content-addressed storage; identical files share one blob
+    filename = file.filename or 'upload'
+    content_hash, size, tmp_path = ingest(file.stream, app.config['UPLOAD_FOLDER'])
     
-    # Save file
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
+    try:
+        filepath = add_reference(content_hash, size, tmp_path, app.config['UPLOAD_FOLDER'])
+        
+        # Create collateral record
+        unique_data_id = str(uuid.uuid4()) + "_" + get_ist_time().isoformat()
+        collateral = Collateral(
+            borrower_id=borrower_id,
+            filename=filename,
+            filepath=filepath,
+            content_hash=content_hash,
+            size=size,
+            unique_data_id=unique_data_id
+        )
+        db.session.add(collateral)
+        db.session.flush()
+        # Inspecting the file happens in the background, committed together with the upload
+        job = enqueue(collateral.id)
+        
+        # Create block for collateral upload in blockchain ledger
+        create_block(unique_data_id, f"borrower_{borrower_id}", "Collateral Uploaded", {
+            "collateral_id": collateral.id,
+            "filename": filename,
+            "borrower_id": borrower_id,
+            "content_hash": content_hash,
+            "size": size
+        })
+        db.session.commit()
+    finally:
+        # Left behind only if the upload failed before its file was moved into place
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
     
-    # Create collateral record
-    unique_data_id = str(uuid.uuid4()) + "_" + get_ist_time().isoformat()
-    collateral = Collateral(
-        borrower_id=borrower_id,
-        filename=file.filename or filename,
-        filepath=filepath,
-        unique_data_id=unique_data_id
-    )
+    collateral_workers.start(app, app.config['COLLATERAL_WORKERS'])
+    collateral_workers.wake()
     
-    db.session.add(collateral)
-    db.session.commit()
+    return jsonify({
+        'success': True,
+        'message': 'Collateral uploaded successfully',
+        'collateral_id': collateral.id,
+        'content_hash': content_hash,
+        'job': job_to_dict(job)
+    })
+
+# Admins and the borrower who uploaded a collateral can view it, and so can lenders while the
+# borrower has a loan request open or a loan with them
+def can_view_collateral(collateral):
+    if session.get('role') == 'admin':
+        return True
+    if session.get('role') == 'borrower':
+        return session_borrower_id() == collateral.borrower_id
+    if session.get('role') != 'lender':
+        return False
+    
+    lender = Lender.query.filter_by(user_id=session.get('user_id')).first()
+    if not lender:
+        return False
+    loan = Loan.query.filter(
+        Loan.borrower_id == collateral.borrower_id,
+        db.or_(Loan.status == 'requested', Loan.lender_id == lender.id)
+    ).first()
+    return loan is not None
+
+# Collateral details, including the state of its background processing
+@app.route('/api/collaterals/<int:collateral_id>', methods=['GET'])
+@read_only
+def get_collateral(collateral_id):
+    collateral = Collateral.query.get(collateral_id)
+    if not collateral:
+        return jsonify({'success': False, 'message': 'Collateral not found'}), 404
+    
+    if not can_view_collateral(collateral):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    job = CollateralJob.query.filter_by(collateral_id=collateral_id).order_by(CollateralJob.id.desc()).first()
     
-    # Create block for collateral upload in blockchain ledger
-    create_block(unique_data_id, f"borrower_{borrower_id}", "Collateral Uploaded", {
-        "collateral_id": collateral.id,
-        "filename": file.filename or filename,
-        "borrower_id": borrower_id
+    return jsonify({
+        'success': True,
+        'collateral': {
+            'id': collateral.id,
+            'borrower_id': collateral.borrower_id,
+            'filename': collateral.filename,
+            'content_hash': collateral.content_hash,
+            'size': collateral.size,
+            'uploaded_at': collateral.uploaded_at.isoformat() if collateral.uploaded_at else None,
+            'file_metadata': json.loads(collateral.file_metadata) if collateral.file_metadata else None,
+            'job': job_to_dict(job) if job else None
+        }
     })
+
+# The collateral file itself. Werkzeug streams it through wsgi.file_wrapper (sendfile where the
+# server supports it) and answers Range and If-None-Match requests; the ETag is the content hash.
+@app.route('/api/collaterals/<int:collateral_id>/file', methods=['GET'])
+@read_only
+def get_collateral_file(collateral_id):
+    collateral = Collateral.query.get(collateral_id)
+    if not collateral:
+        return jsonify({'success': False, 'message': 'Collateral not found'}), 404
+    
+    if not can_view_collateral(collateral):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    path = os.path.abspath(collateral.filepath)
+    if not os.path.isfile(path):
+        return jsonify({'success': False, 'message': 'Collateral file is missing'}), 404
+    
+    # Only a type sniffed from the content is trusted; the filename is the uploader's claim
+    metadata = json.loads(collateral.file_metadata) if collateral.file_metadata else {}
+    response = send_file(
+        path,
+        mimetype=metadata.get('content_type') or 'application/octet-stream',
+        download_name=collateral.filename,
+        conditional=True,
+        etag=collateral.content_hash or False,
+        max_age=app.config['COLLATERAL_MAX_AGE_SECONDS']
+    )
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    # Files are content-addressed, so a cached copy never goes stale, but it is not public
+    if collateral.content_hash:
+        response.headers['Cache-Control'] = f"private, max-age={app.config['COLLATERAL_MAX_AGE_SECONDS']}, immutable"
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Delete a collateral (admins and its borrower). Its file goes with the last collateral sharing
+# it; the upload's ledger block stays, and the deletion gets one of its own.
+@app.route('/api/collaterals/<int:collateral_id>', methods=['DELETE'])
+@invalidates('borrowers', 'ledger')
+def delete_collateral(collateral_id):
+    collateral = Collateral.query.get(collateral_id)
+    if not collateral:
+        return jsonify({'success': False, 'message': 'Collateral not found'}), 404
+    
+    if session.get('role') != 'admin' and session_borrower_id() != collateral.borrower_id:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    return jsonify({'success': True, 'message': 'Collateral uploaded successfully'})
+    borrower_id = collateral.borrower_id
+    content_hash = collateral.content_hash
+    unique_data_id = collateral.unique_data_id
+    
+    def delete():
+        deleted = db.session.execute(db.delete(Collateral).where(Collateral.id == collateral_id)).rowcount
+        if not deleted:
+            raise LookupError(f'Collateral {collateral_id} was already deleted')
+        db.session.execute(db.delete(CollateralJob).where(CollateralJob.collateral_id == collateral_id))
+        if content_hash:
+            release_reference(content_hash)
+        create_block(unique_data_id, f"borrower_{borrower_id}", "Collateral Deleted", {
+            "collateral_id": collateral_id,
+            "borrower_id": borrower_id,
+            "content_hash": content_hash
+        })
+    
+    try:
+        run_transaction(delete)
+    except LookupError:
+        return jsonify({'success': False, 'message': 'Collateral not found'}), 404
+    
+    return jsonify({'success': True, 'message': 'Collateral deleted successfully'})
 
 # Loan routes
 @app.route('/api/loans', methods=['POST'])
+@invalidates('loans', 'lenders', 'borrowers', 'ledger')
 def create_loan():
     # Check if user is logged in
     if not session.get('user_id'):
@@ -262,6 +449,10 @@ def create_loan():
     if not borrower_id:
         return jsonify({'success': False, 'message': 'Borrower ID is required'}), 400
     
+    # Validate amount
+    if not isinstance(amount, (int, float)) or amount <= 0:
+        return jsonify({'success': False, 'message': 'Invalid amount'}), 400
+    
     # Check if user is authorized (either the borrower themselves or admin)
     if session.get('user_id') != borrower_id and session.get('role') != 'admin':
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
@@ -276,29 +467,73 @@ def create_loan():
     if recent_loan:
         return jsonify({'success': False, 'message': 'Cannot request another loan within 24 hours'}), 400
     
-    # Create loan without assigning a specific lender
+    # Create loan without assigning a specific lender; remember the best lender for it
     unique_data_id = str(uuid.uuid4()) + "_" + get_ist_time().isoformat()
     loan = Loan(
         unique_data_id=unique_data_id,
         borrower_id=borrower_id,
         amount=amount,
+        matched_lender_id=lender_book.match(amount),
         # No lender assigned initially
         status='requested'
     )
     
     db.session.add(loan)
-    db.session.commit()
+    db.session.flush()
     
     # Create block for loan request in blockchain ledger
     create_block(unique_data_id, f"borrower_{borrower_id}", "Loan Requested", {
         "loan_id": loan.id,
         "amount": amount,
-        "borrower_id": borrower_id
+        "borrower_id": borrower_id,
+        "matched_lender_id": loan.matched_lender_id
+    })
+    db.session.commit()
+    
+    lender_id = auto_approve(loan) if app.config['LOAN_AUTO_APPROVE'] else None
+    
+    return jsonify({
+        'success': True,
+        'message': 'Loan request created successfully' if lender_id is None else 'Loan approved successfully',
+        'loan_id': loan.id,
+        'matched_lender_id': loan.matched_lender_id,
+        'lender_id': lender_id
     })
+
+# Approve a new request with the best lender that can still fund it. Returns the lender's id,
+# or None if no lender could.
+def auto_approve(loan):
+    borrower = Borrower.query.get(loan.borrower_id)
+    lender_id = loan.matched_lender_id
+    tried = set()
+    
+    def approve(lender):
+        disburse_loan(loan, lender, borrower)
+        create_block(loan.unique_data_id, "auto", "Loan Approved", {
+            "loan_id": loan.id,
+            "status": 'approved',
+            "approved_by": 'auto',
+            "lender_id": lender.id
+        })
+    
+    while borrower and lender_id is not None:
+        lender = Lender.query.get(lender_id)
+        try:
+            run_transaction(lambda: approve(lender))
+        except InsufficientFunds:
+            # The book's view of this lender was stale; try the next best one
+            lender_book.refresh_lender(lender_id)
+            tried.add(lender_id)
+            lender_id = lender_book.match(loan.amount, exclude=tried)
+            continue
+        
+        lender_book.refresh_lender(lender_id)
+        return lender_id
     
-    return jsonify({'success': True, 'message': 'Loan request created successfully', 'loan_id': loan.id})
+    return None
 
 @app.route('/api/loans/<int:loan_id>/approve', methods=['PUT'])
+@invalidates('loans', 'lenders', 'borrowers', 'ledger')
 def approve_loan(loan_id):
     # Check if user is admin or lender
     if session.get('role') not in ['admin', 'lender']:
@@ -309,19 +544,31 @@ def approve_loan(loan_id):
     lender_id = data.get('lender_id')
     interest_rate = data.get('interest_rate')  # Get interest rate from request
     
+    if status not in ['approved', 'rejected']:
+        return jsonify({'success': False, 'message': 'Status must be approved or rejected'}), 400
+    
     # Get loan
     loan = Loan.query.get(loan_id)
     if not loan:
         return jsonify({'success': False, 'message': 'Loan not found'}), 404
     
-    # Update loan status
-    loan.status = status
+    # Default to the lender picked by the matching engine
+    if not lender_id:
+        lender_id = loan.matched_lender_id
+    
+    # Block for the loan approval/rejection, committed together with the decision
+    def record_decision():
+        create_block(loan.unique_data_id, session.get('role'), f"Loan {status.capitalize()}", {
+            "loan_id": loan.id,
+            "status": status,
+            "approved_by": session.get('role')
+        })
+    
     if status == 'approved':
-        loan.lender_id = lender_id
-        loan.interest_rate = interest_rate  # Set the interest rate
-        loan.disbursed_at = get_ist_time()
+        schedule, error = requested_schedule(data)
+        if error:
+            return jsonify({'success': False, 'message': error}), 400
         
-        # Transfer funds from lender to borrower when loan is approved
         lender = Lender.query.get(lender_id)
         borrower = Borrower.query.get(loan.borrower_id)
         
@@ -329,37 +576,182 @@ def approve_loan(loan_id):
         borrower_user = User.query.get(borrower.user_id) if borrower else None
         borrower_name = borrower_user.name if borrower_user else 'Unknown Borrower'
         
-        if lender and borrower:
-            # Check if lender has sufficient balance
-            if lender.account_balance >= loan.amount:
-                lender.account_balance -= loan.amount
-                borrower.account_balance += loan.amount
-                
-                # Reduce borrower's credit score when loan is approved (as a form of credit check)
-                # Reduce by 25 points for taking a loan to reflect the risk
-                borrower.credit_score -= 25
-            else:
-                return jsonify({'success': False, 'message': 'Lender has insufficient balance'}), 400
-        else:
+        if not lender or not borrower:
             if not lender and not borrower:
                 return jsonify({'success': False, 'message': f'Neither lender nor borrower found for loan of {borrower_name}'}), 404
             elif not lender:
                 return jsonify({'success': False, 'message': f'Lender not found for loan of {borrower_name}'}), 404
             else:  # not borrower
                 return jsonify({'success': False, 'message': f'Borrower {borrower_name} not found'}), 404
+        
+        def approve():
+            disburse_loan(loan, lender, borrower, interest_rate, schedule)
+            record_decision()
+        
+        try:
+            run_transaction(approve)
+        except InsufficientFunds:
+            return jsonify({'success': False, 'message': 'Lender has insufficient balance'}), 400
+        except StateConflict:
+            return jsonify({'success': False, 'message': 'Loan is no longer pending'}), 409
+        lender_book.refresh_lender(lender.id)
+    else:
+        # Only a pending request can be rejected; a loan approved meanwhile keeps its money
+        def reject():
+            before = contributions(Loan.id == loan.id)
+            transition(Loan, loan.id, ['requested'], status='rejected')
+            record_change(before, Loan.id == loan.id)
+            record_decision()
+        
+        try:
+            run_transaction(reject)
+        except StateConflict:
+            return jsonify({'success': False, 'message': 'Loan is no longer pending'}), 409
     
-    db.session.commit()
+    return jsonify({'success': True, 'message': f'Loan {status} successfully'})
+
+# Approve or reject many loan requests at once: all balance and credit score changes are
+# committed in one transaction and the ledger blocks are appended together
+@app.route('/api/loans/batch/approve', methods=['PUT'])
+@invalidates('loans', 'lenders', 'borrowers', 'ledger')
+def approve_loans_batch():
+    # Check if user is admin or lender
+    if session.get('role') not in ['admin', 'lender']:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+
+    data = request.get_json()
+    decisions = data.get('decisions') if data else None
+    if not isinstance(decisions, list) or not decisions:
+        return jsonify({'success': False, 'message': 'decisions must be a non-empty list'}), 400
+    if len(decisions) > app.config['LOAN_BATCH_MAX_SIZE']:
+        return jsonify({'success': False, 'message': f"At most {app.config['LOAN_BATCH_MAX_SIZE']} decisions per batch"}), 400
+
+    # Load every loan, lender and borrower the batch touches up front
+    loan_ids = [d.get('loan_id') for d in decisions if isinstance(d, dict) and is_id(d.get('loan_id'))]
+    loans = {loan.id: loan for loan in Loan.query.filter(Loan.id.in_(loan_ids)).all()}
+    lender_ids = [d.get('lender_id') for d in decisions
+                  if isinstance(d, dict) and d.get('status') == 'approved' and is_id(d.get('lender_id'))]
+    lenders = {lender.id: lender for lender in Lender.query.filter(Lender.id.in_(lender_ids)).all()}
+    borrower_ids = set(loan.borrower_id for loan in loans.values())
+    borrowers = {borrower.id: borrower for borrower in Borrower.query.filter(Borrower.id.in_(borrower_ids)).all()}
+
+    def apply_batch():
+        results = []
+        events = []
+        seen = set()
+        schedule_specs = []
+        decided_ids = []
+
+        for decision in decisions:
+            if not isinstance(decision, dict):
+                results.append({'loan_id': None, 'success': False, 'message': 'Invalid decision'})
+                continue
+
+            loan_id = decision.get('loan_id')
+            status = decision.get('status')
+            lender_id = decision.get('lender_id')
+            loan = loans.get(loan_id) if is_id(loan_id) else None
+            lender = lenders.get(lender_id) if is_id(lender_id) else None
+            borrower = borrowers.get(loan.borrower_id) if loan else None
+            schedule, schedule_error = requested_schedule(decision) if status == 'approved' else (None, None)
+
+            # Validate the decision against the loan's current state and earlier items in the batch
+            if not is_id(loan_id):
+                message = 'loan_id must be an integer'
+            elif status == 'approved' and lender_id is not None and not is_id(lender_id):
+                message = 'lender_id must be an integer'
+            elif loan is None:
+                message = 'Loan not found'
+            elif loan_id in seen:
+                message = 'Duplicate loan in batch'
+            elif status not in ['approved', 'rejected']:
+                message = 'Status must be approved or rejected'
+            elif loan.status != 'requested':
+                message = f'Loan is already {loan.status}'
+            elif status == 'approved' and not lender:
+                message = 'Lender not found'
+            elif status == 'approved' and not borrower:
+                message = 'Borrower not found'
+            elif schedule_error:
+                message = schedule_error
+            else:
+                message = None
+
+            if message is None:
+                try:
+                    if status == 'approved':
+                        # Conditional debit: balances already reflect earlier approvals in this batch
+                        debit(Lender, lender.id, loan.amount)
+                        disbursed_at = get_ist_time()
+                        interest_rate = decision.get('interest_rate')
+                        if interest_rate is None:
+                            interest_rate = lender.interest_rate
+                        try:
+                            transition(Loan, loan.id, ['requested'], status='approved', lender_id=lender_id,
+                                       interest_rate=interest_rate, disbursed_at=disbursed_at,
+                                       due_date=disbursed_at + timedelta(days=app.config['LOAN_TERM_DAYS']))
+                        except StateConflict:
+                            # Someone else decided this loan meanwhile; give the money back
+                            credit(Lender, lender.id, loan.amount)
+                            raise
+                        credit(Borrower, borrower.id, loan.amount)
+                        db.session.execute(
+                            db.update(Borrower).where(Borrower.id == borrower.id).values(credit_score=Borrower.credit_score - 25)
+                        )
+                        if schedule:
+                            schedule_specs.append({
+                                'loan_id': loan.id,
+                                'amount': loan.amount,
+                                'annual_rate': interest_rate,
+                                'installments': schedule[1],
+                                'schedule_type': schedule[0]
+                            })
+                    else:
+                        transition(Loan, loan.id, ['requested'], status='rejected')
+                    decided_ids.append(loan.id)
+                except InsufficientFunds:
+                    message = 'Lender has insufficient balance'
+                except StateConflict:
+                    message = 'Loan is no longer pending'
+
+            if message:
+                results.append({'loan_id': loan_id, 'success': False, 'message': message})
+                continue
+
+            seen.add(loan_id)
+            results.append({'loan_id': loan_id, 'success': True, 'message': f'Loan {status} successfully'})
+            events.append((loan.unique_data_id, session.get('role'), f"Loan {status.capitalize()}", {
+                "loan_id": loan.id,
+                "status": status,
+                "approved_by": session.get('role')
+            }))
+
+        # All installment schedules of the batch are built in one vectorized pass
+        create_schedules(schedule_specs, get_ist_time())
+        
+        # Requested loans contributed nothing to their lender's summary
+        if decided_ids:
+            record_change({}, Loan.id.in_(decided_ids))
+        
+        # Ledger blocks for the whole batch, committed with its decisions
+        for event in events:
+            create_block(*event)
+        return results, events
+
+    results, events = run_transaction(apply_batch)
     
-    # Create block for loan approval/rejection in blockchain ledger
-    create_block(loan.unique_data_id, session.get('role'), f"Loan {status.capitalize()}", {
-        "loan_id": loan.id,
-        "status": status,
-        "approved_by": session.get('role')
+    for lender_id in lenders:
+        lender_book.refresh_lender(lender_id)
+
+    return jsonify({
+        'success': True,
+        'results': results,
+        'succeeded': len(events),
+        'failed': len(results) - len(events)
     })
-    
-    return jsonify({'success': True, 'message': f'Loan {status} successfully'})
 
 @app.route('/api/loans/<int:loan_id>/repay', methods=['POST'])
+@invalidates('loans', 'lenders', 'borrowers', 'ledger')
 def repay_loan(loan_id):
     # Check if user is authorized
     loan = Loan.query.get(loan_id)
@@ -369,9 +761,7 @@ def repay_loan(loan_id):
     if session.get('user_id') != loan.borrower_id and session.get('role') != 'admin':
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    # Update loan status
-    loan.status = 'paid'
-    loan.repaid_at = get_ist_time()
+    repaid_at = get_ist_time()
     
     # Update borrower's credit score
     borrower = Borrower.query.get(loan.borrower_id)
@@ -380,32 +770,26 @@ def repay_loan(loan_id):
     borrower_user = User.query.get(borrower.user_id) if borrower else None
     borrower_name = borrower_user.name if borrower_user else 'Unknown Borrower'
     
-    # Calculate credit score change (increase when repaying loan)
+    # Calculate credit score change (increase when repaying loan).
+    # Due dates come back from SQLite as naive IST times.
     credit_change = 0
-    if loan.repaid_at and loan.due_date and loan.repaid_at <= loan.due_date:
+    repaid_local = repaid_at.replace(tzinfo=None)
+    if loan.due_date and repaid_local <= loan.due_date:
         credit_change += 15  # On time repayment bonus
-        if loan.repaid_at < loan.due_date:
+        if repaid_local < loan.due_date:
             credit_change += 5  # Early repayment bonus
     else:
         credit_change -= 25  # Late repayment penalty
     
-    borrower.credit_score += credit_change
-    
     # Transfer funds from borrower to lender when loan is repaid
+    lender = None
     if loan.lender_id:
         lender = Lender.query.get(loan.lender_id)
         # Calculate total amount to be repaid (principal + interest)
         interest_amount = loan.amount * (loan.interest_rate / 100)
         total_repayment = loan.amount + interest_amount
         
-        if borrower and lender:
-            # Check if borrower has sufficient balance
-            if borrower.account_balance >= total_repayment:
-                borrower.account_balance -= total_repayment
-                lender.account_balance += total_repayment
-            else:
-                return jsonify({'success': False, 'message': f'{borrower_name} has insufficient balance for repayment'}), 400
-        else:
+        if not borrower or not lender:
             if not borrower and not lender:
                 return jsonify({'success': False, 'message': f'Neither borrower nor lender found for repayment of loan by {borrower_name}'}), 404
             elif not borrower:
@@ -415,70 +799,197 @@ def repay_loan(loan_id):
                 lender_name = lender_user.name if lender_user else 'Unknown Lender'
                 return jsonify({'success': False, 'message': f'Lender {lender_name} not found for loan repayment'}), 404
     
-    db.session.commit()
+    # Installment loans are paid down through their schedule
+    schedule = db.session.get(LoanSchedule, loan.id)
+    if schedule is not None:
+        return repay_installments(loan, schedule, borrower, lender, borrower_name, credit_change, repaid_at)
     
-    # Create block for loan repayment in blockchain ledger
-    create_block(loan.unique_data_id, f"borrower_{loan.borrower_id}", "Loan Repaid", {
-        "loan_id": loan.id,
-        "credit_change": credit_change,
-        "repaid_at": loan.repaid_at.isoformat()
-    })
+    def repay():
+        before = contributions(Loan.id == loan.id)
+        
+        # Update loan status; only one concurrent repayment can claim the loan
+        transition(Loan, loan.id, REPAYABLE_STATUSES, status='paid', repaid_at=repaid_at)
+        
+        if lender:
+            # The borrower is only debited if their balance covers the repayment
+            transfer(Borrower, borrower.id, Lender, lender.id, total_repayment)
+        
+        db.session.execute(
+            db.update(Borrower).where(Borrower.id == loan.borrower_id).values(credit_score=Borrower.credit_score + credit_change)
+        )
+        record_change(before, Loan.id == loan.id)
+        
+        # Create block for loan repayment in blockchain ledger
+        create_block(loan.unique_data_id, f"borrower_{loan.borrower_id}", "Loan Repaid", {
+            "loan_id": loan.id,
+            "credit_change": credit_change,
+            "repaid_at": repaid_at.isoformat()
+        })
+    
+    try:
+        run_transaction(repay)
+    except InsufficientFunds:
+        return jsonify({'success': False, 'message': f'{borrower_name} has insufficient balance for repayment'}), 400
+    except StateConflict:
+        return jsonify({'success': False, 'message': 'Loan is not awaiting repayment'}), 409
+    
+    if lender:
+        lender_book.refresh_lender(lender.id)
     
     return jsonify({'success': True, 'message': 'Loan repaid successfully', 'credit_change': credit_change})
 
+# Pay (part of) what is outstanding on an installment loan. Without an amount the whole
+# outstanding balance is paid. The credit score changes once the last installment is paid.
+def repay_installments(loan, schedule, borrower, lender, borrower_name, credit_change, repaid_at):
+    data = request.get_json(silent=True) or {}
+    amount = data.get('amount', outstanding(schedule))
+    if not isinstance(amount, (int, float)) or isinstance(amount, bool) or amount <= 0:
+        return jsonify({'success': False, 'message': 'Invalid amount'}), 400
+    
+    def pay():
+        before = contributions(Loan.id == loan.id)
+        state = apply_payment(loan.id, amount, repaid_at)
+        if state['paid_off']:
+            transition(Loan, loan.id, REPAYABLE_STATUSES, status='paid', repaid_at=repaid_at)
+            db.session.execute(
+                db.update(Borrower).where(Borrower.id == borrower.id).values(credit_score=Borrower.credit_score + credit_change)
+            )
+        transfer(Borrower, borrower.id, Lender, lender.id, amount)
+        record_change(before, Loan.id == loan.id)
+        
+        create_block(loan.unique_data_id, f"borrower_{loan.borrower_id}", "Loan Repaid" if state['paid_off'] else "Installment Paid", {
+            "loan_id": loan.id,
+            "amount": amount,
+            "paid_installments": state['paid_installments'],
+            "outstanding": state['outstanding'],
+            "credit_change": credit_change if state['paid_off'] else 0,
+            "repaid_at": repaid_at.isoformat()
+        })
+        return state
+    
+    try:
+        state = run_transaction(pay)
+    except InsufficientFunds:
+        return jsonify({'success': False, 'message': f'{borrower_name} has insufficient balance for repayment'}), 400
+    except Overpayment:
+        return jsonify({'success': False, 'message': 'Payment exceeds the outstanding balance'}), 400
+    except StateConflict:
+        return jsonify({'success': False, 'message': 'Loan is not awaiting repayment'}), 409
+    
+    lender_book.refresh_lender(lender.id)
+    
+    credit_change = credit_change if state['paid_off'] else 0
+    
+    return jsonify({
+        'success': True,
+        'message': 'Loan repaid successfully' if state['paid_off'] else 'Installment payment recorded',
+        'credit_change': credit_change,
+        'amount_paid': state['amount_paid'],
+        'outstanding': state['outstanding'],
+        'paid_installments': state['paid_installments'],
+        'next_due_date': state['next_due_date']
+    })
+
+@app.route('/api/loans/<int:loan_id>/schedule', methods=['GET'])
+@cached('loans')
+@read_only
+def get_loan_schedule(loan_id):
+    loan = Loan.query.get(loan_id)
+    if not loan:
+        return jsonify({'success': False, 'message': 'Loan not found'}), 404
+    
+    # Admins, lenders and the loan's borrower can view its schedule
+    if session.get('role') not in ['admin', 'lender'] and session.get('user_id') != loan.borrower_id:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    schedule = db.session.get(LoanSchedule, loan.id)
+    if schedule is None:
+        return jsonify({'success': False, 'message': 'Loan has no installment schedule'}), 404
+    
+    return jsonify({'success': True, 'schedule': schedule_to_dict(schedule)})
+
 # New endpoint to get all loan requests for lenders
 @app.route('/api/loans/requests', methods=['GET'])
+@cached('loans', 'lenders', 'borrowers')
+@read_only
 def get_loan_requests():
     # Check if user is authorized (lenders and admins can view loan requests)
     if session.get('role') not in ['admin', 'lender']:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    # Get all requested loans
-    loans = Loan.query.filter(Loan.status == 'requested').all()
-    result = []
+    amount_range = {}
     
-    for loan in loans:
-        borrower = Borrower.query.get(loan.borrower_id)
-        user = User.query.get(borrower.user_id) if borrower else None
-        
-        result.append({
-            'id': loan.id,
-            'borrower_name': user.name if user else 'Unknown',
-            'borrower_id': loan.borrower_id,
-            'amount': loan.amount,
-            'status': loan.status,
-            'created_at': loan.created_at.isoformat() if loan.created_at else None
-        })
+    # Lenders only see requests they are able to fund; admins see every requested loan.
+    # Pages are keyset-paginated, so a page costs the same however many requests are open.
+    if session.get('role') == 'lender':
+        lender = Lender.query.filter_by(user_id=session.get('user_id')).first()
+        if not lender:
+            return jsonify({'success': True, 'loans': [], 'next_cursor': None})
+        amount_range = {
+            'min_amount': lender.min_amount,
+            'max_amount': min(lender.max_amount, lender.account_balance)
+        }
+    
+    try:
+        loans, next_cursor = list_loans(request.args, LOAN_REQUEST, Loan.status == 'requested', **amount_range)
+    except InvalidQuery as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    return jsonify({'success': True, 'loans': result})
+    return jsonify({'success': True, 'loans': LOAN_REQUEST.many(loans), 'next_cursor': next_cursor})
 
 @app.route('/api/lenders/<int:lender_id>/loans', methods=['GET'])
+@cached('loans', 'borrowers')
+@read_only
 def get_lender_loans(lender_id):
     # Check if user is authorized
     if session.get('role') not in ['admin', 'lender'] or (session.get('role') == 'lender' and session.get('user_id') != lender_id):
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
     # Get loans for this lender
-    loans = Loan.query.filter(Loan.lender_id == lender_id).all()
-    result = []
+    try:
+        loans, next_cursor = list_loans(request.args, LENDER_LOAN, Loan.lender_id == lender_id)
+    except InvalidQuery as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    for loan in loans:
-        borrower = Borrower.query.get(loan.borrower_id)
-        user = User.query.get(borrower.user_id) if borrower else None
-        
-        result.append({
-            'id': loan.id,
-            'borrower_name': user.name if user else 'Unknown',
-            'amount': loan.amount,
-            'interest_rate': loan.interest_rate,
-            'status': loan.status,
-            'created_at': loan.created_at.isoformat() if loan.created_at else None
-        })
+    return jsonify({'success': True, 'loans': LENDER_LOAN.many(loans), 'next_cursor': next_cursor})
+
+# Portfolio aggregates for a lender's dashboard, read from the maintained summary row
+@app.route('/api/lenders/<int:lender_id>/summary', methods=['GET'])
+@cached('loans', 'lenders')
+def get_lender_summary(lender_id):
+    # Admins can view any lender's summary, lenders only their own
+    if session.get('role') not in ['admin', 'lender']:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    lender = Lender.query.get(lender_id)
+    if not lender:
+        return jsonify({'success': False, 'message': 'Lender not found'}), 404
+    if session.get('role') == 'lender' and session.get('user_id') != lender.user_id:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    summary = get_summary(lender_id)
+    deployed = summary.outstanding_principal + lender.account_balance
     
-    return jsonify({'success': True, 'loans': result})
+    return jsonify({
+        'success': True,
+        'summary': {
+            'lender_id': lender_id,
+            'active_loans': summary.active_loans,
+            'outstanding_principal': round(summary.outstanding_principal, 2),
+            'expected_interest': round(summary.expected_interest, 2),
+            'repaid_loans': summary.repaid_loans,
+            'principal_repaid': round(summary.principal_repaid, 2),
+            'interest_earned': round(summary.interest_earned, 2),
+            'default_count': summary.default_count,
+            'utilization': round(summary.outstanding_principal / deployed, 4) if deployed > 0 else 0.0,
+            'updated_at': summary.updated_at.isoformat() if summary.updated_at else None
+        }
+    })
 
 # Add this new endpoint for borrowers to get their own data
 @app.route('/api/borrowers/me', methods=['GET'])
+@cached('borrowers')
+@read_only
 def get_current_borrower():
     # Check if user is logged in and is a borrower or admin
     user_id = session.get('user_id')
@@ -488,7 +999,10 @@ def get_current_borrower():
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
     # Get the borrower record for this user
-    borrower = Borrower.query.filter_by(user_id=user_id).first()
+    borrower = db.session.execute(
+        db.select(*BORROWER.columns).select_from(Borrower).join(User, User.id == Borrower.user_id)
+        .where(Borrower.user_id == user_id)
+    ).first()
     
     if not borrower:
         # If no borrower record exists, return user data with default borrower info
@@ -511,108 +1025,106 @@ def get_current_borrower():
         })
     
     # Return borrower data
-    return jsonify({
-        'success': True,
-        'borrower': {
-            'id': borrower.id,
-            'user_id': borrower.user_id,
-            'name': borrower.user.name,
-            'email': borrower.user.email,
-            'wallet_address': borrower.user.wallet_address,
-            'credit_score': borrower.credit_score,
-            'account_balance': borrower.account_balance,
-            'created_at': borrower.created_at.isoformat() if borrower.created_at else get_ist_time().isoformat()
-        }
-    })
+    result = BORROWER.one(borrower)
+    result['created_at'] = result['created_at'] or get_ist_time().isoformat()
+    return jsonify({'success': True, 'borrower': result})
 
 # Add this new endpoint for borrowers to get their loans
 @app.route('/api/borrowers/<int:borrower_id>/loans', methods=['GET'])
+@cached('loans', 'lenders')
+@read_only
 def get_borrower_loans(borrower_id):
     # Check if user is authorized
     if session.get('role') not in ['admin', 'borrower'] or (session.get('role') == 'borrower' and session.get('user_id') != borrower_id):
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
     # Get loans for this borrower
-    loans = Loan.query.filter(Loan.borrower_id == borrower_id).all()
-    result = []
-    
-    for loan in loans:
-        lender = Lender.query.get(loan.lender_id) if loan.lender_id else None
-        user = User.query.get(lender.user_id) if lender else None
-        
-        result.append({
-            'id': loan.id,
-            'lender_name': user.name if user else 'Unknown',
-            'amount': loan.amount,
-            'interest_rate': loan.interest_rate,
-            'status': loan.status,
-            'created_at': loan.created_at.isoformat() if loan.created_at else None,
-            'due_date': loan.due_date.isoformat() if loan.due_date else None,
-            'disbursed_at': loan.disbursed_at.isoformat() if loan.disbursed_at else None,
-            'repaid_at': loan.repaid_at.isoformat() if loan.repaid_at else None
-        })
+    try:
+        loans, next_cursor = list_loans(request.args, BORROWER_LOAN, Loan.borrower_id == borrower_id)
+    except InvalidQuery as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    return jsonify({'success': True, 'loans': result})
+    return jsonify({'success': True, 'loans': BORROWER_LOAN.many(loans), 'next_cursor': next_cursor})
 
 # Ledger routes
 @app.route('/api/ledger', methods=['GET'])
+@cached('ledger')
+@read_only
 def get_ledger():
-    blocks = Block.query.order_by(Block.id.asc()).all()
-    result = []
-    
-    for block in blocks:
-        result.append({
-            'id': block.id,
-            'unique_data_id': block.unique_data_id,
-            'prev_hash': block.prev_hash,
-            'hash': block.hash,
-            'timestamp': block.timestamp,
-            'actor': block.actor,
-            'event_type': block.event_type,
-            'metadata': json.loads(block.block_metadata) if block.block_metadata else None
-        })
+    # Keyset pagination on Block.id: pass the last id you received as after_id
+    after_id = request.args.get('after_id', 0, type=int)
+    limit = request.args.get('limit', type=int)
+    
+    if limit is not None and limit <= 0:
+        return jsonify({'success': False, 'message': 'limit must be positive'}), 400
+    
+    # Optional audit-trail filters, each served by an index on blocks
+    filters = {
+        'unique_data_id': request.args.get('unique_data_id'),
+        'event_type': request.args.get('event_type'),
+        'actor': request.args.get('actor')
+    }
+    since = request.args.get('since')
+    if since:
+        try:
+            filters['since'] = normalize_ledger_time(since)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'since must be an ISO 8601 timestamp'}), 400
+    
+    # Streaming mode: one JSON object per line, built lazily batch by batch
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        def generate():
+            for block in iter_blocks(after_id, limit, **filters):
+                yield block_payload(block) + '\n'
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    limit = min(limit or app.config['LEDGER_PAGE_SIZE'], app.config['LEDGER_MAX_PAGE_SIZE'])
+    payloads = []
+    last_id = None
+    for block in iter_blocks(after_id, limit, **filters):
+        payloads.append(block_payload(block))
+        last_id = block.id
+    
+    # Blocks are pre-rendered, so the response is stitched together instead of re-serialized
+    next_after_id = last_id if len(payloads) == limit else None
+    body = '{"success":true,"blocks":[' + ','.join(payloads) + '],"next_after_id":' + json.dumps(next_after_id) + '}'
+    return Response(body, mimetype='application/json')
+
+# Merkle inclusion proofs for every block of a loan, collateral or user
+@app.route('/api/ledger/proof/<unique_data_id>', methods=['GET'])
+@read_only
+def get_ledger_proof(unique_data_id):
+    ledger_appender.sync()
+    result = build_proofs(unique_data_id)
+    
+    if not result['proofs']:
+        return jsonify({'success': False, 'message': 'No ledger blocks found for this id'}), 404
     
-    return jsonify({'success': True, 'blocks': result})
+    return jsonify({'success': True, **result})
 
 # Utility route to verify blockchain integrity
 @app.route('/api/ledger/verify', methods=['GET'])
 def verify_ledger():
-    blocks = Block.query.order_by(Block.id.asc()).all()
-    is_valid = True
-    error_message = ""
-    
-    for i, block in enumerate(blocks):
-        if i == 0:
-            # Genesis block validation
-            if block.prev_hash != "0" * 64:
-                is_valid = False
-                error_message = f"Invalid genesis block prev_hash at index {i}"
-                break
-        else:
-            # Validate hash chain
-            prev_block = blocks[i-1]
-            if block.prev_hash != prev_block.hash:
-                is_valid = False
-                error_message = f"Hash mismatch at block {i}"
-                break
-            
-            # Recalculate hash to verify integrity
-            data_string = block.prev_hash + block.unique_data_id + block.timestamp + str(block.nonce)
-            recalculated_hash = hashlib.sha256(data_string.encode()).hexdigest()
-            
-            if block.hash != recalculated_hash:
-                is_valid = False
-                error_message = f"Hash calculation mismatch at block {i}"
-                break
-    
+    # Only blocks appended since the last checkpoint are checked unless ?full=1 is given
+    full = request.args.get('full', '').lower() in ['1', 'true', 'yes']
+    result = verify_chain(
+        full=full,
+        full_interval_hours=app.config['LEDGER_FULL_VERIFY_INTERVAL_HOURS'],
+        workers=app.config['LEDGER_VERIFY_WORKERS']
+    )
+
     return jsonify({
         'success': True,
-        'is_valid': is_valid,
-        'error_message': error_message if not is_valid else None
+        'is_valid': result['is_valid'],
+        'error_message': result['error_message'],
+        'mode': result['mode'],
+        'verified_blocks': result['verified_blocks']
     })
 
 # New endpoint to get user details by name for demonstration
 @app.route('/api/users/name/<user_name>', methods=['GET'])
+@read_only
 def get_user_by_name(user_name):
     try:
         # Get user by name
@@ -651,6 +1163,7 @@ def get_user_by_name(user_name):
 
 # New endpoint to get loan details between two users for demonstration
 @app.route('/api/loans/between/<lender_name>/<borrower_name>', methods=['GET'])
+@read_only
 def get_loan_between_users(lender_name, borrower_name):
     try:
         # Get lender and borrower users
@@ -674,19 +1187,10 @@ def get_loan_between_users(lender_name, borrower_name):
             return jsonify({'success': False, 'message': f'Borrower record for {borrower_name} not found'}), 404
         
         # Get loans between these users
-        loans = Loan.query.filter_by(lender_id=lender.id, borrower_id=borrower.id).all()
-        
-        result = []
-        for loan in loans:
-            result.append({
-                'id': loan.id,
-                'amount': loan.amount,
-                'interest_rate': loan.interest_rate,
-                'status': loan.status,
-                'created_at': loan.created_at.isoformat() if loan.created_at else None,
-                'disbursed_at': loan.disbursed_at.isoformat() if loan.disbursed_at else None,
-                'repaid_at': loan.repaid_at.isoformat() if loan.repaid_at else None
-            })
+        loans = db.session.execute(
+            db.select(*LOAN.columns).where(Loan.lender_id == lender.id, Loan.borrower_id == borrower.id)
+        ).all()
+        result = LOAN.many(loans)
         
         # Also return current account balances
         response_data = {
@@ -709,6 +1213,7 @@ def get_loan_between_users(lender_name, borrower_name):
 
 # New endpoint to add money to user account
 @app.route('/api/users/add-money', methods=['POST'])
+@invalidates('lenders', 'borrowers')
 def add_money():
     # Check if user is logged in
     if not session.get('user_id'):
@@ -733,12 +1238,12 @@ def add_money():
             user_name = user.name if user else 'Unknown User'
             
             if lender:
-                lender.account_balance += amount
-                db.session.commit()
+                new_balance = run_transaction(lambda: credit(Lender, lender.id, amount))
+                lender_book.refresh_lender(lender.id)
                 return jsonify({
                     'success': True, 
                     'message': f'₹{amount} added successfully',
-                    'new_balance': lender.account_balance
+                    'new_balance': new_balance
                 })
             else:
                 return jsonify({'success': False, 'message': f'Lender record for {user_name} not found'}), 404
@@ -751,12 +1256,11 @@ def add_money():
             user_name = user.name if user else 'Unknown User'
             
             if borrower:
-                borrower.account_balance += amount
-                db.session.commit()
+                new_balance = run_transaction(lambda: credit(Borrower, borrower.id, amount))
                 return jsonify({
                     'success': True, 
                     'message': f'₹{amount} added successfully',
-                    'new_balance': borrower.account_balance
+                    'new_balance': new_balance
                 })
             else:
                 return jsonify({'success': False, 'message': f'Borrower record for {user_name} not found'}), 404
@@ -774,5 +1278,8 @@ def add_money():
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        create_schema()
+    # Pick up collateral and ledger blocks queued while the server was down
+    collateral_workers.start(app, app.config['COLLATERAL_WORKERS'])
+    ledger_writer.start(app)
     app.run(debug=True, port=5000)
\ No newline at end of file
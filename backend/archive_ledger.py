@@ -0,0 +1,34 @@
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+from ledger_segments import UnverifiedLedger, seal_segments
+
+# Seal old, verified ledger blocks into compressed segment files and drop them from SQLite.
+# The API keeps serving them transparently from the segment files.
+def main():
+    parser = argparse.ArgumentParser(description='Archive old ledger blocks into sealed segment files')
+    parser.add_argument('--segment-size', type=int, default=50000, help='blocks per segment file')
+    parser.add_argument('--keep-hot', type=int, default=10000, help='newest blocks to keep in SQLite')
+    parser.add_argument('--vacuum', action='store_true', help='reclaim the freed space afterwards')
+    args = parser.parse_args()
+
+    with app.app_context():
+        try:
+            sealed = seal_segments(app.config['LEDGER_SEGMENT_FOLDER'], args.segment_size, args.keep_hot)
+        except UnverifiedLedger as e:
+            print(f"Refusing to archive: {e}")
+            sys.exit(1)
+        for segment in sealed:
+            print(f"Sealed blocks {segment.first_block_id}-{segment.last_block_id} into {segment.path}")
+
+        if not sealed:
+            print("Nothing to archive (only blocks covered by a ledger verification are sealed)")
+        elif args.vacuum:
+            db.session.execute(db.text('VACUUM'))
+            print("Database vacuumed")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, current_app, make_response, request, session
+
+# Response cache for read endpoints with write-driven invalidation.
+# Every cached view depends on one or more scopes ('lenders', 'loans', 'ledger', ...) and every
+# write view bumps the version of the scopes it changes. A response is cached under the
+# endpoint, its arguments and the caller's role and user id, and its ETag is derived from that
+# key and the versions of its scopes, so conditional requests are answered without touching
+# the database. Versions live in this process only; writes made by other processes (the CLI
+# maintenance jobs) are picked up when the max-age window rolls over.
+class ResponseCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._entries = OrderedDict()
+        # Distinguishes this process' version counters from a previous run's
+        self._boot = os.urandom(8).hex()
+
+    def bump(self, *scopes):
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+
+    def etag(self, key, scopes):
+        with self._lock:
+            versions = [self._versions.get(scope, 0) for scope in scopes]
+        window = int(time.time() // current_app.config['RESPONSE_CACHE_MAX_AGE_SECONDS'])
+        return hashlib.sha256(repr((self._boot, window, key, versions)).encode()).hexdigest()[:32]
+
+    def get(self, key, etag):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag, body, mimetype):
+        with self._lock:
+            self._entries[key] = (etag, body, mimetype)
+            self._entries.move_to_end(key)
+            while len(self._entries) > current_app.config['RESPONSE_CACHE_MAX_ENTRIES']:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._versions.clear()
+            self._entries.clear()
+
+response_cache = ResponseCache()
+
+def _respond(body, mimetype, etag):
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Serve a GET view from the cache while none of `scopes` has changed
+def cached(*scopes):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (
+                request.endpoint,
+                tuple(sorted(kwargs.items())),
+                tuple(sorted(request.args.items(multi=True))),
+                request.accept_mimetypes.best,
+                session.get('role'),
+                session.get('user_id')
+            )
+            etag = response_cache.etag(key, scopes)
+
+            if etag in request.if_none_match:
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+
+            entry = response_cache.get(key, etag)
+            if entry is not None:
+                return _respond(entry[1], entry[2], etag)
+
+            response = make_response(view(*args, **kwargs))
+            # Only complete, successful bodies are worth keeping; streams are never buffered
+            if response.status_code != 200 or response.is_streamed:
+                return response
+
+            body = response.get_data()
+            response_cache.put(key, etag, body, response.mimetype)
+            return _respond(body, response.mimetype, etag)
+        return wrapper
+    return decorator
+
+# Bump `scopes` after a write view succeeds
+def invalidates(*scopes):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = make_response(view(*args, **kwargs))
+            if response.status_code < 400:
+                response_cache.bump(*scopes)
+            return response
+        return wrapper
+    return decorator
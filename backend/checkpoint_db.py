@@ -0,0 +1,22 @@
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+from storage import CHECKPOINT_MODES, checkpoint
+
+# Fold the write-ahead log back into the database file, e.g. after a large batch or archive run
+def main():
+    parser = argparse.ArgumentParser(description='Checkpoint the SQLite write-ahead log')
+    parser.add_argument('--mode', default='TRUNCATE', type=str.upper, choices=CHECKPOINT_MODES,
+                        help='PASSIVE never waits for readers or writers; TRUNCATE also empties the WAL file')
+    args = parser.parse_args()
+
+    with app.app_context():
+        busy, wal_pages, checkpointed = checkpoint(db, args.mode)
+        print(f"Checkpointed {checkpointed} of {wal_pages} WAL pages" + (" (blocked by an open transaction)" if busy else ""))
+        sys.exit(1 if busy else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+import json
+import mimetypes
+import mmap
+import re
+import threading
+from datetime import timedelta
+from flask import current_app
+from collateral_store import file_hash
+from database import db
+from models import Collateral, CollateralBlob, CollateralJob, get_ist_time
+
+# Background processing of uploaded collateral. The upload enqueues a job in the same
+# transaction as the collateral row; workers claim due jobs with one conditional UPDATE, so any
+# number of threads and processes can share the queue. Failed jobs are retried with
+# exponential backoff, and the result of processing is stored in Collateral.file_metadata.
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 30     # Delay before the first retry, doubled for each further attempt
+POLL_SECONDS = 2         # Idle workers look for due retries this often
+STALE_AFTER_SECONDS = 600  # A running job not finished by then is assumed lost with its worker
+
+jobs = CollateralJob.__table__
+collaterals = Collateral.__table__
+blobs = CollateralBlob.__table__
+
+SIGNATURES = [
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'PK\x03\x04', 'application/zip'),
+]
+PDF_PAGE = re.compile(rb'/Type\s*/Page(?![A-Za-z])')
+
+# Job times are naive IST wall-clock times, like every other timestamp
+def _now():
+    return get_ist_time().replace(tzinfo=None)
+
+# Queue processing of a collateral inside the current transaction
+def enqueue(collateral_id):
+    job = CollateralJob(collateral_id=collateral_id, status='queued', attempts=0, run_after=_now())
+    db.session.add(job)
+    return job
+
+# Take the oldest due job, or None when there is nothing to do
+def claim_job():
+    now = _now()
+    due = (
+        db.select(jobs.c.id)
+        .where(jobs.c.status == 'queued', jobs.c.run_after <= now)
+        .order_by(jobs.c.run_after.asc(), jobs.c.id.asc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    job = db.session.execute(
+        jobs.update()
+        .where(jobs.c.id == due, jobs.c.status == 'queued')
+        .values(status='running', attempts=jobs.c.attempts + 1, updated_at=now)
+        .returning(jobs.c.id, jobs.c.collateral_id, jobs.c.attempts)
+    ).first()
+    db.session.commit()
+    return job
+
+# Put jobs whose worker died while running them back in the queue
+def requeue_stale():
+    cutoff = _now() - timedelta(seconds=STALE_AFTER_SECONDS)
+    requeued = db.session.execute(
+        jobs.update().where(jobs.c.status == 'running', jobs.c.updated_at < cutoff).values(status='queued')
+    ).rowcount
+    db.session.commit()
+    return requeued
+
+def sniff(head):
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    try:
+        head.decode('utf-8')
+        return 'text/plain'
+    except UnicodeDecodeError:
+        return 'application/octet-stream'
+
+# Facts about a stored file that depend only on its content
+def inspect_file(path, content_hash):
+    if file_hash(path) != content_hash:
+        raise ValueError(f'{path} does not match its content hash')
+
+    with open(path, 'rb') as f:
+        head = f.read(4096)
+        metadata = {'content_type': sniff(head), 'size': f.seek(0, 2), 'hash_verified': True}
+        if metadata['content_type'] == 'application/pdf':
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                metadata['page_count'] = sum(1 for _ in PDF_PAGE.finditer(mm))
+        elif metadata['content_type'] == 'image/png' and len(head) >= 24:
+            metadata['width'] = int.from_bytes(head[16:20], 'big')
+            metadata['height'] = int.from_bytes(head[20:24], 'big')
+    return metadata
+
+def process_job(job):
+    row = db.session.execute(
+        db.select(collaterals.c.filename, collaterals.c.content_hash, blobs.c.path)
+        .join(blobs, blobs.c.sha256 == collaterals.c.content_hash)
+        .where(collaterals.c.id == job.collateral_id)
+    ).first()
+    if row is None:
+        raise ValueError(f'Collateral {job.collateral_id} has no stored file')
+
+    # Deduplicated uploads reuse what was found for the same content
+    known = db.session.execute(
+        db.select(collaterals.c.file_metadata)
+        .where(collaterals.c.content_hash == row.content_hash, collaterals.c.file_metadata.isnot(None))
+        .limit(1)
+    ).scalar()
+    metadata = json.loads(known) if known else inspect_file(row.path, row.content_hash)
+
+    declared = mimetypes.guess_type(row.filename)[0]
+    metadata['declared_type'] = declared
+    metadata['type_matches_name'] = declared == metadata['content_type']
+
+    db.session.execute(
+        collaterals.update().where(collaterals.c.id == job.collateral_id).values(file_metadata=json.dumps(metadata))
+    )
+    db.session.execute(
+        jobs.update().where(jobs.c.id == job.id).values(status='done', last_error=None, updated_at=_now())
+    )
+    db.session.commit()
+
+def fail_job(job, error):
+    db.session.rollback()
+    now = _now()
+    if job.attempts >= MAX_ATTEMPTS:
+        values = {'status': 'failed'}
+    else:
+        values = {'status': 'queued', 'run_after': now + timedelta(seconds=BACKOFF_SECONDS * 2 ** (job.attempts - 1))}
+    db.session.execute(jobs.update().where(jobs.c.id == job.id).values(last_error=error, updated_at=now, **values))
+    db.session.commit()
+
+# Claim and process one job. Returns False when no job was due.
+def run_one():
+    job = claim_job()
+    if job is None:
+        return False
+    try:
+        process_job(job)
+    except Exception as e:
+        fail_job(job, str(e))
+    return True
+
+# Process due jobs until none is left. Returns the number processed.
+def drain():
+    processed = 0
+    while run_one():
+        processed += 1
+    return processed
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'run_after': job.run_after.isoformat() if job.run_after else None,
+        'last_error': job.last_error
+    }
+
+# Worker threads for one process. Started on first use, woken when a job is queued.
+class WorkerPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def start(self, app, workers):
+        with self._lock:
+            if self._threads or workers <= 0:
+                return
+            with app.app_context():
+                requeue_stale()
+            for i in range(workers):
+                thread = threading.Thread(target=self._run, args=(app,), name=f'collateral-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self, app):
+        while True:
+            # A fresh app context per job, so each job gets its own session
+            with app.app_context():
+                try:
+                    busy = run_one()
+                except Exception:
+                    current_app.logger.exception('Collateral worker failed to claim a job')
+                    db.session.rollback()
+                    busy = False
+            if not busy:
+                with self._cond:
+                    self._cond.wait(POLL_SECONDS)
+
+collateral_workers = WorkerPool()
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import tempfile
+from sqlalchemy.dialects.sqlite import insert
+from database import db
+from ledger import iter_blocks
+from models import Collateral, CollateralBlob, get_ist_time
+
+# Content-addressed storage for collateral files. Uploads are streamed to a temporary file in
+# chunks while their SHA-256 is computed, then moved to blobs/<2 hex>/<2 hex>/<sha256> under
+# the upload folder. Identical documents are stored once and shared through the blob's
+# reference count; the hash is what the ledger records for the upload.
+# Files are only moved into place or removed after the reference count has been changed in
+# the current transaction. That statement holds the database's write lock until commit, so an
+# upload can't land its file just before a deletion removes the last copy.
+CHUNK_SIZE = 1024 * 1024
+
+blobs = CollateralBlob.__table__
+collaterals = Collateral.__table__
+
+def blob_path(folder, sha256):
+    return os.path.join(folder, 'blobs', sha256[:2], sha256[2:4], sha256)
+
+# Write `stream` to a temporary file in the store. Returns (sha256, size, temporary path);
+# add_reference moves the file into place.
+def ingest(stream, folder, chunk_size=CHUNK_SIZE):
+    tmp_folder = os.path.join(folder, 'blobs', 'tmp')
+    os.makedirs(tmp_folder, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_folder)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return digest.hexdigest(), size, tmp_path
+
+# Count one more collateral using the blob inside the current transaction, registering it on
+# first use, and move the ingested file into place. Returns the blob's path.
+def add_reference(sha256, size, tmp_path, folder):
+    path = blob_path(folder, sha256)
+    statement = insert(blobs).values(sha256=sha256, size=size, path=path, ref_count=1, created_at=get_ist_time())
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[blobs.c.sha256],
+        set_={'ref_count': blobs.c.ref_count + 1}
+    ))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # The bytes are identical, so replacing a stored copy changes nothing for its readers
+    os.replace(tmp_path, path)
+    return path
+
+# Count one collateral less inside the current transaction; the last one removes the blob and
+# its file
+def release_reference(sha256):
+    row = db.session.execute(
+        blobs.update().where(blobs.c.sha256 == sha256).values(ref_count=blobs.c.ref_count - 1)
+        .returning(blobs.c.ref_count, blobs.c.path)
+    ).first()
+    if row is None or row.ref_count > 0:
+        return
+    db.session.execute(blobs.delete().where(blobs.c.sha256 == sha256))
+    if os.path.exists(row.path):
+        os.remove(row.path)
+
+def file_hash(path, chunk_size=CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Check every content-addressed collateral against its file and its ledger block. Returns the
+# problems found as [(collateral_id, message)]; collaterals stored before hashing are skipped.
+def verify_collaterals():
+    recorded = {}
+    for block in iter_blocks(event_type='Collateral Uploaded'):
+        metadata = json.loads(block.block_metadata) if block.block_metadata else {}
+        recorded[block.unique_data_id] = metadata.get('content_hash')
+
+    problems = []
+    actual = {}
+    rows = db.session.execute(
+        db.select(collaterals.c.id, collaterals.c.unique_data_id, collaterals.c.content_hash, blobs.c.path)
+        .join(blobs, blobs.c.sha256 == collaterals.c.content_hash)
+        .order_by(collaterals.c.id)
+    )
+    for row in rows:
+        if recorded.get(row.unique_data_id) != row.content_hash:
+            problems.append((row.id, 'content hash differs from the ledger'))
+        # Shared blobs are hashed once
+        if row.path not in actual:
+            actual[row.path] = file_hash(row.path) if os.path.exists(row.path) else None
+        if actual[row.path] is None:
+            problems.append((row.id, f'file {row.path} is missing'))
+        elif actual[row.path] != row.content_hash:
+            problems.append((row.id, f'file {row.path} does not match its content hash'))
+    return problems
@@ -0,0 +1,30 @@
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from collateral_jobs import collateral_workers, drain, requeue_stale
+
+# Process uploaded collateral outside the web server, e.g. with COLLATERAL_WORKERS = 0
+def main():
+    parser = argparse.ArgumentParser(description='Process queued collateral jobs')
+    parser.add_argument('--workers', type=int, default=2, help='worker threads')
+    parser.add_argument('--once', action='store_true', help='process the jobs that are due and exit')
+    args = parser.parse_args()
+
+    if args.once:
+        with app.app_context():
+            requeue_stale()
+            print(f"Processed {drain()} collateral jobs")
+        return
+
+    collateral_workers.start(app, args.workers)
+    print(f"Processing collateral with {args.workers} workers")
+    try:
+        collateral_workers.join()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
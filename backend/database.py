@@ -1,4 +1,27 @@
 from flask_sqlalchemy import SQLAlchemy
+from storage import RoutingSession
 
 # Create a single SQLAlchemy instance to be used across the application
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Create missing tables, plus any column or index declared on a model that an existing
+# database lacks (db.create_all() only builds those together with new tables), then apply
+# pending migrations (see migrations.py). Added columns must be nullable or carry a server_default.
+def create_schema():
+    db.create_all()
+    inspector = db.inspect(db.engine)
+    
+    for table in db.metadata.sorted_tables:
+        existing = set(column['name'] for column in inspector.get_columns(table.name))
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ""
+                with db.engine.begin() as conn:
+                    conn.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}'))
+        
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    
+    from migrations import migrate
+    return migrate()
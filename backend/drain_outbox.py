@@ -0,0 +1,32 @@
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from outbox import drain, ledger_writer, pending_count
+
+# Append queued ledger blocks outside the web server, e.g. after it stopped with blocks pending
+def main():
+    parser = argparse.ArgumentParser(description='Append ledger blocks queued in the outbox')
+    parser.add_argument('--status', action='store_true', help='only print the number of pending blocks')
+    parser.add_argument('--watch', action='store_true', help='keep appending blocks as they are queued')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.status:
+            print(f"{pending_count()} ledger blocks pending")
+            return
+        if not args.watch:
+            print(f"Appended {drain()} ledger blocks")
+            return
+
+    ledger_writer.start(app)
+    print("Appending ledger blocks from the outbox")
+    try:
+        ledger_writer.join()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
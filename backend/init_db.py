@@ -3,6 +3,7 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app import app, db
+from database import create_schema
 from models import User, Lender, Borrower, Collateral, Loan, Block
 import pytz
 from datetime import datetime
@@ -14,8 +15,8 @@ def get_ist_time():
 
 def init_db():
     with app.app_context():
-        # Create all tables
-        db.create_all()
+        # Create all tables and indexes
+        create_schema()
         
         # Check if admin user already exists
         admin_user = User.query.filter_by(email='admin@gmail.com').first()
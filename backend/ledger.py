@@ -0,0 +1,469 @@
+import hashlib
+import itertools
+import json
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import pytz
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models import Block, LedgerCheckpoint, LedgerOutbox, LedgerSegment, get_ist_time
+import ledger_segments
+import merkle
+
+GENESIS_PREV_HASH = "0" * 64
+IST = pytz.timezone('Asia/Kolkata')
+
+# Number of blocks fetched per round trip while walking the chain
+VERIFY_BATCH_SIZE = 1000
+READ_BATCH_SIZE = 500
+# Ids per range handed to each worker of a parallel full verification
+PARALLEL_CHUNK_SIZE = 50000
+
+# Helper function to compute a block's hash from its stored fields
+def compute_block_hash(prev_hash, unique_data_id, timestamp, nonce):
+    data_string = prev_hash + unique_data_id + timestamp + str(nonce)
+    return hashlib.sha256(data_string.encode()).hexdigest()
+
+# Public JSON shape of a block as returned by /api/ledger
+def block_to_dict(block):
+    return {
+        'id': block.id,
+        'unique_data_id': block.unique_data_id,
+        'prev_hash': block.prev_hash,
+        'hash': block.hash,
+        'timestamp': block.timestamp,
+        'actor': block.actor,
+        'event_type': block.event_type,
+        'metadata': json.loads(block.block_metadata) if block.block_metadata else None
+    }
+
+# Blocks never change once written, so their public JSON is rendered once when appended
+# and responses are assembled by joining the stored strings
+def render_block(block):
+    return json.dumps(block_to_dict(block), separators=(',', ':'))
+
+def block_payload(block):
+    return block.payload or render_block(block)
+
+# Block timestamps are stored as IST ISO strings, so `since` filters compare in that form
+def normalize_ledger_time(value):
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = IST.localize(moment)
+    return moment.astimezone(IST).isoformat()
+
+# Yield blocks with id > after_id in chain order, at most `limit` of them, optionally
+# restricted to one entity, event type or actor and to blocks written at or after `since`.
+# Archived blocks come from the sealed segment files, the rest from the hot blocks table.
+def iter_blocks(after_id=0, limit=None, batch_size=READ_BATCH_SIZE, **filters):
+    remaining = limit
+    for block in ledger_segments.iter_cold_blocks(after_id, **filters):
+        if remaining == 0:
+            return
+        yield block
+        after_id = block.id
+        if remaining is not None:
+            remaining -= 1
+
+    if remaining != 0:
+        yield from _iter_hot_blocks(after_id, remaining, batch_size, **filters)
+
+# Look a block up by id whether it is archived or still in the blocks table
+def get_block(block_id):
+    return Block.query.get(block_id) or ledger_segments.find_cold_block(block_id)
+
+# Each batch is its own keyset query on Block.id, so memory stays flat however long the chain is.
+# Rows come back as plain Core rows with the same attributes as Block, skipping ORM hydration.
+def _iter_hot_blocks(after_id, limit, batch_size, unique_data_id=None, event_type=None, actor=None, since=None):
+    blocks = Block.__table__
+    query = db.select(blocks)
+    if unique_data_id:
+        query = query.where(blocks.c.unique_data_id == unique_data_id)
+    if event_type:
+        query = query.where(blocks.c.event_type == event_type)
+    if actor:
+        query = query.where(blocks.c.actor == actor)
+    if since:
+        query = query.where(blocks.c.timestamp >= since)
+
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        batch = db.session.execute(
+            query.where(blocks.c.id > after_id).order_by(blocks.c.id.asc()).limit(size)
+        ).all()
+        if not batch:
+            return
+
+        for block in batch:
+            yield block
+        after_id = batch[-1].id
+
+        if remaining is not None:
+            remaining -= len(batch)
+        if len(batch) < size:
+            return
+
+class OutboxConflict(Exception):
+    pass
+
+# A group of events appended together by one caller, optionally for the outbox rows they came from
+class _AppendRequest:
+    def __init__(self, events, outbox_ids=None):
+        self.events = events
+        self.outbox_ids = outbox_ids
+        self.blocks = None
+        self.error = None
+        self.done = False
+
+# Serializes ledger appends and group-commits blocks from concurrent requests.
+# The chain tip is kept in memory; block ids are assigned explicitly as tip + 1, so a
+# writer holding a stale tip (e.g. another process appended) hits the primary key
+# instead of forking the chain, reloads the tip and retries.
+class LedgerAppender:
+    MAX_ATTEMPTS = 3
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = []
+        self._writing = False
+        self._tip = None  # (block id, block hash)
+
+    def append(self, unique_data_id, actor, event_type, metadata=None):
+        return self.append_many([(unique_data_id, actor, event_type, metadata)])[0]
+
+    # Load the tip if needed, which also brings the Merkle tree up to date with the table
+    def sync(self):
+        self.append_many([])
+
+    # Append (unique_data_id, actor, event_type, metadata) events as consecutive blocks.
+    # With outbox_ids (one per event) those outbox rows are marked applied in the same
+    # transaction; OutboxConflict is raised if another writer applied any of them first.
+    def append_many(self, events, outbox_ids=None):
+        request = _AppendRequest(list(events), outbox_ids)
+
+        with self._cond:
+            self._pending.append(request)
+            while not request.done:
+                if self._writing:
+                    # Another request is committing; ours joins the next group
+                    self._cond.wait()
+                    continue
+
+                batch = self._pending
+                self._pending = []
+                self._writing = True
+                self._cond.release()
+                try:
+                    self._write(batch)
+                finally:
+                    self._cond.acquire()
+                    self._writing = False
+                    self._cond.notify_all()
+
+        if request.error is not None:
+            raise request.error
+        return request.blocks
+
+    def _load_tip(self, conn):
+        row = conn.execute(
+            db.select(Block.id, Block.hash).order_by(Block.id.desc()).limit(1)
+        ).first()
+        if row:
+            return (row.id, row.hash)
+
+        # Every block may have been archived
+        segment = conn.execute(
+            db.select(LedgerSegment.last_block_id, LedgerSegment.last_hash)
+            .order_by(LedgerSegment.last_block_id.desc()).limit(1)
+        ).first()
+        return (segment.last_block_id, segment.last_hash) if segment else (0, GENESIS_PREV_HASH)
+
+    def _write(self, batch):
+        error = None
+        for _ in range(self.MAX_ATTEMPTS):
+            try:
+                with db.engine.begin() as conn:
+                    if self._tip is None:
+                        self._tip = self._load_tip(conn)
+                        merkle.sync_tree(conn)
+                    rows = self._chain(batch, *self._tip)
+                    if rows:
+                        conn.execute(Block.__table__.insert(), rows)
+                        # The Merkle index is extended in the same transaction as the blocks
+                        merkle.append_leaves(conn, [(row['id'], row['hash']) for row in rows])
+                        self._mark_applied(conn, batch)
+                if rows:
+                    self._tip = (rows[-1]['id'], rows[-1]['hash'])
+                error = None
+                break
+            except IntegrityError as e:
+                # Someone else appended behind our back; rebuild on the real tip
+                self._tip = None
+                error = e
+            except Exception as e:
+                self._tip = None
+                error = e
+                break
+
+        for request in batch:
+            request.error = error
+            request.done = True
+
+    def _mark_applied(self, conn, batch):
+        outbox = LedgerOutbox.__table__
+        applied = [
+            {'o_id': outbox_id, 'o_block_id': block.id}
+            for request in batch if request.outbox_ids
+            for outbox_id, block in zip(request.outbox_ids, request.blocks)
+        ]
+        if not applied:
+            return
+        marked = conn.execute(
+            outbox.update()
+            .where(outbox.c.id == db.bindparam('o_id'), outbox.c.block_id.is_(None))
+            .values(block_id=db.bindparam('o_block_id'), applied_at=get_ist_time()),
+            applied
+        ).rowcount
+        if marked != len(applied):
+            raise OutboxConflict('Outbox rows were already applied by another writer')
+
+    # Link every event in the batch onto the chain tip, returning rows for insertion
+    def _chain(self, batch, tip_id, tip_hash):
+        rows = []
+        for request in batch:
+            request.blocks = []
+            for unique_data_id, actor, event_type, metadata in request.events:
+                tip_id += 1
+                timestamp = get_ist_time().isoformat()
+                nonce = 0
+                row = {
+                    'id': tip_id,
+                    'unique_data_id': unique_data_id,
+                    'prev_hash': tip_hash,
+                    'hash': compute_block_hash(tip_hash, unique_data_id, timestamp, nonce),
+                    'timestamp': timestamp,
+                    'nonce': nonce,
+                    'actor': actor,
+                    'event_type': event_type,
+                    'block_metadata': json.dumps(metadata, separators=(',', ':')) if metadata else None
+                }
+                block = Block(**row)
+                block.payload = row['payload'] = render_block(block)
+                rows.append(row)
+                request.blocks.append(block)
+                tip_hash = row['hash']
+        return rows
+
+ledger_appender = LedgerAppender()
+
+# Messages for the first failure found while walking the chain, keyed by kind
+FAILURE_MESSAGES = {
+    'genesis': "Invalid genesis block prev_hash at index {}",
+    'link': "Hash mismatch at block {}",
+    'hash': "Hash calculation mismatch at block {}"
+}
+
+# Check one block against its predecessor's hash; returns a failure kind or None
+def check_block(index, prev_hash, block_hash, unique_data_id, timestamp, nonce, prev_block_hash):
+    if index == 0:
+        # Genesis block validation
+        if prev_hash != GENESIS_PREV_HASH:
+            return 'genesis'
+        return None
+
+    # Validate hash chain
+    if prev_hash != prev_block_hash:
+        return 'link'
+
+    # Recalculate hash to verify integrity
+    if block_hash != compute_block_hash(prev_hash, unique_data_id, timestamp, nonce):
+        return 'hash'
+    return None
+
+# Walk blocks in chain order starting at position `index`.
+# `prev_block_hash` is the hash of the block just before the first one given.
+# Returns (is_valid, error_message, blocks_checked, last_block_id, last_block_hash)
+def verify_blocks(blocks, index=0, prev_block_hash=None):
+    checked = 0
+    last_id = None
+
+    for block in blocks:
+        failure = check_block(index, block.prev_hash, block.hash, block.unique_data_id,
+                              block.timestamp, block.nonce, prev_block_hash)
+        if failure:
+            return False, FAILURE_MESSAGES[failure].format(index), checked, last_id, prev_block_hash
+
+        prev_block_hash = block.hash
+        last_id = block.id
+        index += 1
+        checked += 1
+
+    return True, None, checked, last_id, prev_block_hash
+
+def _open_readonly(db_path):
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+# Hash and link-check (id, prev_hash, hash, unique_data_id, timestamp, nonce) rows of one range.
+# The link from the range's first block to the previous range is checked when merging.
+def _verify_rows(rows, starts_chain):
+    result = {'count': 0, 'first_prev_hash': None, 'last_id': None, 'last_hash': None, 'failure': None}
+
+    for block_id, prev_hash, block_hash, unique_data_id, timestamp, nonce in rows:
+        offset = result['count']
+        if offset == 0:
+            result['first_prev_hash'] = prev_hash
+            # Pretend the boundary link holds; the merge step checks it for real
+            expected_prev = prev_hash
+        else:
+            expected_prev = result['last_hash']
+
+        index = 0 if starts_chain and offset == 0 else offset + 1
+        failure = check_block(index, prev_hash, block_hash, unique_data_id, timestamp, nonce, expected_prev)
+        if failure:
+            result['failure'] = (offset, failure)
+            return result
+
+        result['count'] += 1
+        result['last_id'] = block_id
+        result['last_hash'] = block_hash
+
+    return result
+
+# Worker task: either an archived segment file or an id range of the blocks table,
+# read on the worker's own read-only handle
+def _verify_task(task):
+    if task[0] == 'segment':
+        _, path, starts_chain = task
+        records = ledger_segments.open_segment(path).records_after(0)
+        return _verify_rows(
+            ((r['id'], r['prev_hash'], r['hash'], r['unique_data_id'], r['timestamp'], r['nonce']) for r in records),
+            starts_chain
+        )
+
+    _, db_path, first_id, last_id, starts_chain = task
+    conn = _open_readonly(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT id, prev_hash, hash, unique_data_id, timestamp, nonce FROM blocks "
+            "WHERE id BETWEEN ? AND ? ORDER BY id",
+            (first_id, last_id)
+        )
+        return _verify_rows(rows, starts_chain)
+    finally:
+        conn.close()
+
+# Full-chain verification split into archived segments and id ranges of the blocks table,
+# hashed by a process pool. Returns the same tuple as verify_blocks, with the exact index
+# of the first failure.
+def verify_chain_parallel(db_path, workers=None, chunk_size=PARALLEL_CHUNK_SIZE, segment_paths=()):
+    conn = _open_readonly(db_path)
+    try:
+        first_id, last_id = conn.execute("SELECT MIN(id), MAX(id) FROM blocks").fetchone()
+    finally:
+        conn.close()
+
+    tasks = [('segment', path, position == 0) for position, path in enumerate(segment_paths)]
+    if first_id is not None:
+        for start in range(first_id, last_id + 1, chunk_size):
+            tasks.append(('range', db_path, start, min(start + chunk_size - 1, last_id), not tasks))
+
+    index = 0
+    prev_id = None
+    prev_hash = None
+    if not tasks:
+        return True, None, index, prev_id, prev_hash
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(_verify_task, tasks):
+            if result['count'] == 0 and result['failure'] is None:
+                continue
+
+            # Link between this range and the last block of the previous one
+            if index > 0 and result['first_prev_hash'] != prev_hash:
+                return False, FAILURE_MESSAGES['link'].format(index), index, prev_id, prev_hash
+
+            if result['failure']:
+                offset, failure = result['failure']
+                return False, FAILURE_MESSAGES[failure].format(index + offset), index + offset, prev_id, prev_hash
+
+            index += result['count']
+            prev_id = result['last_id']
+            prev_hash = result['last_hash']
+
+    return True, None, index, prev_id, prev_hash
+
+# Verify the ledger, resuming from the stored checkpoint unless a full audit is requested
+# or the last full audit is older than `full_interval_hours`. A failed run is recorded on the
+# checkpoint, and every run after it is a full audit until one passes.
+# Full audits of a file-backed database are spread over `workers` processes when workers > 1.
+def verify_chain(full=False, full_interval_hours=24, workers=1, chunk_size=PARALLEL_CHUNK_SIZE):
+    now = get_ist_time().replace(tzinfo=None)
+    checkpoint = LedgerCheckpoint.query.first()
+
+    if checkpoint is None or checkpoint.full_verified_at is None:
+        full = True
+    elif full_interval_hours and now - checkpoint.full_verified_at >= timedelta(hours=full_interval_hours):
+        full = True
+
+    db_path = db.engine.url.database
+    if full and workers and workers > 1 and db_path and db_path != ':memory:':
+        index = 0
+        segment_paths = [segment.path for segment in ledger_segments.segments()]
+        result = verify_chain_parallel(db_path, workers, chunk_size, segment_paths)
+    else:
+        query = Block.query.order_by(Block.id.asc())
+
+        if full:
+            index = 0
+            # Archived blocks first, then the hot tail
+            blocks = itertools.chain(ledger_segments.iter_cold_blocks(), query.yield_per(VERIFY_BATCH_SIZE))
+            result = verify_blocks(blocks, index, None)
+        else:
+            # The checkpointed block must still be the one we verified last time
+            anchor = get_block(checkpoint.block_id)
+            index = checkpoint.block_index + 1
+            if anchor is None or anchor.hash != checkpoint.block_hash:
+                result = (False, f"Checkpointed block {checkpoint.block_index} was modified", 0, None, None)
+            else:
+                # Only verified blocks are ever archived, so everything newer is in the blocks table
+                blocks = query.filter(Block.id > checkpoint.block_id).yield_per(VERIFY_BATCH_SIZE)
+                result = verify_blocks(blocks, index, checkpoint.block_hash)
+
+    is_valid, error_message, checked, last_id, last_hash = result
+
+    # Only move the checkpoint forward over blocks that verified cleanly
+    if is_valid and last_id is not None:
+        if checkpoint is None:
+            checkpoint = LedgerCheckpoint()
+            db.session.add(checkpoint)
+
+        checkpoint.block_id = last_id
+        checkpoint.block_index = index + checked - 1
+        checkpoint.block_hash = last_hash
+        checkpoint.verified_at = now
+        if full:
+            checkpoint.full_verified_at = now
+            checkpoint.failed_at = None
+            checkpoint.failure = None
+        db.session.commit()
+    elif is_valid and full and checkpoint is not None:
+        # Empty chain: nothing left to resume from
+        db.session.delete(checkpoint)
+        db.session.commit()
+    elif not is_valid and checkpoint is not None:
+        # Keep the failure, so no later incremental run can report the chain as valid.
+        # Without a checkpoint every run is a full audit anyway.
+        checkpoint.full_verified_at = None
+        checkpoint.failed_at = now
+        checkpoint.failure = error_message
+        db.session.commit()
+
+    return {
+        'is_valid': is_valid,
+        'error_message': error_message,
+        'mode': 'full' if full else 'incremental',
+        'verified_blocks': checked
+    }
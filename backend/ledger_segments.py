@@ -0,0 +1,219 @@
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from database import db
+from models import Block, LedgerCheckpoint, LedgerSegment, get_ist_time
+
+# Segment file layout:
+#   MAGIC | zlib-compressed JSON record per block | entry table | key table | footer
+# The entry table maps block id -> (offset, length) in id order, the key table maps a
+# 64-bit digest of unique_data_id -> record ordinal sorted by digest. Files are written
+# once to a temporary name, fsynced and renamed into place, and never modified again.
+MAGIC = b'DFLSEG01'
+ENTRY = struct.Struct('<QQI')        # block id, record offset, record length
+KEY_ENTRY = struct.Struct('<QI')     # unique_data_id digest, record ordinal
+FOOTER = struct.Struct('<QQI8s')     # entry table offset, key table offset, record count, magic
+
+COLUMNS = ['id', 'unique_data_id', 'prev_hash', 'hash', 'timestamp', 'nonce', 'actor', 'event_type', 'block_metadata', 'payload']
+
+class UnverifiedLedger(Exception):
+    pass
+
+def _key(unique_data_id):
+    return int.from_bytes(hashlib.sha1(unique_data_id.encode()).digest()[:8], 'little')
+
+# Read-only view of one segment file through mmap
+class SegmentReader:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._entries, self._keys, self._count, magic = FOOTER.unpack_from(self._mm, len(self._mm) - FOOTER.size)
+        if magic != MAGIC or self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a ledger segment")
+
+    def __len__(self):
+        return self._count
+
+    def block_id_at(self, ordinal):
+        return ENTRY.unpack_from(self._mm, self._entries + ordinal * ENTRY.size)[0]
+
+    def _key_at(self, position):
+        return KEY_ENTRY.unpack_from(self._mm, self._keys + position * KEY_ENTRY.size)
+
+    def record(self, ordinal):
+        _, offset, length = ENTRY.unpack_from(self._mm, self._entries + ordinal * ENTRY.size)
+        return json.loads(zlib.decompress(self._mm[offset:offset + length]))
+
+    # Raw records (dicts) with id > after_id, in chain order
+    def records_after(self, after_id=0):
+        start = bisect.bisect_right(range(self._count), after_id, key=self.block_id_at)
+        for ordinal in range(start, self._count):
+            yield self.record(ordinal)
+
+    def find(self, block_id):
+        ordinal = bisect.bisect_left(range(self._count), block_id, key=self.block_id_at)
+        if ordinal < self._count and self.block_id_at(ordinal) == block_id:
+            return self.record(ordinal)
+        return None
+
+    # Records for one unique_data_id, via the key table instead of a scan
+    def find_by_unique_data_id(self, unique_data_id):
+        key = _key(unique_data_id)
+        position = bisect.bisect_left(range(self._count), key, key=lambda p: self._key_at(p)[0])
+        ordinals = []
+        while position < self._count:
+            digest, ordinal = self._key_at(position)
+            if digest != key:
+                break
+            ordinals.append(ordinal)
+            position += 1
+
+        records = [self.record(ordinal) for ordinal in sorted(ordinals)]
+        return [record for record in records if record['unique_data_id'] == unique_data_id]
+
+_readers = {}
+_readers_lock = threading.Lock()
+
+# Segment files never change, so mapped readers are shared for the life of the process
+def open_segment(path):
+    with _readers_lock:
+        reader = _readers.get(path)
+        if reader is None:
+            reader = _readers[path] = SegmentReader(path)
+        return reader
+
+def write_segment(path, rows):
+    tmp_path = path + '.tmp'
+    entries = []
+    keys = []
+
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        offset = len(MAGIC)
+        for ordinal, row in enumerate(rows):
+            data = zlib.compress(json.dumps(row, separators=(',', ':')).encode())
+            f.write(data)
+            entries.append(ENTRY.pack(row['id'], offset, len(data)))
+            keys.append((_key(row['unique_data_id']), ordinal))
+            offset += len(data)
+
+        entries_offset = offset
+        f.write(b''.join(entries))
+        keys_offset = entries_offset + len(entries) * ENTRY.size
+        f.write(b''.join(KEY_ENTRY.pack(*key) for key in sorted(keys)))
+        f.write(FOOTER.pack(entries_offset, keys_offset, len(rows), MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+
+def segments(after_id=0):
+    return LedgerSegment.query.filter(LedgerSegment.last_block_id > after_id).order_by(LedgerSegment.first_block_id.asc()).all()
+
+def last_segment():
+    return LedgerSegment.query.order_by(LedgerSegment.last_block_id.desc()).first()
+
+def _matches(record, event_type, actor, since):
+    if event_type and record['event_type'] != event_type:
+        return False
+    if actor and record['actor'] != actor:
+        return False
+    if since and record['timestamp'] < since:
+        return False
+    return True
+
+# Archived blocks with id > after_id in chain order, as detached Block objects.
+# unique_data_id lookups use each segment's key table; other filters scan the segment.
+def iter_cold_blocks(after_id=0, unique_data_id=None, event_type=None, actor=None, since=None):
+    for segment in segments(after_id):
+        reader = open_segment(segment.path)
+        if unique_data_id:
+            records = (r for r in reader.find_by_unique_data_id(unique_data_id) if r['id'] > after_id)
+        else:
+            records = reader.records_after(after_id)
+
+        for record in records:
+            if _matches(record, event_type, actor, since):
+                yield Block(**record)
+
+def find_cold_block(block_id):
+    segment = LedgerSegment.query.filter(
+        LedgerSegment.first_block_id <= block_id,
+        LedgerSegment.last_block_id >= block_id
+    ).first()
+    if segment is None:
+        return None
+    record = open_segment(segment.path).find(block_id)
+    return Block(**record) if record else None
+
+# Move verified blocks older than the newest `keep_hot` out of SQLite into sealed segment
+# files of exactly `segment_size` blocks each. Only blocks covered by the verification
+# checkpoint of a passing full audit are sealed, and each range is re-verified against the
+# chain right before it is written, since the blocks table may have changed since the audit.
+# Raises UnverifiedLedger instead of sealing anything unverified.
+def seal_segments(folder, segment_size, keep_hot):
+    from ledger import verify_blocks
+
+    checkpoint = LedgerCheckpoint.query.first()
+    if checkpoint is None or checkpoint.full_verified_at is None or checkpoint.failed_at is not None:
+        raise UnverifiedLedger('The ledger has no passing full verification; run one before archiving')
+
+    os.makedirs(folder, exist_ok=True)
+    previous = last_segment()
+    last_sealed_id = previous.last_block_id if previous else 0
+    # Position and hash of the last archived block, where the next range has to link on
+    index = db.session.query(db.func.sum(LedgerSegment.block_count)).scalar() or 0
+    prev_hash = previous.last_hash if previous else None
+    max_id = db.session.query(db.func.max(Block.id)).scalar() or 0
+    sealable_upto = min(checkpoint.block_id, max_id - keep_hot)
+
+    blocks = Block.__table__
+    sealed = []
+    while True:
+        rows = db.session.execute(
+            db.select(*[blocks.c[name] for name in COLUMNS])
+            .where(blocks.c.id > last_sealed_id, blocks.c.id <= sealable_upto)
+            .order_by(blocks.c.id.asc())
+            .limit(segment_size)
+        ).all()
+        if len(rows) < segment_size:
+            break
+
+        is_valid, error_message, _, _, _ = verify_blocks(rows, index, prev_hash)
+        if not is_valid:
+            # Same as a failed verification run: nothing is trusted until a full audit passes
+            checkpoint.full_verified_at = None
+            checkpoint.failed_at = get_ist_time().replace(tzinfo=None)
+            checkpoint.failure = error_message
+            db.session.commit()
+            raise UnverifiedLedger(error_message)
+
+        rows = [dict(row._mapping) for row in rows]
+        first_id, last_id = rows[0]['id'], rows[-1]['id']
+        path = os.path.join(folder, f"segment_{first_id:012d}_{last_id:012d}.seg")
+        write_segment(path, rows)
+
+        # The file is durable before the hot rows go away
+        segment = LedgerSegment(
+            first_block_id=first_id,
+            last_block_id=last_id,
+            block_count=len(rows),
+            last_hash=rows[-1]['hash'],
+            path=path
+        )
+        db.session.add(segment)
+        db.session.execute(blocks.delete().where(blocks.c.id >= first_id, blocks.c.id <= last_id))
+        db.session.commit()
+
+        sealed.append(segment)
+        last_sealed_id = last_id
+        index += len(rows)
+        prev_hash = rows[-1]['hash']
+
+    return sealed
@@ -0,0 +1,130 @@
+import bisect
+import threading
+import time
+import numpy as np
+from database import db
+from models import Lender
+
+# Look for lenders registered by other processes and the CLI scripts at most this often
+MAX_AGE_SECONDS = 5
+
+# Lenders per block of the book; a block is split in two once it holds twice this many
+BLOCK_SIZE = 64
+
+lenders = Lender.__table__
+columns = (lenders.c.id, lenders.c.min_amount, lenders.c.max_amount, lenders.c.account_balance, lenders.c.interest_rate)
+
+# (interest_rate, id, lowest amount, highest amount) for a lender. The highest amount a lender
+# can fund is its max_amount or its balance, whichever is smaller.
+def _entry(lender):
+    highest = min(lender.max_amount or 0.0, lender.account_balance or 0.0)
+    return (lender.interest_rate or 0.0, lender.id, lender.min_amount or 0.0, highest)
+
+# In-memory book matching loan requests to lenders.
+# Lenders are kept sorted by (interest_rate, id), so the cheapest eligible lender is the first
+# one in that order whose amount range covers the request. The sorted entries are cut into
+# blocks, and the lowest and highest amount any lender in a block takes are kept in numpy
+# arrays: a match only looks inside the blocks whose range covers the amount.
+# The book is loaded once, then kept up to date with refresh_lender wherever this process
+# changes a lender. Money only moves through the conditional updates in accounts.py, which
+# re-check everything against the database, so an entry made stale by another process can only
+# cost a retry (auto-approval refreshes the lender and moves on).
+class LenderBook:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._checked_at = None
+        self._last_id = 0
+        self._lenders = {}    # lender id -> entry
+        self._blocks = []     # lists of entries, in order
+        self._firsts = []     # (interest_rate, id) of the first entry in each block
+        self._lowest = np.empty(0)
+        self._highest = np.empty(0)
+
+    def _load(self):
+        if self._loaded:
+            return
+        rows = db.session.execute(db.select(*columns)).all()
+        entries = sorted(_entry(row) for row in rows)
+        self._lenders = {entry[1]: entry for entry in entries}
+        self._blocks = [entries[i:i + BLOCK_SIZE] for i in range(0, len(entries), BLOCK_SIZE)]
+        self._index_blocks()
+        self._last_id = max(self._lenders, default=0)
+        self._checked_at = time.monotonic()
+        self._loaded = True
+
+    # Pick up lenders added since the last look (by id, so this reads only the new rows)
+    def _add_new_lenders(self):
+        if time.monotonic() - self._checked_at < MAX_AGE_SECONDS:
+            return
+        rows = db.session.execute(db.select(*columns).where(lenders.c.id > self._last_id)).all()
+        for row in rows:
+            self._put(_entry(row))
+        self._checked_at = time.monotonic()
+
+    # Rebuild the per-block bounds after blocks were added or removed
+    def _index_blocks(self):
+        self._firsts = [block[0][:2] for block in self._blocks]
+        self._lowest = np.array([min(entry[2] for entry in block) for block in self._blocks], dtype=float)
+        self._highest = np.array([max(entry[3] for entry in block) for block in self._blocks], dtype=float)
+
+    def _block_for(self, key):
+        return max(bisect.bisect_right(self._firsts, key) - 1, 0)
+
+    def _put(self, entry):
+        self._remove(entry[1])
+        self._lenders[entry[1]] = entry
+        self._last_id = max(self._last_id, entry[1])
+        if not self._blocks:
+            self._blocks.append([entry])
+            self._index_blocks()
+            return
+        i = self._block_for(entry[:2])
+        block = self._blocks[i]
+        bisect.insort(block, entry)
+        if len(block) > 2 * BLOCK_SIZE:
+            self._blocks[i:i + 1] = [block[:BLOCK_SIZE], block[BLOCK_SIZE:]]
+            self._index_blocks()
+        else:
+            self._firsts[i] = block[0][:2]
+            self._lowest[i] = min(self._lowest[i], entry[2])
+            self._highest[i] = max(self._highest[i], entry[3])
+
+    def _remove(self, lender_id):
+        entry = self._lenders.pop(lender_id, None)
+        if entry is None:
+            return
+        i = self._block_for(entry[:2])
+        block = self._blocks[i]
+        del block[bisect.bisect_left(block, entry)]
+        if not block:
+            del self._blocks[i]
+            self._index_blocks()
+        else:
+            self._firsts[i] = block[0][:2]
+            self._lowest[i] = min(other[2] for other in block)
+            self._highest[i] = max(other[3] for other in block)
+
+    # Re-read a lender's terms and balance after this process changed them
+    def refresh_lender(self, lender_id):
+        lender = db.session.get(Lender, lender_id)
+        with self._lock:
+            if not self._loaded:
+                return
+            if lender is None:
+                self._remove(lender_id)
+            else:
+                self._put(_entry(lender))
+
+    # Lowest-rate lender able to fund `amount`, skipping lenders in `exclude`
+    def match(self, amount, exclude=()):
+        with self._lock:
+            self._load()
+            self._add_new_lenders()
+            for i in np.flatnonzero((self._lowest <= amount) & (self._highest >= amount)):
+                for _, lender_id, lowest, highest in self._blocks[i]:
+                    if lowest <= amount <= highest and lender_id not in exclude:
+                        return lender_id
+            return None
+
+lender_book = LenderBook()
@@ -0,0 +1,198 @@
+import hashlib
+import hmac
+from flask import current_app
+from database import db
+from models import Block, MerkleNode, MerkleRoot, get_ist_time
+import ledger_segments
+
+# A signed root is recorded every time the tree grows past a multiple of this many leaves
+ROOT_INTERVAL = 1000
+SYNC_BATCH_SIZE = 1000
+
+nodes = MerkleNode.__table__
+
+# Leaves and interior nodes are hashed with different prefixes so one can't pass for the other
+def leaf_hash(block_hash):
+    return hashlib.sha256(b'\x00' + block_hash.encode()).hexdigest()
+
+def node_hash(left, right):
+    return hashlib.sha256(b'\x01' + left.encode() + right.encode()).hexdigest()
+
+# Number of nodes on `level` of a tree with `size` leaves.
+# A node without a right sibling is promoted to the next level unchanged.
+def level_width(size, level):
+    return (size + (1 << level) - 1) >> level
+
+# Sign a tree size and root with the app's Merkle key so clients can trust a proof's root
+def sign_root(tree_size, root_hash):
+    key = current_app.config.get('MERKLE_SIGNING_KEY') or current_app.config['SECRET_KEY']
+    message = f"{tree_size}:{root_hash}".encode()
+    return hmac.new(key.encode(), message, hashlib.sha256).hexdigest()
+
+def tree_size(conn):
+    last = conn.execute(
+        db.select(db.func.max(nodes.c.position)).where(nodes.c.level == 0)
+    ).scalar()
+    return 0 if last is None else last + 1
+
+def root_hash(conn, size=None):
+    size = tree_size(conn) if size is None else size
+    if size == 0:
+        return None
+    top = (size - 1).bit_length()
+    return conn.execute(
+        db.select(nodes.c.hash).where(nodes.c.level == top, nodes.c.position == 0)
+    ).scalar()
+
+# Append (block_id, block_hash) leaves and recompute only the nodes on their paths to the root
+def append_leaves(conn, leaves):
+    if not leaves:
+        return
+    start = tree_size(conn)
+    size = start + len(leaves)
+
+    updated = {}
+    rows = []
+    for offset, (block_id, block_hash) in enumerate(leaves):
+        h = leaf_hash(block_hash)
+        updated[(0, start + offset)] = h
+        rows.append({'level': 0, 'position': start + offset, 'hash': h, 'block_id': block_id})
+
+    level, lo, hi = 0, start, size - 1
+    while level_width(size, level) > 1:
+        width = level_width(size, level)
+        # The only child we may not have just computed is the left sibling of the first leaf
+        if lo % 2 == 1 and (level, lo - 1) not in updated:
+            updated[(level, lo - 1)] = conn.execute(
+                db.select(nodes.c.hash).where(nodes.c.level == level, nodes.c.position == lo - 1)
+            ).scalar()
+
+        for parent in range(lo // 2, hi // 2 + 1):
+            left = updated[(level, 2 * parent)]
+            if 2 * parent + 1 < width:
+                h = node_hash(left, updated[(level, 2 * parent + 1)])
+            else:
+                h = left
+            updated[(level + 1, parent)] = h
+            rows.append({'level': level + 1, 'position': parent, 'hash': h, 'block_id': None})
+
+        level, lo, hi = level + 1, lo // 2, hi // 2
+
+    conn.execute(nodes.insert().prefix_with('OR REPLACE'), rows)
+
+    # Publish a signed root whenever we cross a ROOT_INTERVAL boundary
+    if start // ROOT_INTERVAL != size // ROOT_INTERVAL:
+        root = updated[(level, 0)]
+        conn.execute(MerkleRoot.__table__.insert(), {
+            'tree_size': size,
+            'root_hash': root,
+            'signature': sign_root(size, root),
+            'created_at': get_ist_time()
+        })
+
+# Bring the tree up to date with blocks written without it (existing ledgers, other tools)
+def sync_tree(conn):
+    last_block_id = conn.execute(
+        db.select(nodes.c.block_id).where(nodes.c.level == 0).order_by(nodes.c.position.desc()).limit(1)
+    ).scalar() or 0
+
+    # Blocks archived before the tree ever saw them
+    batch = []
+    for block in ledger_segments.iter_cold_blocks(last_block_id):
+        batch.append((block.id, block.hash))
+        if len(batch) == SYNC_BATCH_SIZE:
+            append_leaves(conn, batch)
+            batch = []
+    if batch:
+        append_leaves(conn, batch)
+        last_block_id = batch[-1][0]
+
+    while True:
+        batch = conn.execute(
+            db.select(Block.id, Block.hash)
+            .where(Block.id > last_block_id)
+            .order_by(Block.id.asc())
+            .limit(SYNC_BATCH_SIZE)
+        ).all()
+        if not batch:
+            return
+        append_leaves(conn, [(row.id, row.hash) for row in batch])
+        last_block_id = batch[-1].id
+
+# Sibling hashes from leaf `position` up to the root of a tree with `size` leaves
+def inclusion_path(conn, position, size):
+    wanted = []
+    level, pos = 0, position
+    while level_width(size, level) > 1:
+        sibling = pos ^ 1
+        if sibling < level_width(size, level):
+            wanted.append((level, sibling, 'left' if sibling < pos else 'right'))
+        level, pos = level + 1, pos // 2
+
+    if not wanted:
+        return []
+
+    found = dict(
+        ((row.level, row.position), row.hash)
+        for row in conn.execute(
+            db.select(nodes.c.level, nodes.c.position, nodes.c.hash).where(
+                db.or_(*[db.and_(nodes.c.level == l, nodes.c.position == p) for l, p, _ in wanted])
+            )
+        )
+    )
+    return [{'hash': found[(l, p)], 'side': side} for l, p, side in wanted]
+
+# Recompute a root from a block hash and its inclusion path
+def verify_proof(block_hash, path, expected_root):
+    h = leaf_hash(block_hash)
+    for step in path:
+        h = node_hash(step['hash'], h) if step['side'] == 'left' else node_hash(h, step['hash'])
+    return h == expected_root
+
+# Inclusion proofs for every block recorded under `unique_data_id`, against the current root
+def build_proofs(unique_data_id):
+    conn = db.session.connection()
+    size = tree_size(conn)
+    root = root_hash(conn, size)
+
+    blocks = ledger_segments.iter_cold_blocks(unique_data_id=unique_data_id)
+    blocks = list(blocks) + Block.query.filter(Block.unique_data_id == unique_data_id).order_by(Block.id.asc()).all()
+
+    positions = {}
+    if blocks:
+        positions = dict(
+            (row.block_id, (row.position, row.hash))
+            for row in conn.execute(
+                db.select(nodes.c.block_id, nodes.c.position, nodes.c.hash)
+                .where(nodes.c.level == 0, nodes.c.block_id.in_([block.id for block in blocks]))
+            )
+        )
+
+    proofs = []
+    for block in blocks:
+        if block.id not in positions:
+            continue
+        position, leaf = positions[block.id]
+        proofs.append({
+            'block_id': block.id,
+            'block_hash': block.hash,
+            'event_type': block.event_type,
+            'leaf_index': position,
+            'leaf_hash': leaf,
+            'path': inclusion_path(conn, position, size)
+        })
+
+    latest = MerkleRoot.query.order_by(MerkleRoot.id.desc()).first()
+
+    return {
+        'tree_size': size,
+        'root': root,
+        'signature': sign_root(size, root) if root else None,
+        'latest_signed_root': {
+            'tree_size': latest.tree_size,
+            'root': latest.root_hash,
+            'signature': latest.signature,
+            'created_at': latest.created_at.isoformat() if latest.created_at else None
+        } if latest else None,
+        'proofs': proofs
+    }
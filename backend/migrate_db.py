@@ -0,0 +1,36 @@
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from database import create_schema
+from migrations import LATEST_VERSION, current_version, slow_plans
+
+# Bring the database schema up to date, or check that hot queries are served by indexes
+def main():
+    parser = argparse.ArgumentParser(description='Apply pending schema migrations')
+    parser.add_argument('--status', action='store_true', help='only print the schema version')
+    parser.add_argument('--check-plans', action='store_true',
+                        help='fail if any hot query is planned as a full table or index scan or a sort')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.status:
+            print(f"Schema version {current_version()} (latest {LATEST_VERSION})")
+            return
+
+        if args.check_plans:
+            slow = slow_plans()
+            for name, plan in sorted(slow.items()):
+                print(f"{name}: {' | '.join(plan)}")
+            print("Every hot query uses an index" if not slow else f"{len(slow)} hot queries scan a whole table or sort")
+            sys.exit(1 if slow else 0)
+
+        applied = create_schema()
+        for number, description in applied:
+            print(f"Applied migration {number}: {description}")
+        print(f"Schema is at version {current_version()}")
+
+if __name__ == '__main__':
+    main()
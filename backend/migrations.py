@@ -0,0 +1,133 @@
+from datetime import datetime
+from database import db
+from models import Borrower, Lender, Loan, User
+from overdue import ACTIVE_STATUSES
+from queries import BORROWER_SORTS, LENDER_SORTS, LOAN_SORTS, _after
+
+# Versioned schema migrations for changes db.create_all() cannot make to an existing database.
+# The database's version is kept in SQLite's user_version pragma. Each migration runs once, in
+# order, in its own transaction together with the version bump. Append new migrations to the
+# end of the list and never edit one that has shipped.
+MIGRATIONS = [
+    (1, 'Indexes for hot lookups', [
+        # 24-hour cooldown check and a borrower's loans
+        'CREATE INDEX IF NOT EXISTS ix_loans_borrower_id_created_at ON loans (borrower_id, created_at)',
+        # A lender's loans, paged by id
+        'CREATE INDEX IF NOT EXISTS ix_loans_lender_id_id ON loans (lender_id, id)',
+        # Requested loans for the request list and the matching engine
+        'CREATE INDEX IF NOT EXISTS ix_loans_status_id ON loans (status, id)',
+        'CREATE INDEX IF NOT EXISTS ix_users_name ON users (name)',
+        'CREATE INDEX IF NOT EXISTS ix_lenders_user_id ON lenders (user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_borrowers_user_id ON borrowers (user_id)',
+    ]),
+    (2, 'Record when loans went overdue', [
+        # Loans swept before loans.overdue_at existed; those already repaid can't be told apart
+        "UPDATE loans SET overdue_at = due_date WHERE status = 'overdue' AND overdue_at IS NULL",
+    ]),
+    (3, 'Indexes for list sort orders', [
+        # Loan lists are always filtered by status, lender or borrower, then sorted
+        'CREATE INDEX IF NOT EXISTS ix_loans_status_amount_id ON loans (status, amount, id)',
+        'CREATE INDEX IF NOT EXISTS ix_loans_status_created_at_id ON loans (status, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS ix_loans_lender_id_amount_id ON loans (lender_id, amount, id)',
+        'CREATE INDEX IF NOT EXISTS ix_loans_lender_id_created_at_id ON loans (lender_id, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS ix_loans_borrower_id_id ON loans (borrower_id, id)',
+        'CREATE INDEX IF NOT EXISTS ix_loans_borrower_id_amount_id ON loans (borrower_id, amount, id)',
+        # Also serves the 24-hour cooldown check, which used the index dropped below
+        'CREATE INDEX IF NOT EXISTS ix_loans_borrower_id_created_at_id ON loans (borrower_id, created_at, id)',
+        'DROP INDEX IF EXISTS ix_loans_borrower_id_created_at',
+        'CREATE INDEX IF NOT EXISTS ix_lenders_created_at_id ON lenders (created_at, id)',
+        'CREATE INDEX IF NOT EXISTS ix_lenders_interest_rate_id ON lenders (interest_rate, id)',
+        'CREATE INDEX IF NOT EXISTS ix_lenders_account_balance_id ON lenders (account_balance, id)',
+        'CREATE INDEX IF NOT EXISTS ix_borrowers_created_at_id ON borrowers (created_at, id)',
+        'CREATE INDEX IF NOT EXISTS ix_borrowers_credit_score_id ON borrowers (credit_score, id)',
+        'CREATE INDEX IF NOT EXISTS ix_borrowers_account_balance_id ON borrowers (account_balance, id)',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def current_version():
+    return db.session.execute(db.text('PRAGMA user_version')).scalar()
+
+# Apply every migration newer than the database. Returns the (version, description) applied.
+def migrate():
+    applied = []
+    version = current_version()
+    db.session.commit()
+    for number, description, statements in MIGRATIONS:
+        if number <= version:
+            continue
+        with db.engine.begin() as conn:
+            for statement in statements:
+                conn.execute(db.text(statement))
+            conn.execute(db.text(f'PRAGMA user_version = {number}'))
+        applied.append((number, description))
+    return applied
+
+# The queries on the request path that must be answered through an index. Parameter values
+# only need to have the right types.
+def hot_queries():
+    now = datetime(2000, 1, 1)
+    queries = {
+        'loan cooldown': db.select(Loan.id).where(Loan.borrower_id == 1, Loan.created_at > now).limit(1),
+        'borrower loans': db.select(Loan.id).where(Loan.borrower_id == 1).order_by(Loan.id).limit(100),
+        'lender loans': db.select(Loan.id).where(Loan.lender_id == 1).order_by(Loan.id).limit(100),
+        'loan requests': db.select(Loan.id).where(Loan.status == 'requested').order_by(Loan.id).limit(100),
+        'loans between users': db.select(Loan.id).where(Loan.lender_id == 1, Loan.borrower_id == 1),
+        'overdue sweep': db.select(Loan.id).where(Loan.status.in_(ACTIVE_STATUSES), Loan.due_date < now).limit(1000),
+        'user by email': db.select(User.id).where(User.email == 'someone@example.com'),
+        'user by name': db.select(User.id).where(User.name == 'someone', User.role == 'lender'),
+        'lender by user': db.select(Lender.id).where(Lender.user_id == 1),
+        'borrower by user': db.select(Borrower.id).where(Borrower.user_id == 1),
+    }
+    # Later pages of every sort order of the list endpoints, in both directions. Each range
+    # after the cursor is read on its own (see queries.paginate).
+    for label, query, column, model, descending in list_pages():
+        value = now if isinstance(column.type, db.DateTime) else 1
+        for after in (value, None):
+            for i, condition in enumerate(_after(column, model.id, after, 1, descending)):
+                queries[f"{label}, next page after {'NULL' if after is None else 'a value'}, range {i + 1}"] = query.where(condition)
+    return queries
+
+# The first page of every sort order of the list endpoints, as (label, statement, sort column,
+# model, descending). Pages of a list without filters are read by walking an index in order.
+def list_pages():
+    pages = []
+    lists = [
+        ('loan requests', Loan, LOAN_SORTS, Loan.status == 'requested'),
+        ('lender loans', Loan, LOAN_SORTS, Loan.lender_id == 1),
+        ('borrower loans', Loan, LOAN_SORTS, Loan.borrower_id == 1),
+        ('lenders', Lender, LENDER_SORTS, db.true()),
+        ('borrowers', Borrower, BORROWER_SORTS, db.true()),
+    ]
+    for name, model, sorts, condition in lists:
+        for key, column in sorts.items():
+            for descending in (False, True):
+                order = [column.desc(), model.id.desc()] if descending else [column, model.id]
+                label = f"{name} by {'-' if descending else ''}{key}"
+                pages.append((label, db.select(model.id).where(condition).order_by(*order).limit(100), column, model, descending))
+    return pages
+
+# SQLite's plan for a statement, one detail line per step
+def query_plan(statement):
+    sql = statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}').all()
+    return [row[-1] for row in rows]
+
+def _sorts(plan):
+    return any(detail.startswith('USE TEMP B-TREE') for detail in plan)
+
+# Hot queries whose plan reads a whole table or index, and list pages that sort their rows
+# instead of reading them in order from an index, as {name: plan}
+def slow_plans():
+    slow = {}
+    for name, statement in hot_queries().items():
+        plan = query_plan(statement)
+        if _sorts(plan) or any(detail.startswith('SCAN ') and detail != 'SCAN CONSTANT ROW' for detail in plan):
+            slow[name] = plan
+    for label, statement, *_ in list_pages():
+        plan = query_plan(statement)
+        if _sorts(plan):
+            slow[label] = plan
+    return slow
@@ -26,6 +26,12 @@ class User(db.Model):
 # Lender model
 class Lender(db.Model):
     __tablename__ = 'lenders'
+    __table_args__ = (
+        # Sort orders of the lender list
+        db.Index('ix_lenders_created_at_id', 'created_at', 'id'),
+        db.Index('ix_lenders_interest_rate_id', 'interest_rate', 'id'),
+        db.Index('ix_lenders_account_balance_id', 'account_balance', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -39,6 +45,12 @@ class Lender(db.Model):
 # Borrower model
 class Borrower(db.Model):
     __tablename__ = 'borrowers'
+    __table_args__ = (
+        # Sort orders of the borrower list
+        db.Index('ix_borrowers_created_at_id', 'created_at', 'id'),
+        db.Index('ix_borrowers_credit_score_id', 'credit_score', 'id'),
+        db.Index('ix_borrowers_account_balance_id', 'account_balance', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -62,29 +74,112 @@ class Collateral(db.Model):
     uploaded_at = db.Column(db.DateTime, default=get_ist_time)
     file_metadata = db.Column(db.Text, nullable=True)
     unique_data_id = db.Column(db.String(100), unique=True, nullable=False)
+    content_hash = db.Column(db.String(64), db.ForeignKey('collateral_blobs.sha256'), nullable=True)  # SHA-256 of the file
+    size = db.Column(db.Integer, nullable=True)
+
+# Stored collateral file, shared by every collateral with the same content
+class CollateralBlob(db.Model):
+    __tablename__ = 'collateral_blobs'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    path = db.Column(db.String(200), nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # Collaterals pointing at this blob
+    created_at = db.Column(db.DateTime, default=get_ist_time)
+
+# Background processing of an uploaded collateral (see collateral_jobs.py)
+class CollateralJob(db.Model):
+    __tablename__ = 'collateral_jobs'
+    __table_args__ = (
+        # Workers claim the oldest due job
+        db.Index('ix_collateral_jobs_status_run_after', 'status', 'run_after'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    collateral_id = db.Column(db.Integer, db.ForeignKey('collaterals.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, nullable=False)  # Not claimed before this time (retry backoff)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=get_ist_time)
+    updated_at = db.Column(db.DateTime, default=get_ist_time)
 
 # Loan model
 class Loan(db.Model):
     __tablename__ = 'loans'
+    __table_args__ = (
+        # The overdue sweep scans active loans by due date
+        db.Index('ix_loans_status_due_date', 'status', 'due_date'),
+        # Loan lists are filtered by status, lender or borrower and sorted by id, amount or
+        # creation time
+        db.Index('ix_loans_status_amount_id', 'status', 'amount', 'id'),
+        db.Index('ix_loans_status_created_at_id', 'status', 'created_at', 'id'),
+        db.Index('ix_loans_lender_id_amount_id', 'lender_id', 'amount', 'id'),
+        db.Index('ix_loans_lender_id_created_at_id', 'lender_id', 'created_at', 'id'),
+        db.Index('ix_loans_borrower_id_id', 'borrower_id', 'id'),
+        db.Index('ix_loans_borrower_id_amount_id', 'borrower_id', 'amount', 'id'),
+        db.Index('ix_loans_borrower_id_created_at_id', 'borrower_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     unique_data_id = db.Column(db.String(100), unique=True, nullable=False)
     borrower_id = db.Column(db.Integer, db.ForeignKey('borrowers.id'), nullable=False)
     lender_id = db.Column(db.Integer, db.ForeignKey('lenders.id'), nullable=True)  # Made nullable
+    matched_lender_id = db.Column(db.Integer, db.ForeignKey('lenders.id'), nullable=True)  # Best lender found by the matching engine
     amount = db.Column(db.Float, nullable=False)
     interest_rate = db.Column(db.Float, nullable=True)  # Made nullable
     status = db.Column(db.String(20), default='requested')  # requested, approved, rejected, disbursed, paid, overdue
     due_date = db.Column(db.DateTime, nullable=True)
     disbursed_at = db.Column(db.DateTime, nullable=True)
     repaid_at = db.Column(db.DateTime, nullable=True)
+    overdue_at = db.Column(db.DateTime, nullable=True)  # When the sweep marked it overdue; kept after repayment
     created_at = db.Column(db.DateTime, default=get_ist_time)
     
     # Relationships
-    lender = db.relationship('Lender', backref='loan')
+    lender = db.relationship('Lender', backref='loan', foreign_keys=[lender_id])
+
+# Installment schedule of a loan, one row per loan. The per-installment principal and
+# interest amounts are packed into `amounts` as little-endian float64 arrays.
+class LoanSchedule(db.Model):
+    __tablename__ = 'loan_schedules'
+    
+    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), primary_key=True)
+    schedule_type = db.Column(db.String(20), nullable=False)  # equal_installment, interest_only
+    installments = db.Column(db.Integer, nullable=False)
+    period_days = db.Column(db.Integer, nullable=False)
+    start_date = db.Column(db.DateTime, nullable=False)
+    annual_rate = db.Column(db.Float, nullable=False)
+    amounts = db.Column(db.LargeBinary, nullable=False)
+    total_due = db.Column(db.Float, nullable=False)
+    amount_paid = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+    principal_paid = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+    interest_paid = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+    paid_installments = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+# Per-lender portfolio aggregates, kept up to date by every change to the lender's loans
+class LenderSummary(db.Model):
+    __tablename__ = 'lender_summaries'
+    
+    lender_id = db.Column(db.Integer, db.ForeignKey('lenders.id'), primary_key=True)
+    active_loans = db.Column(db.Integer, nullable=False, default=0)
+    outstanding_principal = db.Column(db.Float, nullable=False, default=0.0)
+    expected_interest = db.Column(db.Float, nullable=False, default=0.0)  # Interest still to be received
+    repaid_loans = db.Column(db.Integer, nullable=False, default=0)
+    principal_repaid = db.Column(db.Float, nullable=False, default=0.0)
+    interest_earned = db.Column(db.Float, nullable=False, default=0.0)
+    default_count = db.Column(db.Integer, nullable=False, default=0)  # Loans currently overdue
+    updated_at = db.Column(db.DateTime, default=get_ist_time)
 
 # Blockchain-like ledger model
 class Block(db.Model):
     __tablename__ = 'blocks'
+    __table_args__ = (
+        # Audit-trail lookups filter on one of these and page by id
+        db.Index('ix_blocks_unique_data_id_id', 'unique_data_id', 'id'),
+        db.Index('ix_blocks_event_type_id', 'event_type', 'id'),
+        db.Index('ix_blocks_actor_id', 'actor', 'id'),
+        db.Index('ix_blocks_timestamp', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     unique_data_id = db.Column(db.String(100), nullable=False)
@@ -94,4 +189,67 @@ class Block(db.Model):
     nonce = db.Column(db.Integer, nullable=False)
     actor = db.Column(db.String(50), nullable=False)
     event_type = db.Column(db.String(50), nullable=False)
-    block_metadata = db.Column(db.Text, nullable=True)
\ No newline at end of file
+    block_metadata = db.Column(db.Text, nullable=True)
+    payload = db.Column(db.Text, nullable=True)  # Public JSON of the block, rendered once at append time
+
+# Ledger block recorded by a request in the same transaction as its change, waiting to be
+# appended to the chain by the ledger writer (see outbox.py)
+class LedgerOutbox(db.Model):
+    __tablename__ = 'ledger_outbox'
+    __table_args__ = (
+        # The writer drains pending rows (block_id IS NULL) in id order
+        db.Index('ix_ledger_outbox_block_id_id', 'block_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    unique_data_id = db.Column(db.String(100), nullable=False)
+    actor = db.Column(db.String(50), nullable=False)
+    event_type = db.Column(db.String(50), nullable=False)
+    block_metadata = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=get_ist_time)
+    block_id = db.Column(db.Integer, nullable=True)  # Set once the block is in the chain
+    applied_at = db.Column(db.DateTime, nullable=True)
+
+# Ledger verification checkpoint (last block confirmed by /api/ledger/verify)
+class LedgerCheckpoint(db.Model):
+    __tablename__ = 'ledger_checkpoints'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    block_id = db.Column(db.Integer, nullable=False)
+    block_index = db.Column(db.Integer, nullable=False)  # Position of the block in the chain
+    block_hash = db.Column(db.String(64), nullable=False)
+    verified_at = db.Column(db.DateTime, nullable=False)
+    full_verified_at = db.Column(db.DateTime, nullable=True)  # Last complete re-audit; cleared by a failed run
+    failed_at = db.Column(db.DateTime, nullable=True)  # Last failed verification, until a full audit passes
+    failure = db.Column(db.Text, nullable=True)
+
+# Merkle tree over the ledger (level 0 holds one leaf per block, in chain order)
+class MerkleNode(db.Model):
+    __tablename__ = 'merkle_nodes'
+    
+    level = db.Column(db.Integer, primary_key=True)
+    position = db.Column(db.Integer, primary_key=True)
+    hash = db.Column(db.String(64), nullable=False)
+    block_id = db.Column(db.Integer, nullable=True, index=True)  # Only set for leaves
+
+# Periodically published, signed Merkle roots
+class MerkleRoot(db.Model):
+    __tablename__ = 'merkle_roots'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    tree_size = db.Column(db.Integer, nullable=False)
+    root_hash = db.Column(db.String(64), nullable=False)
+    signature = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, default=get_ist_time)
+
+# Sealed, immutable file holding an archived range of ledger blocks
+class LedgerSegment(db.Model):
+    __tablename__ = 'ledger_segments'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    first_block_id = db.Column(db.Integer, nullable=False, unique=True)
+    last_block_id = db.Column(db.Integer, nullable=False, unique=True)
+    block_count = db.Column(db.Integer, nullable=False)
+    last_hash = db.Column(db.String(64), nullable=False)
+    path = db.Column(db.String(300), nullable=False)
+    sealed_at = db.Column(db.DateTime, default=get_ist_time)
@@ -0,0 +1,111 @@
+import json
+import threading
+from flask import current_app, has_app_context
+from cache import response_cache
+from database import db
+from ledger import OutboxConflict, ledger_appender
+from models import LedgerOutbox, get_ist_time
+from storage import RoutingSession
+
+# Transactional outbox for ledger blocks. Request handlers record their block as an outbox row
+# in the same transaction as the change it describes, so a committed change can never be left
+# without its block and the request doesn't wait for the chain. The ledger writer drains
+# pending rows in order and appends them through the ledger appender in batches, marking the
+# rows applied in the same transaction as the blocks.
+BATCH_SIZE = 500
+POLL_SECONDS = 5  # Also picks up rows committed by other processes
+
+outbox = LedgerOutbox.__table__
+_drain_lock = threading.Lock()  # One drain per process, so its batches never conflict with each other
+
+# Queue a block for the current transaction
+def record(unique_data_id, actor, event_type, metadata=None):
+    db.session.add(LedgerOutbox(
+        unique_data_id=unique_data_id,
+        actor=actor,
+        event_type=event_type,
+        block_metadata=json.dumps(metadata) if metadata else None,
+        created_at=get_ist_time()
+    ))
+    db.session.info['ledger_outbox'] = True
+
+def pending_count():
+    return db.session.execute(db.select(db.func.count()).where(outbox.c.block_id.is_(None))).scalar()
+
+# Append every pending row to the chain. Returns the number of blocks appended.
+def drain(batch_size=BATCH_SIZE):
+    applied = 0
+    with _drain_lock:
+        while True:
+            rows = db.session.execute(
+                db.select(outbox).where(outbox.c.block_id.is_(None)).order_by(outbox.c.id.asc()).limit(batch_size)
+            ).all()
+            db.session.commit()
+            if not rows:
+                break
+            try:
+                ledger_appender.append_many(
+                    [(row.unique_data_id, row.actor, row.event_type,
+                      json.loads(row.block_metadata) if row.block_metadata else None) for row in rows],
+                    outbox_ids=[row.id for row in rows]
+                )
+            except OutboxConflict:
+                # Another process applied some of these rows first; read what is still pending
+                continue
+            applied += len(rows)
+    if applied:
+        response_cache.bump('ledger')
+    return applied
+
+# One background thread per process, started on first use and woken after every commit that
+# recorded a block
+class LedgerWriter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._signalled = False
+        self._thread = None
+
+    def start(self, app):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, args=(app,), name='ledger-writer', daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        if self._thread is None and has_app_context():
+            self.start(current_app._get_current_object())
+        with self._cond:
+            self._signalled = True
+            self._cond.notify()
+
+    def join(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, app):
+        while True:
+            with app.app_context():
+                try:
+                    drain()
+                except Exception:
+                    # Rows stay pending and are retried
+                    current_app.logger.exception('Ledger writer failed to drain the outbox')
+                    db.session.rollback()
+            with self._cond:
+                if not self._signalled:
+                    self._cond.wait(POLL_SECONDS)
+                self._signalled = False
+
+ledger_writer = LedgerWriter()
+
+def _after_commit(session):
+    if session.info.pop('ledger_outbox', False):
+        ledger_writer.wake()
+
+def _after_rollback(session):
+    session.info.pop('ledger_outbox', None)
+
+db.event.listen(RoutingSession, 'after_commit', _after_commit)
+db.event.listen(RoutingSession, 'after_rollback', _after_rollback)
@@ -0,0 +1,103 @@
+from sqlalchemy.exc import OperationalError
+from accounts import run_transaction
+from database import db
+from models import Borrower, Loan, get_ist_time
+from outbox import record
+from portfolio import apply_deltas
+
+# Loans that are out with the borrower and can become overdue
+ACTIVE_STATUSES = ['approved', 'disbursed']
+SWEEP_BATCH_SIZE = 10000
+OVERDUE_CREDIT_PENALTY = 25
+SWEEP_MAX_ATTEMPTS = 10  # Per batch, while the database stays locked
+
+loans = Loan.__table__
+borrowers = Borrower.__table__
+
+# Mark every active loan whose due date has passed as overdue and take the penalty off its
+# borrower's credit score. Work is done by set-based UPDATEs over the (status, due_date)
+# index, one transaction per batch of loans, so the sweep never loads loans into Python
+# and never holds the write lock for long. Each batch records a summary block in its own
+# transaction, through the ledger outbox. The returned summary covers the committed batches;
+# it carries an 'error' if the sweep had to stop early.
+def sweep_overdue(now=None, batch_size=SWEEP_BATCH_SIZE, penalty=OVERDUE_CREDIT_PENALTY):
+    # Due dates are stored as naive IST wall-clock times
+    cutoff = (now or get_ist_time()).replace(tzinfo=None)
+
+    batch = (
+        db.select(loans.c.id)
+        .where(loans.c.status.in_(ACTIVE_STATUSES), loans.c.due_date < cutoff)
+        .limit(batch_size)
+        .scalar_subquery()
+    )
+
+    # One batch, or None when no loan is left. No ORDER BY, so the index scan stops after
+    # batch_size rows; inside one transaction every statement sees the same data and picks the
+    # same batch.
+    def sweep_batch():
+        stats = db.session.execute(
+            db.select(
+                db.func.count(),
+                db.func.sum(loans.c.amount),
+                db.func.count(db.distinct(loans.c.borrower_id)),
+                db.func.min(loans.c.id),
+                db.func.max(loans.c.id)
+            ).where(loans.c.id.in_(batch))
+        ).one()
+        if not stats[0]:
+            return None
+
+        overdue_count = (
+            db.select(db.func.count())
+            .where(loans.c.id.in_(batch), loans.c.borrower_id == borrowers.c.id)
+            .scalar_subquery()
+        )
+        db.session.execute(
+            borrowers.update()
+            .where(borrowers.c.id.in_(db.select(loans.c.borrower_id).where(loans.c.id.in_(batch))))
+            .values(credit_score=borrowers.c.credit_score - penalty * overdue_count)
+        )
+        defaults = db.session.execute(
+            db.select(loans.c.lender_id, db.func.count())
+            .where(loans.c.id.in_(batch), loans.c.lender_id.isnot(None))
+            .group_by(loans.c.lender_id)
+        ).all()
+        db.session.execute(loans.update().where(loans.c.id.in_(batch)).values(status='overdue', overdue_at=cutoff))
+        apply_deltas({lender_id: {'default_count': count} for lender_id, count in defaults})
+        record(f"overdue_sweep_{cutoff.isoformat()}", "system", "Loans Overdue", {
+            'loans': stats[0],
+            'amount': stats[1] or 0.0,
+            'borrower_updates': stats[2],
+            'first_loan_id': stats[3],
+            'last_loan_id': stats[4],
+            'cutoff': cutoff.isoformat(),
+            'credit_penalty': penalty
+        })
+        return stats
+
+    summary = {'loans': 0, 'amount': 0.0, 'borrower_updates': 0, 'first_loan_id': None, 'last_loan_id': None}
+    while True:
+        # A batch that hits a concurrent writer is rolled back and retried with backoff
+        try:
+            stats = run_transaction(sweep_batch, max_attempts=SWEEP_MAX_ATTEMPTS)
+        except OperationalError as e:
+            # Still locked after every retry: stop here, the batches before stay committed
+            if 'locked' not in str(e.orig):
+                raise
+            summary['error'] = str(e.orig)
+            break
+        if stats is None:
+            break
+
+        summary['loans'] += stats[0]
+        summary['amount'] += stats[1] or 0.0
+        summary['borrower_updates'] += stats[2]
+        if summary['first_loan_id'] is None or stats[3] < summary['first_loan_id']:
+            summary['first_loan_id'] = stats[3]
+        if summary['last_loan_id'] is None or stats[4] > summary['last_loan_id']:
+            summary['last_loan_id'] = stats[4]
+
+    if summary['loans']:
+        summary['cutoff'] = cutoff.isoformat()
+        summary['credit_penalty'] = penalty
+    return summary
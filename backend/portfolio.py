@@ -0,0 +1,117 @@
+from database import db
+from models import Lender, LenderSummary, Loan, LoanSchedule, get_ist_time
+
+ACTIVE_STATUSES = ['approved', 'disbursed', 'overdue']
+# Differences below this are float noise from incremental updates
+CHECK_TOLERANCE = 0.01
+
+loans = Loan.__table__
+schedules = LoanSchedule.__table__
+summaries = LenderSummary.__table__
+
+# What each loan contributes to its lender's summary. The incremental updates and the rebuild
+# both aggregate these expressions, so they cannot disagree about what a field means.
+def _columns():
+    active = loans.c.status.in_(ACTIVE_STATUSES)
+    paid = loans.c.status == 'paid'
+    scheduled = schedules.c.loan_id.isnot(None)
+    bullet_interest = loans.c.amount * db.func.coalesce(loans.c.interest_rate, 0) / 100
+    return {
+        'active_loans': db.func.sum(db.case((active, 1), else_=0)),
+        'outstanding_principal': db.func.sum(db.case(
+            (active, loans.c.amount - db.func.coalesce(schedules.c.principal_paid, 0)), else_=0)),
+        'expected_interest': db.func.sum(db.case(
+            (active & scheduled, schedules.c.total_due - loans.c.amount - schedules.c.interest_paid),
+            (active, bullet_interest), else_=0)),
+        'repaid_loans': db.func.sum(db.case((paid, 1), else_=0)),
+        'principal_repaid': db.func.sum(db.case(
+            (scheduled, schedules.c.principal_paid), (paid, loans.c.amount), else_=0)),
+        'interest_earned': db.func.sum(db.case(
+            (scheduled, schedules.c.interest_paid), (paid, bullet_interest), else_=0)),
+        'default_count': db.func.sum(db.case((loans.c.status == 'overdue', 1), else_=0)),
+    }
+
+FIELDS = list(_columns())
+
+# Summary contributions of the loans matching `condition`, per lender
+def contributions(condition=None):
+    columns = _columns()
+    query = (
+        db.select(loans.c.lender_id, *[column.label(name) for name, column in columns.items()])
+        .select_from(loans.outerjoin(schedules, schedules.c.loan_id == loans.c.id))
+        .where(loans.c.lender_id.isnot(None))
+        .group_by(loans.c.lender_id)
+    )
+    if condition is not None:
+        query = query.where(condition)
+    return {row.lender_id: {name: row._mapping[name] or 0 for name in FIELDS} for row in db.session.execute(query)}
+
+# Add per-lender deltas to the stored summaries. A lender without a summary row yet gets one
+# rebuilt from its loans, which already include the change being recorded.
+def apply_deltas(deltas):
+    missing = []
+    for lender_id, delta in deltas.items():
+        delta = {name: value for name, value in delta.items() if value}
+        if not delta:
+            continue
+        values = {name: summaries.c[name] + value for name, value in delta.items()}
+        updated = db.session.execute(
+            summaries.update().where(summaries.c.lender_id == lender_id).values(updated_at=get_ist_time(), **values)
+        ).rowcount
+        if not updated:
+            missing.append(lender_id)
+    if missing:
+        rebuild_summaries(missing)
+
+# Record a change to the loans matching `condition`, given their contributions from before it.
+# Call contributions(condition) before changing the loans and this afterwards, in one transaction.
+def record_change(before, condition):
+    after = contributions(condition)
+    deltas = {}
+    for lender_id in set(before) | set(after):
+        old = before.get(lender_id, {})
+        new = after.get(lender_id, {})
+        deltas[lender_id] = {name: new.get(name, 0) - old.get(name, 0) for name in FIELDS}
+    apply_deltas(deltas)
+
+# Recompute summaries from scratch for the given lenders (all lenders by default)
+def rebuild_summaries(lender_ids=None):
+    query = db.select(Lender.id)
+    if lender_ids is not None:
+        query = query.where(Lender.id.in_(lender_ids))
+    ids = db.session.execute(query).scalars().all()
+    if not ids:
+        return 0
+
+    condition = loans.c.lender_id.in_(ids) if lender_ids is not None else None
+    totals = contributions(condition)
+    now = get_ist_time()
+    db.session.execute(summaries.insert().prefix_with('OR REPLACE'), [
+        dict(lender_id=lender_id, updated_at=now, **totals.get(lender_id, {name: 0 for name in FIELDS}))
+        for lender_id in ids
+    ])
+    return len(ids)
+
+# Stored summaries that differ from a fresh aggregate, as {lender_id: {field: (stored, actual)}}
+def check_summaries():
+    totals = contributions()
+    mismatches = {}
+    for summary in LenderSummary.query.all():
+        actual = totals.get(summary.lender_id, {})
+        diff = {}
+        for name in FIELDS:
+            stored, expected = getattr(summary, name), actual.get(name, 0)
+            if abs(stored - expected) > CHECK_TOLERANCE:
+                diff[name] = (stored, expected)
+        if diff:
+            mismatches[summary.lender_id] = diff
+    return mismatches
+
+# The lender's summary, built on first use for lenders that had loans before summaries existed
+def get_summary(lender_id):
+    summary = db.session.get(LenderSummary, lender_id)
+    if summary is None:
+        rebuild_summaries([lender_id])
+        db.session.commit()
+        summary = db.session.get(LenderSummary, lender_id)
+    return summary
@@ -0,0 +1,204 @@
+import base64
+import json
+from datetime import datetime
+import pytz
+from flask import current_app
+from database import db
+from models import Borrower, Lender, Loan, User
+
+# Shared read queries for the list endpoints. Each returns everything the endpoint renders
+# in a single statement, so the number of queries doesn't grow with the number of rows.
+# The endpoint passes the response shape (see serializers.py) whose columns are selected.
+# Lists are keyset-paginated: results are ordered by a sort column plus the row id, and the
+# cursor handed back with a page is the (sort value, id) of its last row.
+
+IST = pytz.timezone('Asia/Kolkata')
+LOAN_STATUSES = ['requested', 'approved', 'rejected', 'disbursed', 'paid', 'overdue']
+
+BorrowerUser = db.aliased(User, name='borrower_user')
+LenderUser = db.aliased(User, name='lender_user')
+
+# Sort keys each list accepts (prefix with - for descending). Most of them are nullable; rows
+# with NULL sort first ascending and last descending, as SQLite orders them.
+LOAN_SORTS = {'id': Loan.id, 'amount': Loan.amount, 'created_at': Loan.created_at}
+LENDER_SORTS = {'id': Lender.id, 'created_at': Lender.created_at, 'interest_rate': Lender.interest_rate,
+                'account_balance': Lender.account_balance}
+BORROWER_SORTS = {'id': Borrower.id, 'created_at': Borrower.created_at, 'credit_score': Borrower.credit_score,
+                  'account_balance': Borrower.account_balance}
+
+class InvalidQuery(ValueError):
+    pass
+
+def encode_cursor(value, row_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode()).decode()
+
+def decode_cursor(cursor, column):
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if value is not None and isinstance(column.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidQuery('Invalid cursor')
+
+def _number(args, name, kind=float):
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        return kind(value)
+    except ValueError:
+        raise InvalidQuery(f'{name} must be a number')
+
+# Timestamps are stored as naive IST wall-clock times
+def _time(args, name):
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidQuery(f'{name} must be an ISO 8601 date or timestamp')
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(IST).replace(tzinfo=None)
+    return moment
+
+# The column to filter a range of `column` on. Range filters on any column other than the sort
+# column go through `column + 0`, which SQLite can't look up in an index: it then reads the page
+# in order from the sort index, instead of reading the whole range and sorting it.
+def _ranged(column, sort_column):
+    return column if column is sort_column else column + 0
+
+def _created_range(args, column, sort_column):
+    column = _ranged(column, sort_column)
+    conditions = []
+    created_from = _time(args, 'created_from')
+    created_to = _time(args, 'created_to')
+    if created_from is not None:
+        conditions.append(column >= created_from)
+    if created_to is not None:
+        conditions.append(column <= created_to)
+    return conditions
+
+# The rows after the cursor's (value, id) in (column, id) order, as conditions for ranges to read
+# one after another. NULL never compares, so rows with a NULL sort value are a range of their
+# own; OR-ing the ranges together would keep SQLite from searching the index for either.
+def _after(column, id_column, value, row_id, descending):
+    if column is id_column:
+        return [id_column < row_id if descending else id_column > row_id]
+    if value is None:
+        if descending:
+            return [db.and_(column.is_(None), id_column < row_id)]
+        return [db.and_(column.is_(None), id_column > row_id), column.isnot(None)]
+    if descending:
+        return [db.tuple_(column, id_column) < db.tuple_(value, row_id), column.is_(None)]
+    return [db.tuple_(column, id_column) > db.tuple_(value, row_id)]
+
+# Apply the `sort`, `cursor` and `limit` request args to `query`, whose rows must include the
+# sort columns under their own names. Returns the page and the cursor of the next one (None on
+# the last page).
+# The (column, descending) the `sort` request arg asks for
+def sort_order(args, sorts):
+    sort = args.get('sort', 'id')
+    column = sorts.get(sort.lstrip('-'))
+    if column is None:
+        raise InvalidQuery(f"sort must be one of {', '.join(sorts)} (prefix with - for descending)")
+    return column, sort.startswith('-')
+
+def paginate(query, args, sorts, id_column):
+    column, descending = sort_order(args, sorts)
+
+    limit = _number(args, 'limit', int)
+    if limit is not None and limit <= 0:
+        raise InvalidQuery('limit must be positive')
+    limit = min(limit or current_app.config['LIST_PAGE_SIZE'], current_app.config['LIST_MAX_PAGE_SIZE'])
+
+    ranges = [None]
+    cursor = args.get('cursor')
+    if cursor:
+        value, row_id = decode_cursor(cursor, column)
+        ranges = _after(column, id_column, value, row_id, descending)
+
+    if descending:
+        query = query.order_by(column.desc(), id_column.desc())
+    else:
+        query = query.order_by(column.asc(), id_column.asc())
+
+    # One extra row tells us whether there is a next page. A later range is only read when the
+    # page runs past the end of the one before it.
+    rows = []
+    for condition in ranges:
+        page = query if condition is None else query.where(condition)
+        rows += db.session.execute(page.limit(limit + 1 - len(rows))).all()
+        if len(rows) > limit:
+            break
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, column.key), last.id)
+    return rows, next_cursor
+
+# Loans matching `conditions` and the status/amount/date filters in `args`, one page at a time.
+# `min_amount`/`max_amount` narrow the amount range further. The shape may use the borrower's
+# and lender's names (None if missing).
+def list_loans(args, shape, *conditions, min_amount=None, max_amount=None):
+    conditions = list(conditions)
+    sort_column, _ = sort_order(args, LOAN_SORTS)
+
+    status = args.get('status')
+    if status:
+        statuses = status.split(',')
+        unknown = [s for s in statuses if s not in LOAN_STATUSES]
+        if unknown:
+            raise InvalidQuery(f"Unknown status {', '.join(unknown)}")
+        conditions.append(Loan.status.in_(statuses))
+
+    amount = _ranged(Loan.amount, sort_column)
+    for bound in (min_amount, _number(args, 'min_amount')):
+        if bound is not None:
+            conditions.append(amount >= bound)
+    for bound in (max_amount, _number(args, 'max_amount')):
+        if bound is not None:
+            conditions.append(amount <= bound)
+    conditions += _created_range(args, Loan.created_at, sort_column)
+
+    query = (
+        db.select(*shape.columns)
+        .select_from(Loan)
+        .outerjoin(Borrower, Borrower.id == Loan.borrower_id)
+        .outerjoin(BorrowerUser, BorrowerUser.id == Borrower.user_id)
+        .outerjoin(Lender, Lender.id == Loan.lender_id)
+        .outerjoin(LenderUser, LenderUser.id == Lender.user_id)
+        .where(*conditions)
+    )
+    return paginate(query, args, LOAN_SORTS, Loan.id)
+
+# Lenders joined to their users, one page at a time. `amount` keeps lenders whose lending
+# range covers it.
+def list_lenders(args, shape):
+    sort_column, _ = sort_order(args, LENDER_SORTS)
+    conditions = _created_range(args, Lender.created_at, sort_column)
+    amount = _number(args, 'amount')
+    if amount is not None:
+        conditions += [Lender.min_amount <= amount, Lender.max_amount >= amount]
+
+    query = db.select(*shape.columns).select_from(Lender).join(User, User.id == Lender.user_id).where(*conditions)
+    return paginate(query, args, LENDER_SORTS, Lender.id)
+
+# Borrowers joined to their users, one page at a time
+def list_borrowers(args, shape):
+    sort_column, _ = sort_order(args, BORROWER_SORTS)
+    conditions = _created_range(args, Borrower.created_at, sort_column)
+    credit_score = _ranged(Borrower.credit_score, sort_column)
+    min_score = _number(args, 'min_credit_score', int)
+    max_score = _number(args, 'max_credit_score', int)
+    if min_score is not None:
+        conditions.append(credit_score >= min_score)
+    if max_score is not None:
+        conditions.append(credit_score <= max_score)
+
+    query = db.select(*shape.columns).select_from(Borrower).join(User, User.id == Borrower.user_id).where(*conditions)
+    return paginate(query, args, BORROWER_SORTS, Borrower.id)
@@ -0,0 +1,29 @@
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+from portfolio import check_summaries, rebuild_summaries
+
+# Rebuild lender portfolio summaries from the loans table, or check them against it
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild or check lender portfolio summaries')
+    parser.add_argument('--check', action='store_true', help='only report summaries that differ from the loans')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.check:
+            mismatches = check_summaries()
+            for lender_id, diff in sorted(mismatches.items()):
+                fields = ', '.join(f"{name} stored={stored} actual={actual}" for name, (stored, actual) in diff.items())
+                print(f"Lender {lender_id}: {fields}")
+            print("Summaries are consistent" if not mismatches else f"{len(mismatches)} lender summaries differ")
+            sys.exit(1 if mismatches else 0)
+
+        rebuilt = rebuild_summaries()
+        db.session.commit()
+        print(f"Rebuilt {rebuilt} lender summaries")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+from models import Loan, LoanSchedule
+from schedules import reprice_schedules
+
+# Re-price the unpaid installments of a lender's active installment loans at a new rate
+def main():
+    parser = argparse.ArgumentParser(description="Re-price a lender's installment loans at a new annual rate")
+    parser.add_argument('--lender-id', type=int, required=True)
+    parser.add_argument('--rate', type=float, required=True, help='new annual interest rate in percent')
+    args = parser.parse_args()
+
+    with app.app_context():
+        loan_ids = db.session.execute(
+            db.select(Loan.id)
+            .join(LoanSchedule, LoanSchedule.loan_id == Loan.id)
+            .where(Loan.lender_id == args.lender_id, Loan.status.in_(['approved', 'disbursed', 'overdue']))
+        ).scalars().all()
+        repriced = reprice_schedules(loan_ids, args.rate)
+        db.session.commit()
+        print(f"Re-priced {repriced} loan schedules at {args.rate}%")
+
+if __name__ == '__main__':
+    main()
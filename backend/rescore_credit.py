@@ -0,0 +1,27 @@
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from outbox import drain
+from scoring import POLICIES, recompute_scores
+
+# Recompute all borrowers' credit scores from their loan history under a scoring policy
+def main():
+    parser = argparse.ArgumentParser(description="Recompute borrowers' credit scores from their loan history")
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='default')
+    parser.add_argument('--dry-run', action='store_true', help='report score changes without writing them')
+    args = parser.parse_args()
+
+    with app.app_context():
+        diffs = recompute_scores(POLICIES[args.policy](), dry_run=args.dry_run)
+        # Append the run's ledger block before exiting
+        drain()
+        for diff in diffs:
+            print(f"Borrower {diff['borrower_id']}: {diff['old_score']} -> {diff['new_score']}")
+        verb = 'would change' if args.dry_run else 'changed'
+        print(f"{len(diffs)} credit scores {verb} under the {args.policy} policy")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+from datetime import timedelta
+import numpy as np
+from database import db
+from models import Loan, LoanSchedule
+from portfolio import contributions, record_change
+
+SCHEDULE_TYPES = ['equal_installment', 'interest_only']
+INSTALLMENT_DAYS = 30
+PAYMENT_TOLERANCE = 0.005  # Half a paisa, to absorb float rounding in cumulative payments
+BATCH_SIZE = 10000
+
+schedules = LoanSchedule.__table__
+loans = Loan.__table__
+
+class Overpayment(Exception):
+    pass
+
+# Principal and interest of every installment for many loans at once.
+# Returns two (loans x max installments) arrays rounded to paise, zero past each loan's last
+# installment. The last installment absorbs rounding so principal parts add up to the amount.
+def build_schedules(amounts, annual_rates, installments, schedule_type, period_days=INSTALLMENT_DAYS):
+    amounts = np.asarray(amounts, dtype=np.float64)
+    n = np.asarray(installments, dtype=np.int64)
+    r = np.asarray(annual_rates, dtype=np.float64) / 100 * period_days / 365
+    k = np.arange(int(n.max()))
+    live = k[None, :] < n[:, None]
+
+    if schedule_type == 'equal_installment':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            payment = np.where(r > 0, amounts * r / (1 - (1 + r) ** -n), amounts / n)
+            growth = (1 + r)[:, None] ** k[None, :]
+            # Balance owed at the start of each period
+            opening = np.where(
+                r[:, None] > 0,
+                amounts[:, None] * growth - payment[:, None] * (growth - 1) / r[:, None],
+                amounts[:, None] - payment[:, None] * k[None, :]
+            )
+        interest = opening * r[:, None]
+        principal = payment[:, None] - interest
+    elif schedule_type == 'interest_only':
+        interest = np.repeat((amounts * r)[:, None], len(k), axis=1)
+        principal = np.where(k[None, :] == (n - 1)[:, None], amounts[:, None], 0.0)
+    else:
+        raise ValueError(f'Unknown schedule type {schedule_type}')
+
+    interest = np.round(np.where(live, interest, 0.0), 2)
+    principal = np.round(np.where(live, principal, 0.0), 2)
+    rows = np.arange(len(amounts))
+    principal[rows, n - 1] += np.round(amounts - principal.sum(axis=1), 2)
+    return principal, interest
+
+def unpack(blob):
+    amounts = np.frombuffer(blob, dtype='<f8').reshape(2, -1)
+    return amounts[0], amounts[1]
+
+# Pack each row of (loans x installments) principal and interest arrays, trimmed to its length
+def _pack_rows(principal, interest, installments):
+    packed = np.stack([principal, interest], axis=1).astype('<f8')
+    return [packed[i, :, :n].tobytes() for i, n in enumerate(installments)]
+
+# How much of each schedule row is settled by amount_paid, paying installments in order and
+# splitting a partly paid installment pro rata. Returns principal paid, interest paid and the
+# number of installments paid in full.
+def settled(principal, interest, amount_paid):
+    principal = np.atleast_2d(principal)
+    interest = np.atleast_2d(interest)
+    amount_paid = np.atleast_1d(np.asarray(amount_paid, dtype=np.float64))[:, None]
+    due = principal + interest
+    cumulative = np.cumsum(due, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(due > 0, (amount_paid - (cumulative - due)) / due, amount_paid + PAYMENT_TOLERANCE >= cumulative)
+    fraction = np.clip(fraction, 0.0, 1.0)
+    return (
+        np.round((principal * fraction).sum(axis=1), 2),
+        np.round((interest * fraction).sum(axis=1), 2),
+        (amount_paid + PAYMENT_TOLERANCE >= cumulative).sum(axis=1)
+    )
+
+def due_date(start_date, period_days, installment):
+    return start_date + timedelta(days=period_days * (installment + 1))
+
+def _schedule_rows(specs, start_date, period_days):
+    rows = []
+    for schedule_type in SCHEDULE_TYPES:
+        group = [spec for spec in specs if spec['schedule_type'] == schedule_type]
+        if not group:
+            continue
+        installments = [spec['installments'] for spec in group]
+        principal, interest = build_schedules(
+            [spec['amount'] for spec in group],
+            [spec['annual_rate'] for spec in group],
+            installments,
+            schedule_type,
+            period_days
+        )
+        totals = np.round(principal.sum(axis=1) + interest.sum(axis=1), 2).tolist()
+        for spec, blob, total in zip(group, _pack_rows(principal, interest, installments), totals):
+            rows.append({
+                'loan_id': spec['loan_id'],
+                'schedule_type': schedule_type,
+                'installments': spec['installments'],
+                'period_days': period_days,
+                'start_date': start_date,
+                'annual_rate': spec['annual_rate'],
+                'amounts': blob,
+                'total_due': total,
+                'amount_paid': 0.0,
+                'principal_paid': 0.0,
+                'interest_paid': 0.0,
+                'paid_installments': 0
+            })
+    return rows
+
+# Create schedules for newly disbursed loans inside the current transaction and point each
+# loan's due_date at its first installment. `specs` are dicts with loan_id, amount,
+# annual_rate, installments and schedule_type.
+def create_schedules(specs, start_date, period_days=INSTALLMENT_DAYS):
+    if not specs:
+        return
+    start_date = start_date.replace(tzinfo=None)
+    rows = _schedule_rows(specs, start_date, period_days)
+    db.session.execute(schedules.insert(), rows)
+
+    # Every schedule created here starts together, so they share the first due date
+    loan_ids = [row['loan_id'] for row in rows]
+    for offset in range(0, len(loan_ids), BATCH_SIZE):
+        db.session.execute(
+            loans.update()
+            .where(loans.c.id.in_(loan_ids[offset:offset + BATCH_SIZE]))
+            .values(due_date=due_date(start_date, period_days, 0))
+        )
+
+# Re-price the unpaid part of the given loans' schedules at a new annual rate. Installments
+# already paid in full are kept; the outstanding principal is re-amortized over the rest.
+# Schedules of the same type and length are unpacked into one matrix and re-priced together.
+def reprice_schedules(loan_ids, annual_rate):
+    repriced = 0
+    loan_ids = list(loan_ids)
+    for offset in range(0, len(loan_ids), BATCH_SIZE):
+        rows = db.session.execute(
+            db.select(schedules).where(
+                schedules.c.loan_id.in_(loan_ids[offset:offset + BATCH_SIZE]),
+                schedules.c.paid_installments < schedules.c.installments
+            )
+        ).all()
+        condition = loans.c.id.in_([row.loan_id for row in rows])
+        before = contributions(condition)
+
+        groups = {}
+        for row in rows:
+            groups.setdefault((row.schedule_type, row.installments, row.period_days), []).append(row)
+
+        for (schedule_type, n, period_days), group in groups.items():
+            amounts = np.frombuffer(b''.join(row.amounts for row in group), dtype='<f8').reshape(len(group), 2, n)
+            principal, interest = amounts[:, 0, :], amounts[:, 1, :]
+            paid = np.array([row.paid_installments for row in group])
+            kept = np.arange(n)[None, :] < paid[:, None]
+
+            # Principal still owed, re-amortized over the remaining installments
+            tail_principal, tail_interest = build_schedules(
+                np.where(kept, 0.0, principal).sum(axis=1),
+                np.full(len(group), annual_rate),
+                n - paid,
+                schedule_type,
+                period_days
+            )
+            # Installment j of the new schedule is the kept one, or tail installment j - paid
+            tail_index = np.clip(np.arange(n)[None, :] - paid[:, None], 0, None)
+            principal = np.where(kept, principal, np.take_along_axis(tail_principal, tail_index, axis=1))
+            interest = np.where(kept, interest, np.take_along_axis(tail_interest, tail_index, axis=1))
+            totals = np.round(principal.sum(axis=1) + interest.sum(axis=1), 2).tolist()
+            principal_paid, interest_paid, paid = settled(principal, interest, [row.amount_paid for row in group])
+
+            db.session.execute(
+                schedules.update().where(schedules.c.loan_id == db.bindparam('b_loan_id')).values(
+                    amounts=db.bindparam('b_amounts'),
+                    total_due=db.bindparam('b_total_due'),
+                    principal_paid=db.bindparam('b_principal_paid'),
+                    interest_paid=db.bindparam('b_interest_paid'),
+                    paid_installments=db.bindparam('b_paid_installments'),
+                    annual_rate=annual_rate
+                ),
+                [{
+                    'b_loan_id': row.loan_id,
+                    'b_amounts': blob,
+                    'b_total_due': totals[i],
+                    'b_principal_paid': float(principal_paid[i]),
+                    'b_interest_paid': float(interest_paid[i]),
+                    'b_paid_installments': int(paid[i])
+                } for i, (row, blob) in enumerate(zip(group, _pack_rows(principal, interest, [n] * len(group))))]
+            )
+            db.session.execute(
+                loans.update().where(loans.c.id.in_([row.loan_id for row in group])).values(interest_rate=annual_rate)
+            )
+            repriced += len(group)
+        record_change(before, condition)
+    return repriced
+
+# Record a (possibly partial) payment against a loan's schedule inside the current transaction.
+# Payments settle installments in order. The conditional update refuses to take more than is
+# outstanding, so concurrent payments cannot overpay a loan.
+def apply_payment(loan_id, amount, now):
+    row = db.session.execute(
+        schedules.update()
+        .where(schedules.c.loan_id == loan_id, schedules.c.amount_paid + amount <= schedules.c.total_due + PAYMENT_TOLERANCE)
+        .values(amount_paid=schedules.c.amount_paid + amount)
+        .returning(schedules.c.amount_paid, schedules.c.amounts, schedules.c.total_due,
+                   schedules.c.start_date, schedules.c.period_days)
+    ).first()
+    if row is None:
+        raise Overpayment(f'Payment exceeds the outstanding balance of loan {loan_id}')
+
+    principal, interest = unpack(row.amounts)
+    principal_paid, interest_paid, paid = settled(principal, interest, row.amount_paid)
+    paid = int(paid[0])
+    db.session.execute(schedules.update().where(schedules.c.loan_id == loan_id).values(
+        principal_paid=float(principal_paid[0]),
+        interest_paid=float(interest_paid[0]),
+        paid_installments=paid
+    ))
+
+    state = {
+        'amount_paid': round(row.amount_paid, 2),
+        'outstanding': max(round(row.total_due - row.amount_paid, 2), 0.0),
+        'paid_installments': paid,
+        'paid_off': paid >= len(principal),
+        'next_due_date': None
+    }
+    if not state['paid_off']:
+        next_due = due_date(row.start_date, row.period_days, paid)
+        state['next_due_date'] = next_due.isoformat()
+        db.session.execute(loans.update().where(loans.c.id == loan_id).values(due_date=next_due))
+        # Catching up on installments clears the overdue flag
+        if next_due > now.replace(tzinfo=None):
+            db.session.execute(
+                loans.update().where(loans.c.id == loan_id, loans.c.status == 'overdue').values(status='approved')
+            )
+    return state
+
+def outstanding(schedule):
+    return max(round(schedule.total_due - schedule.amount_paid, 2), 0.0)
+
+def schedule_to_dict(schedule):
+    principal, interest = unpack(schedule.amounts)
+    return {
+        'loan_id': schedule.loan_id,
+        'schedule_type': schedule.schedule_type,
+        'annual_rate': schedule.annual_rate,
+        'total_due': schedule.total_due,
+        'amount_paid': schedule.amount_paid,
+        'outstanding': outstanding(schedule),
+        'paid_installments': schedule.paid_installments,
+        'installments': [{
+            'number': i + 1,
+            'due_date': due_date(schedule.start_date, schedule.period_days, i).isoformat(),
+            'principal': float(principal[i]),
+            'interest': float(interest[i]),
+            'amount': round(float(principal[i] + interest[i]), 2),
+            'paid': i < schedule.paid_installments
+        } for i in range(schedule.installments)]
+    }
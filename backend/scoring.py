@@ -0,0 +1,111 @@
+import numpy as np
+from database import db
+from models import Borrower, Loan, get_ist_time
+from outbox import record
+
+loans = Loan.__table__
+borrowers = Borrower.__table__
+
+# Per-loan facts the policies score, derived in SQL from each loan's lifecycle columns.
+# Every fact is permanent once it happened, like the score change it stands for.
+EVENTS = ['approved', 'on_time', 'early', 'late', 'overdue']
+
+def _event_columns():
+    repaid = loans.c.repaid_at.isnot(None)
+    on_time = repaid & loans.c.due_date.isnot(None) & (loans.c.repaid_at <= loans.c.due_date)
+    return [
+        db.case((loans.c.disbursed_at.isnot(None), 1), else_=0).label('approved'),
+        db.case((on_time, 1), else_=0).label('on_time'),
+        db.case((on_time & (loans.c.repaid_at < loans.c.due_date), 1), else_=0).label('early'),
+        db.case((repaid & db.not_(on_time), 1), else_=0).label('late'),
+        db.case((loans.c.overdue_at.isnot(None), 1), else_=0).label('overdue'),
+    ]
+
+# The scoring rules applied in place by the API, as a replayable policy:
+# a base score adjusted by a fixed number of points per event
+class DefaultPolicy:
+    name = 'default'
+    base_score = 750
+    weights = {
+        'approved': -25,  # Taking a loan
+        'on_time': 15,
+        'early': 5,       # On top of the on-time bonus
+        'late': -25,
+        'overdue': -25,   # Marked overdue by the sweep, whether or not it was repaid later
+    }
+    min_score = None
+    max_score = None
+
+    # `counts` maps each event to an array of per-borrower counts
+    def score(self, counts):
+        scores = np.full(len(next(iter(counts.values()))), self.base_score, dtype=np.int64)
+        for event, weight in self.weights.items():
+            scores += weight * counts[event]
+        if self.min_score is not None or self.max_score is not None:
+            scores = np.clip(scores, self.min_score, self.max_score)
+        return scores
+
+# Same events, bounded to the usual 300-900 range and weighing defaults more heavily
+class BoundedPolicy(DefaultPolicy):
+    name = 'bounded'
+    weights = dict(DefaultPolicy.weights, late=-40, overdue=-60)
+    min_score = 300
+    max_score = 900
+
+POLICIES = {policy.name: policy for policy in (DefaultPolicy, BoundedPolicy)}
+
+# Per-borrower event counts over every loan, aligned with the sorted borrower_ids array.
+# SQLite sums the per-loan facts per borrower, so only one row per borrower reaches Python.
+def event_counts(borrower_ids):
+    rows = db.session.execute(
+        db.select(loans.c.borrower_id, *[db.func.sum(column).label(column.name) for column in _event_columns()])
+        .group_by(loans.c.borrower_id)
+    ).all()
+
+    counts = {event: np.zeros(len(borrower_ids), dtype=np.int64) for event in EVENTS}
+    if not rows:
+        return counts
+
+    totals = np.array(rows, dtype=np.int64)
+    # Loans of borrowers that no longer exist are ignored
+    position = np.searchsorted(borrower_ids, totals[:, 0])
+    known = (position < len(borrower_ids)) & (borrower_ids[np.minimum(position, len(borrower_ids) - 1)] == totals[:, 0])
+    for column, event in enumerate(EVENTS, start=1):
+        counts[event][position[known]] = totals[known, column]
+    return counts
+
+# Recompute every borrower's credit score from their loan history under `policy`.
+# Returns the changed scores as [{borrower_id, old_score, new_score}]. Unless dry_run is set
+# the new scores are written with one bulk update, committed together with the run's ledger block.
+def recompute_scores(policy=None, dry_run=False):
+    policy = policy or DefaultPolicy()
+    rows = db.session.execute(db.select(borrowers.c.id, borrowers.c.credit_score).order_by(borrowers.c.id.asc())).all()
+    if not rows:
+        return []
+
+    borrower_ids = np.array([row.id for row in rows], dtype=np.int64)
+    current = np.array([row.credit_score or 0 for row in rows], dtype=np.int64)
+    scores = policy.score(event_counts(borrower_ids))
+
+    changed = np.nonzero(scores != current)[0]
+    diffs = [{
+        'borrower_id': int(borrower_ids[i]),
+        'old_score': int(current[i]),
+        'new_score': int(scores[i])
+    } for i in changed]
+
+    if dry_run or not diffs:
+        return diffs
+
+    db.session.execute(
+        borrowers.update().where(borrowers.c.id == db.bindparam('b_id')).values(credit_score=db.bindparam('b_score')),
+        [{'b_id': diff['borrower_id'], 'b_score': diff['new_score']} for diff in diffs]
+    )
+    now = get_ist_time()
+    record(f"credit_rescore_{now.isoformat()}", "system", "Credit Scores Recomputed", {
+        "policy": policy.name,
+        "borrowers": len(rows),
+        "changed": len(diffs)
+    })
+    db.session.commit()
+    return diffs
@@ -0,0 +1,95 @@
+from database import db
+from models import Borrower, Lender, Loan, User
+from queries import BorrowerUser, LenderUser
+
+# Response shapes of the JSON endpoints, each declared once as (key, column[, default]).
+# A shape selects exactly its columns as plain Core rows, so no ORM instances are built, and
+# compiles a serializer for them: one generated function with the row positions, isoformat()
+# calls and defaults inlined, instead of per-row attribute lookups and conditionals.
+class Shape:
+    def __init__(self, *fields):
+        self.keys = [field[0] for field in fields]
+        self.columns = [field[1].label(field[0]) for field in fields]
+
+        namespace = {}
+        values = []
+        for i, field in enumerate(fields):
+            value = f'row[{i}]'
+            if isinstance(self.columns[i].type, db.DateTime):
+                value = f'(row[{i}].isoformat() if row[{i}] is not None else None)'
+            elif len(field) > 2:
+                namespace[f'default_{i}'] = field[2]
+                value = f'(row[{i}] or default_{i})'
+            values.append(f'{field[0]!r}: {value}')
+        body = '{' + ', '.join(values) + '}'
+        source = f'def one(row):\n    return {body}\n\ndef many(rows):\n    return [{body} for row in rows]\n'
+        exec(compile(source, '<shape>', 'exec'), namespace)
+        self.one = namespace['one']
+        self.many = namespace['many']
+
+LENDER = Shape(
+    ('id', Lender.id),
+    ('user_id', Lender.user_id),
+    ('name', User.name),
+    ('email', User.email),
+    ('wallet_address', User.wallet_address),
+    ('min_amount', Lender.min_amount),
+    ('max_amount', Lender.max_amount),
+    ('interest_rate', Lender.interest_rate),
+    ('account_balance', Lender.account_balance),
+    ('remarks', Lender.remarks),
+    ('created_at', Lender.created_at)
+)
+
+BORROWER = Shape(
+    ('id', Borrower.id),
+    ('user_id', Borrower.user_id),
+    ('name', User.name),
+    ('email', User.email),
+    ('wallet_address', User.wallet_address),
+    ('credit_score', Borrower.credit_score),
+    ('account_balance', Borrower.account_balance),
+    ('created_at', Borrower.created_at)
+)
+
+# Loan shapes also carry every column their list can be sorted by, which the cursor reads
+LOAN_REQUEST = Shape(
+    ('id', Loan.id),
+    ('borrower_name', BorrowerUser.name, 'Unknown'),
+    ('borrower_id', Loan.borrower_id),
+    ('amount', Loan.amount),
+    ('matched_lender_id', Loan.matched_lender_id),
+    ('status', Loan.status),
+    ('created_at', Loan.created_at)
+)
+
+LENDER_LOAN = Shape(
+    ('id', Loan.id),
+    ('borrower_name', BorrowerUser.name, 'Unknown'),
+    ('amount', Loan.amount),
+    ('interest_rate', Loan.interest_rate),
+    ('status', Loan.status),
+    ('created_at', Loan.created_at)
+)
+
+BORROWER_LOAN = Shape(
+    ('id', Loan.id),
+    ('lender_name', LenderUser.name, 'Unknown'),
+    ('amount', Loan.amount),
+    ('interest_rate', Loan.interest_rate),
+    ('status', Loan.status),
+    ('created_at', Loan.created_at),
+    ('due_date', Loan.due_date),
+    ('disbursed_at', Loan.disbursed_at),
+    ('repaid_at', Loan.repaid_at)
+)
+
+LOAN = Shape(
+    ('id', Loan.id),
+    ('amount', Loan.amount),
+    ('interest_rate', Loan.interest_rate),
+    ('status', Loan.status),
+    ('created_at', Loan.created_at),
+    ('disbursed_at', Loan.disbursed_at),
+    ('repaid_at', Loan.repaid_at)
+)
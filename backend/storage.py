@@ -0,0 +1,82 @@
+from functools import wraps
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+
+# SQLite storage profiles, selected with SQLITE_PROFILE. Pragmas are applied to every new
+# connection. With read_pool set, read-only endpoints run on a separate pool of query_only
+# connections, so in WAL mode their reads never wait for (or hold up) a writer.
+PROFILES = {
+    # SQLite's own defaults: rollback journal, one pool for everything
+    'default': {
+        'pragmas': {},
+        'read_pool': False
+    },
+    'production': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',    # Durable at checkpoints, never corrupt; safe with WAL
+            'cache_size': -64000,       # 64 MB page cache per connection
+            'mmap_size': 268435456,     # Read through 256 MB of memory-mapped I/O
+            'busy_timeout': 5000,       # Wait up to 5s for the write lock instead of failing
+            'wal_autocheckpoint': 1000  # Pages; large writes are folded back by checkpoint()
+        },
+        'read_pool': True
+    }
+}
+
+READ_BIND = 'reads'
+CHECKPOINT_MODES = ['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE']
+
+# Sends everything to the read pool while a read_only view runs, except flushes
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('read_only'):
+            engine = self._db.engines.get(READ_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def _set_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+    return on_connect
+
+# Initialize `db` for the app under its storage profile
+def init_storage(app, db):
+    profile = PROFILES[app.config['SQLITE_PROFILE']]
+    if profile['read_pool']:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[READ_BIND] = {
+            'url': app.config['SQLALCHEMY_DATABASE_URI'],
+            'pool_size': app.config['SQLITE_READ_POOL_SIZE'],
+            'max_overflow': 0
+        }
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+    db.init_app(app)
+
+    with app.app_context():
+        db.event.listen(db.engines[None], 'connect', _set_pragmas(profile['pragmas']))
+        if profile['read_pool']:
+            # journal_mode is a property of the database file, set through the writer
+            pragmas = {name: value for name, value in profile['pragmas'].items() if name != 'journal_mode'}
+            db.event.listen(db.engines[READ_BIND], 'connect', _set_pragmas(dict(pragmas, query_only='ON')))
+
+# Route a view's queries to the read pool; any write it attempts fails
+def read_only(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+# Copy the WAL back into the database file. Returns (busy, wal pages, pages checkpointed);
+# TRUNCATE also resets the WAL file to zero bytes.
+def checkpoint(db, mode='PASSIVE'):
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f"mode must be one of {', '.join(CHECKPOINT_MODES)}")
+    with db.engine.connect() as conn:
+        return tuple(conn.exec_driver_sql(f'PRAGMA wal_checkpoint({mode})').one())
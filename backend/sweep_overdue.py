@@ -0,0 +1,30 @@
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from outbox import drain
+from overdue import OVERDUE_CREDIT_PENALTY, SWEEP_BATCH_SIZE, sweep_overdue
+
+# Mark loans past their due date as overdue. Meant to be run on a schedule (e.g. cron).
+def main():
+    parser = argparse.ArgumentParser(description='Mark loans past their due date as overdue')
+    parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE, help='loans updated per transaction')
+    parser.add_argument('--penalty', type=int, default=OVERDUE_CREDIT_PENALTY, help='credit score penalty per overdue loan')
+    args = parser.parse_args()
+
+    with app.app_context():
+        summary = sweep_overdue(batch_size=args.batch_size, penalty=args.penalty)
+        # Append the sweep's ledger blocks before exiting
+        drain()
+        if summary['loans']:
+            print(f"Marked {summary['loans']} loans (₹{summary['amount']:.2f}) overdue")
+        else:
+            print("No newly overdue loans")
+        if 'error' in summary:
+            print(f"Sweep stopped early: {summary['error']}; run it again to mark the rest")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
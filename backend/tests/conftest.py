@@ -0,0 +1,74 @@
+import itertools
+import os
+import sys
+import tempfile
+import uuid
+from types import SimpleNamespace
+import pytest
+
+# The suite runs against a throwaway database, with uploads and ledger segments in a scratch
+# directory. The app binds its engine on import, so this has to happen first.
+SCRATCH = tempfile.mkdtemp(prefix='defi_loan_tests_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(SCRATCH, 'test.db')
+os.chdir(SCRATCH)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+from database import create_schema
+from models import Borrower, Lender, Loan, User
+
+app.config['TESTING'] = True
+app.config['COLLATERAL_WORKERS'] = 0
+
+_ids = itertools.count(1)
+
+@pytest.fixture(scope='session', autouse=True)
+def schema():
+    with app.app_context():
+        create_schema()
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+# Log a test client in as an account made by make_account, without going through /api/login
+@pytest.fixture
+def login():
+    def login(client, account):
+        with client.session_transaction() as session:
+            session['user_id'] = account.user_id
+            session['role'] = account.role
+    return login
+
+# Create a user with its lender or borrower row; returns (id, user_id, role). Extra keyword
+# arguments are set on the lender/borrower.
+@pytest.fixture
+def make_account():
+    def make_account(role, **values):
+        n = next(_ids)
+        with app.app_context():
+            user = User(name=f'{role}{n}', email=f'{role}{n}@example.com', password='secret', role=role)
+            db.session.add(user)
+            db.session.flush()
+            account = None
+            if role == 'lender':
+                account = Lender(user_id=user.id, **values)
+            elif role == 'borrower':
+                account = Borrower(user_id=user.id, **values)
+            if account is not None:
+                db.session.add(account)
+            db.session.commit()
+            return SimpleNamespace(id=account.id if account else None, user_id=user.id, role=role)
+    return make_account
+
+# Create a loan (requested unless a status is given) for a borrower account; returns its id
+@pytest.fixture
+def make_loan():
+    def make_loan(borrower, amount, **values):
+        with app.app_context():
+            values.setdefault('status', 'requested')
+            loan = Loan(unique_data_id=str(uuid.uuid4()), borrower_id=borrower.id, amount=amount, **values)
+            db.session.add(loan)
+            db.session.commit()
+            return loan.id
+    return make_loan
@@ -0,0 +1,42 @@
+import pytest
+from app import app
+
+@pytest.fixture(autouse=True)
+def no_rollover(monkeypatch):
+    # ETags also change when the max-age window rolls over; keep that out of these tests
+    monkeypatch.setitem(app.config, 'RESPONSE_CACHE_MAX_AGE_SECONDS', 10 ** 9)
+
+def get(client, url, etag=None):
+    return client.get(url, headers={'If-None-Match': etag} if etag else {})
+
+def test_unchanged_list_is_not_modified(client, login, make_account, make_loan):
+    borrower = make_account('borrower')
+    make_loan(borrower, 100)
+    login(client, make_account('admin'))
+    url = f'/api/borrowers/{borrower.id}/loans'
+
+    first = get(client, url)
+    assert first.status_code == 200
+    etag = first.headers['ETag'].strip('"')
+
+    again = get(client, url, etag)
+    assert again.status_code == 304
+    assert again.data == b''
+
+def test_write_through_api_invalidates_etag(client, login, make_account, make_loan):
+    lender = make_account('lender', account_balance=10000.0)
+    borrower = make_account('borrower')
+    loan_id = make_loan(borrower, 100)
+    login(client, make_account('admin'))
+    url = f'/api/borrowers/{borrower.id}/loans'
+    etag = get(client, url).headers['ETag'].strip('"')
+
+    # A write that fails leaves cached responses alone
+    assert client.put(f'/api/loans/{loan_id}/approve', json={'status': 'bogus'}).status_code == 400
+    assert get(client, url, etag).status_code == 304
+
+    assert client.put(f'/api/loans/{loan_id}/approve', json={'status': 'approved', 'lender_id': lender.id}).status_code == 200
+    response = get(client, url, etag)
+    assert response.status_code == 200
+    assert response.headers['ETag'].strip('"') != etag
+    assert [loan['status'] for loan in response.get_json()['loans']] == ['approved']
@@ -0,0 +1,111 @@
+import io
+import os
+from types import SimpleNamespace
+from app import app, db
+from models import Borrower, Collateral, CollateralBlob, User
+
+CONTENT = b'collateral document 0123456789'
+
+def upload(client, borrower, content=CONTENT):
+    response = client.post(
+        f'/api/borrowers/{borrower.id}/collateral',
+        data={'file': (io.BytesIO(content), 'document.txt')},
+        content_type='multipart/form-data',
+    )
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+# A borrower whose borrowers.id is not its users.id (nor any other user's)
+def make_borrower(make_account):
+    with app.app_context():
+        top = max(db.session.execute(db.select(db.func.max(User.id))).scalar() or 0,
+                  db.session.execute(db.select(db.func.max(Borrower.id))).scalar() or 0)
+    return make_account('borrower', id=top + 10)
+
+def test_owner_can_fetch_collateral_byte_ranges(client, login, make_account):
+    borrower = make_borrower(make_account)
+    login(client, borrower)
+    collateral_id = upload(client, borrower)['collateral_id']
+
+    response = client.get(f'/api/collaterals/{collateral_id}/file')
+    assert response.status_code == 200
+    assert response.data == CONTENT
+
+    response = client.get(f'/api/collaterals/{collateral_id}/file', headers={'Range': 'bytes=11-18'})
+    assert response.status_code == 206
+    assert response.data == CONTENT[11:19]
+    assert response.headers['Content-Range'] == f'bytes 11-18/{len(CONTENT)}'
+
+# A user whose users.id happens to equal the owner's borrowers.id is still someone else
+def test_other_borrower_cannot_view_collateral(client, login, make_account):
+    owner = make_borrower(make_account)
+    with app.app_context():
+        db.session.add(User(id=owner.id, name='lookalike', email=f'lookalike{owner.id}@example.com', password='secret', role='borrower'))
+        db.session.add(Borrower(user_id=owner.id))
+        db.session.commit()
+    lookalike = SimpleNamespace(user_id=owner.id, role='borrower')
+
+    login(client, owner)
+    collateral_id = upload(client, owner)['collateral_id']
+
+    for other in (lookalike, make_account('borrower')):
+        login(client, other)
+        assert client.get(f'/api/collaterals/{collateral_id}').status_code == 403
+        assert client.get(f'/api/collaterals/{collateral_id}/file').status_code == 403
+        response = client.post(
+            f'/api/borrowers/{owner.id}/collateral',
+            data={'file': (io.BytesIO(CONTENT), 'document.txt')},
+            content_type='multipart/form-data',
+        )
+        assert response.status_code == 403
+
+def blob(content_hash):
+    with app.app_context():
+        row = db.session.get(CollateralBlob, content_hash)
+        return (row.ref_count, row.path) if row else None
+
+def test_identical_uploads_share_one_counted_blob(client, login, make_account):
+    admin = make_account('admin')
+    first, second = make_borrower(make_account), make_borrower(make_account)
+    content = b'shared deed ' + os.urandom(8)
+
+    login(client, admin)
+    uploads = [upload(client, first, content), upload(client, second, content)]
+    other = upload(client, first, content + b' (amended)')
+
+    content_hash = uploads[0]['content_hash']
+    assert uploads[1]['content_hash'] == content_hash
+    assert other['content_hash'] != content_hash
+    ref_count, path = blob(content_hash)
+    assert ref_count == 2
+    with app.app_context():
+        assert {c.filepath for c in Collateral.query.filter_by(content_hash=content_hash)} == {path}
+    assert os.listdir(os.path.join(app.config['UPLOAD_FOLDER'], 'blobs', 'tmp')) == []
+
+    # The file stays while any collateral uses it
+    assert client.delete(f"/api/collaterals/{uploads[0]['collateral_id']}").status_code == 200
+    assert blob(content_hash) == (1, path)
+    response = client.get(f"/api/collaterals/{uploads[1]['collateral_id']}/file")
+    assert response.status_code == 200
+    assert response.data == content
+
+    assert client.delete(f"/api/collaterals/{uploads[1]['collateral_id']}").status_code == 200
+    assert blob(content_hash) is None
+    assert not os.path.exists(path)
+    assert client.delete(f"/api/collaterals/{uploads[1]['collateral_id']}").status_code == 404
+    assert blob(other['content_hash'])[0] == 1
+
+    # Uploading the content again stores it afresh
+    again = upload(client, second, content)
+    assert blob(content_hash) == (1, path)
+    assert client.get(f"/api/collaterals/{again['collateral_id']}/file").data == content
+
+def test_only_owner_or_admin_deletes_collateral(client, login, make_account):
+    owner = make_borrower(make_account)
+    login(client, owner)
+    collateral_id = upload(client, owner)['collateral_id']
+
+    login(client, make_borrower(make_account))
+    assert client.delete(f'/api/collaterals/{collateral_id}').status_code == 403
+    login(client, owner)
+    assert client.delete(f'/api/collaterals/{collateral_id}').status_code == 200
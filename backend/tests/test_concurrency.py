@@ -0,0 +1,122 @@
+import threading
+from app import app, db
+from models import Borrower, Lender, Loan
+
+THREADS = 8
+
+# Send the same request from THREADS clients at once; returns the status codes
+def race(login, account, method, url, body=None):
+    clients = [app.test_client() for _ in range(THREADS)]
+    for client in clients:
+        login(client, account)
+    barrier = threading.Barrier(THREADS)
+    codes = []
+
+    def send(client):
+        barrier.wait()
+        codes.append(client.open(url, method=method, json=body).status_code)
+
+    threads = [threading.Thread(target=send, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(codes)
+
+def balances(lender, borrower):
+    with app.app_context():
+        return db.session.get(Lender, lender.id).account_balance, db.session.get(Borrower, borrower.id).account_balance
+
+def loan_status(loan_id):
+    with app.app_context():
+        return db.session.get(Loan, loan_id).status
+
+def test_concurrent_approvals_disburse_once(login, make_account, make_loan):
+    admin = make_account('admin')
+    lender = make_account('lender', account_balance=10000.0)
+    borrower = make_account('borrower', account_balance=0.0)
+    loan_id = make_loan(borrower, 1000)
+
+    codes = race(login, admin, 'PUT', f'/api/loans/{loan_id}/approve', {'status': 'approved', 'lender_id': lender.id})
+
+    assert codes == [200] + [409] * (THREADS - 1)
+    assert loan_status(loan_id) == 'approved'
+    assert balances(lender, borrower) == (9000.0, 1000.0)
+
+def test_concurrent_repayments_pay_once(client, login, make_account, make_loan):
+    admin = make_account('admin')
+    lender = make_account('lender', account_balance=10000.0, interest_rate=10.0)
+    borrower = make_account('borrower', account_balance=5000.0)
+    loan_id = make_loan(borrower, 1000)
+    login(client, admin)
+    assert client.put(f'/api/loans/{loan_id}/approve', json={'status': 'approved', 'lender_id': lender.id}).status_code == 200
+
+    codes = race(login, admin, 'POST', f'/api/loans/{loan_id}/repay')
+
+    assert codes == [200] + [409] * (THREADS - 1)
+    assert loan_status(loan_id) == 'paid'
+    # Principal plus 10% interest went back exactly once; no money was created or lost
+    assert balances(lender, borrower) == (10100.0, 4900.0)
+    assert sum(balances(lender, borrower)) == 15000.0
+
+def test_concurrent_approve_and_reject_one_wins(login, make_account, make_loan):
+    admin = make_account('admin')
+    lender = make_account('lender', account_balance=10000.0)
+    borrower = make_account('borrower', account_balance=0.0)
+    loan_id = make_loan(borrower, 1000)
+
+    clients = [app.test_client() for _ in range(THREADS)]
+    barrier = threading.Barrier(THREADS)
+    codes = {}
+
+    def send(i, client):
+        login(client, admin)
+        status = 'approved' if i % 2 else 'rejected'
+        body = {'status': status, 'lender_id': lender.id}
+        barrier.wait()
+        codes[i] = (status, client.put(f'/api/loans/{loan_id}/approve', json=body).status_code)
+
+    threads = [threading.Thread(target=send, args=(i, client)) for i, client in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    winners = [status for status, code in codes.values() if code == 200]
+    assert len(winners) == 1
+    assert sorted(code for _, code in codes.values()) == [200] + [409] * (THREADS - 1)
+    assert loan_status(loan_id) == winners[0]
+    assert balances(lender, borrower) == ((9000.0, 1000.0) if winners[0] == 'approved' else (10000.0, 0.0))
+
+def test_concurrent_approvals_never_overdraw_lender(login, make_account, make_loan):
+    admin = make_account('admin')
+    lender = make_account('lender', account_balance=3500.0)
+    borrowers = [make_account('borrower', account_balance=0.0) for _ in range(THREADS)]
+    loan_ids = [make_loan(borrower, 1000) for borrower in borrowers]
+
+    clients = [app.test_client() for _ in range(THREADS)]
+    barrier = threading.Barrier(THREADS)
+    codes = {}
+
+    def send(loan_id, client):
+        login(client, admin)
+        barrier.wait()
+        codes[loan_id] = client.put(f'/api/loans/{loan_id}/approve', json={'status': 'approved', 'lender_id': lender.id}).status_code
+
+    threads = [threading.Thread(target=send, args=args) for args in zip(loan_ids, clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The balance covers three loans; the rest are refused and stay requested
+    approved = [loan_id for loan_id, code in codes.items() if code == 200]
+    assert sorted(codes.values()) == [200] * 3 + [400] * (THREADS - 3)
+    assert sorted(loan_status(loan_id) for loan_id in loan_ids) == ['approved'] * 3 + ['requested'] * (THREADS - 3)
+    with app.app_context():
+        lender_balance = db.session.get(Lender, lender.id).account_balance
+        borrower_balances = {b.id: db.session.get(Borrower, b.id).account_balance for b in borrowers}
+    assert lender_balance == 500.0
+    assert sum(borrower_balances.values()) + lender_balance == 3500.0
+    funded = {borrower.id for loan_id, borrower in zip(loan_ids, borrowers) if loan_id in approved}
+    assert borrower_balances == {b.id: 1000.0 if b.id in funded else 0.0 for b in borrowers}
@@ -0,0 +1,129 @@
+import itertools
+from contextlib import contextmanager
+import pytest
+from app import app, db
+from ledger import ledger_appender, verify_blocks, verify_chain, verify_chain_parallel
+import ledger_segments
+from ledger_segments import UnverifiedLedger, seal_segments
+from models import Block, LedgerCheckpoint
+
+def append_blocks(count, tag='test'):
+    with app.app_context():
+        blocks = ledger_appender.append_many([(f'{tag}-{i}', 'test', 'Test Event', {'i': i}) for i in range(count)])
+    return [block.id for block in blocks]
+
+def verify(**kwargs):
+    with app.app_context():
+        return verify_chain(**kwargs)
+
+# Change a block behind the ledger's back, restoring it (and a clean audit) afterwards
+@contextmanager
+def tampered(block_id, column='unique_data_id'):
+    with app.app_context():
+        original = getattr(db.session.get(Block, block_id), column)
+        db.session.execute(db.update(Block).where(Block.id == block_id).values({column: 'forged'}))
+        db.session.commit()
+    try:
+        yield
+    finally:
+        with app.app_context():
+            db.session.execute(db.update(Block).where(Block.id == block_id).values({column: original}))
+            db.session.commit()
+        assert verify(full=True)['is_valid']
+
+@pytest.fixture
+def chain():
+    ids = append_blocks(40)
+    assert verify(full=True)['is_valid']
+    return ids
+
+def test_incremental_verify_keeps_reporting_a_failure(chain):
+    with tampered(chain[10]):
+        # Behind the checkpoint, so only a full audit can see it
+        assert verify()['is_valid']
+        failed = verify(full=True)
+        assert not failed['is_valid']
+
+        # Every later run is a full audit and keeps failing
+        again = verify()
+        assert again == dict(failed, mode='full')
+        with app.app_context():
+            checkpoint = LedgerCheckpoint.query.first()
+            assert checkpoint.failed_at is not None
+            assert checkpoint.failure == failed['error_message']
+
+    # A passing full audit clears the failure and incremental runs resume
+    assert verify()['mode'] == 'incremental'
+    with app.app_context():
+        assert LedgerCheckpoint.query.first().failed_at is None
+
+def test_incremental_failure_is_kept(chain):
+    ids = append_blocks(5, tag='tail')
+    with tampered(ids[2]):
+        assert not verify()['is_valid']
+        result = verify()
+        assert not result['is_valid']
+        assert result['mode'] == 'full'
+
+def seal(tmp_path, keep_hot=0):
+    with app.app_context():
+        hot = db.session.query(db.func.count(Block.id)).scalar()
+        return seal_segments(str(tmp_path), hot - keep_hot, keep_hot)
+
+def test_archiving_refuses_a_failed_ledger(chain, tmp_path):
+    with tampered(chain[5]):
+        assert not verify(full=True)['is_valid']
+        with pytest.raises(UnverifiedLedger):
+            seal(tmp_path)
+    assert list(tmp_path.iterdir()) == []
+
+def test_archiving_reverifies_what_it_seals(chain, tmp_path):
+    # Changed after the last passing audit, so only the re-check while sealing can catch it
+    with tampered(chain[5]):
+        with pytest.raises(UnverifiedLedger):
+            seal(tmp_path, keep_hot=5)
+        assert list(tmp_path.iterdir()) == []
+        # The failure is on record for the verification endpoint too
+        assert verify()['mode'] == 'full'
+
+    sealed = seal(tmp_path, keep_hot=5)
+    assert len(sealed) == 1
+    with app.app_context():
+        assert db.session.get(Block, chain[5]) is None
+    assert verify(full=True)['is_valid']
+
+CHUNK_SIZE = 7
+
+# (is_valid, error_message, index) from walking the whole chain in one pass and from
+# verify_chain_parallel with small chunks
+def sequential_and_parallel():
+    with app.app_context():
+        db_path = db.engine.url.database
+        cold = ledger_segments.iter_cold_blocks()
+        hot = Block.query.order_by(Block.id.asc()).all()
+        sequential = verify_blocks(itertools.chain(cold, hot))
+        paths = [segment.path for segment in ledger_segments.segments()]
+    parallel = verify_chain_parallel(db_path, workers=2, chunk_size=CHUNK_SIZE, segment_paths=paths)
+    return sequential[:3], parallel[:3]
+
+def test_parallel_verify_agrees_on_clean_chain(chain):
+    sequential, parallel = sequential_and_parallel()
+    assert sequential[0]
+    assert parallel == sequential
+
+# Blocks at the start, the end and the middle of a chunk
+def chunk_positions(chain):
+    with app.app_context():
+        first_id = db.session.query(db.func.min(Block.id)).scalar()
+    by_offset = {}
+    for block_id in chain[1:]:
+        by_offset.setdefault((block_id - first_id) % CHUNK_SIZE, block_id)
+    return [by_offset[0], by_offset[CHUNK_SIZE - 1], by_offset[CHUNK_SIZE // 2]]
+
+@pytest.mark.parametrize('column', ['unique_data_id', 'prev_hash', 'hash'])
+def test_parallel_verify_reports_same_failure(chain, column):
+    for block_id in chunk_positions(chain):
+        with tampered(block_id, column):
+            sequential, parallel = sequential_and_parallel()
+            assert not sequential[0]
+            assert parallel == sequential, block_id
@@ -0,0 +1,87 @@
+from app import app, db
+from models import Borrower, Lender, Loan
+from portfolio import check_summaries
+
+def loan_status(loan_id):
+    with app.app_context():
+        return db.session.get(Loan, loan_id).status
+
+def test_reject_pending_request(client, login, make_account, make_loan):
+    admin = make_account('admin')
+    borrower = make_account('borrower')
+    loan_id = make_loan(borrower, 500)
+
+    login(client, admin)
+    response = client.put(f'/api/loans/{loan_id}/approve', json={'status': 'rejected'})
+    assert response.status_code == 200
+    assert loan_status(loan_id) == 'rejected'
+
+def test_reject_after_approval_conflicts(client, login, make_account, make_loan):
+    admin = make_account('admin')
+    lender = make_account('lender', account_balance=1000.0)
+    borrower = make_account('borrower', account_balance=0.0)
+    loan_id = make_loan(borrower, 500)
+
+    login(client, admin)
+    assert client.put(f'/api/loans/{loan_id}/approve', json={'status': 'approved', 'lender_id': lender.id}).status_code == 200
+    response = client.put(f'/api/loans/{loan_id}/approve', json={'status': 'rejected'})
+    assert response.status_code == 409
+
+    # The disbursed loan and the money stay where they are
+    assert loan_status(loan_id) == 'approved'
+    with app.app_context():
+        assert db.session.get(Lender, lender.id).account_balance == 500.0
+        assert db.session.get(Borrower, borrower.id).account_balance == 500.0
+
+def test_unknown_status_is_rejected(client, login, make_account, make_loan):
+    admin = make_account('admin')
+    borrower = make_account('borrower')
+    loan_id = make_loan(borrower, 500)
+
+    login(client, admin)
+    response = client.put(f'/api/loans/{loan_id}/approve', json={'status': 'bogus'})
+    assert response.status_code == 400
+    assert loan_status(loan_id) == 'requested'
+
+def test_decisions_keep_summaries_consistent(client, login, make_account, make_loan):
+    admin = make_account('admin')
+    lender = make_account('lender', account_balance=10000.0)
+    borrower = make_account('borrower')
+    rejected = make_loan(borrower, 100, lender_id=lender.id)
+    approved = make_loan(borrower, 200)
+    batch = [make_loan(borrower, 300), make_loan(borrower, 400)]
+
+    login(client, admin)
+    assert client.put(f'/api/loans/{rejected}/approve', json={'status': 'rejected'}).status_code == 200
+    assert client.put(f'/api/loans/{approved}/approve', json={'status': 'approved', 'lender_id': lender.id}).status_code == 200
+    response = client.put('/api/loans/batch/approve', json={'decisions': [
+        {'loan_id': batch[0], 'status': 'approved', 'lender_id': lender.id},
+        {'loan_id': batch[1], 'status': 'rejected'},
+    ]})
+    assert response.get_json()['succeeded'] == 2
+
+    with app.app_context():
+        assert check_summaries() == {}
+
+def test_batch_reports_invalid_ids_per_item(client, login, make_account, make_loan):
+    admin = make_account('admin')
+    lender = make_account('lender', account_balance=10000.0)
+    borrower = make_account('borrower')
+    loan_id = make_loan(borrower, 100)
+
+    login(client, admin)
+    response = client.put('/api/loans/batch/approve', json={'decisions': [
+        {'loan_id': [loan_id], 'status': 'rejected'},
+        {'loan_id': {'id': loan_id}, 'status': 'rejected'},
+        {'loan_id': True, 'status': 'rejected'},
+        {'loan_id': loan_id, 'status': 'approved', 'lender_id': {'id': lender.id}},
+        {'loan_id': loan_id, 'status': 'approved', 'lender_id': [lender.id]},
+        {'loan_id': loan_id, 'status': 'approved', 'lender_id': lender.id},
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [result['message'] for result in body['results']] == (
+        ['loan_id must be an integer'] * 3 + ['lender_id must be an integer'] * 2 + ['Loan approved successfully']
+    )
+    assert body['succeeded'] == 1
+    assert loan_status(loan_id) == 'approved'
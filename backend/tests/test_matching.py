@@ -0,0 +1,75 @@
+import random
+from types import SimpleNamespace
+import matching
+from matching import LenderBook
+
+# A book driven directly with lender rows, without the database
+def book_of(rows):
+    book = LenderBook()
+    book._loaded = True
+    book._checked_at = float('inf')
+    for row in rows.values():
+        book._put(matching._entry(row))
+    return book
+
+def random_lender(rng, lender_id):
+    low = rng.choice([0.0, 100.0, 500.0, 1000.0])
+    return SimpleNamespace(
+        id=lender_id,
+        min_amount=low,
+        max_amount=low + rng.choice([100.0, 1000.0, 5000.0]),
+        account_balance=rng.choice([0.0, 200.0, 2000.0, 10000.0]),
+        interest_rate=rng.choice([5.0, 7.5, 10.0, 12.0]),
+    )
+
+def brute_force(rows, amount, exclude=()):
+    eligible = [
+        (row.interest_rate, row.id) for row in rows.values()
+        if row.min_amount <= amount <= min(row.max_amount, row.account_balance) and row.id not in exclude
+    ]
+    return min(eligible)[1] if eligible else None
+
+def test_book_matches_brute_force_through_updates(monkeypatch):
+    monkeypatch.setattr(matching, 'BLOCK_SIZE', 4)
+    rng = random.Random(7)
+    rows = {i: random_lender(rng, i) for i in range(1, 200)}
+    book = book_of(rows)
+
+    for step in range(600):
+        lender_id = rng.randrange(1, 260)
+        if lender_id in rows and rng.random() < 0.2:
+            del rows[lender_id]
+            book._remove(lender_id)
+        else:
+            rows[lender_id] = random_lender(rng, lender_id)
+            book._put(matching._entry(rows[lender_id]))
+
+        amount = rng.choice([50.0, 150.0, 600.0, 1500.0, 4000.0, 9000.0])
+        exclude = set(rng.sample(sorted(rows), 3)) if rows else set()
+        assert book.match(amount) == brute_force(rows, amount), step
+        assert book.match(amount, exclude=exclude) == brute_force(rows, amount, exclude), step
+
+# Lenders made outside the API reach the book through the new-lender check; the balance change
+# from the approval reaches it through refresh_lender
+def test_requests_follow_lender_changes(client, login, make_account, monkeypatch):
+    monkeypatch.setattr(matching, 'MAX_AGE_SECONDS', 0)
+    terms = {'min_amount': 50000.0, 'max_amount': 60000.0}
+    cheap = make_account('lender', account_balance=60000.0, interest_rate=1.0, **terms)
+    dear = make_account('lender', account_balance=60000.0, interest_rate=2.0, **terms)
+    admin = make_account('admin')
+
+    login(client, admin)
+
+    def request_loan():
+        borrower = make_account('borrower')
+        response = client.post('/api/loans', json={'borrower_id': borrower.id, 'amount': 55555})
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()
+
+    first = request_loan()
+    assert first['matched_lender_id'] == cheap.id
+    response = client.put(f"/api/loans/{first['loan_id']}/approve", json={'status': 'approved', 'lender_id': cheap.id})
+    assert response.status_code == 200
+
+    # The cheap lender has 4445 left, so the next request goes to the other one
+    assert request_loan()['matched_lender_id'] == dear.id
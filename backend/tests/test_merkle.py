@@ -0,0 +1,64 @@
+import hashlib
+import pytest
+import sqlalchemy
+from app import app
+from merkle import append_leaves, inclusion_path, leaf_hash, node_hash, root_hash, verify_proof
+from models import MerkleNode, MerkleRoot
+
+# A tree of its own in an in-memory database, so the app's ledger doesn't add leaves to it
+@pytest.fixture
+def conn():
+    engine = sqlalchemy.create_engine('sqlite://')
+    MerkleNode.__table__.create(engine)
+    MerkleRoot.__table__.create(engine)
+    with app.app_context(), engine.begin() as conn:
+        yield conn
+
+def block_hashes(count):
+    return [hashlib.sha256(f'block {i}'.encode()).hexdigest() for i in range(count)]
+
+# The root computed from all the leaves at once, promoting an unpaired node unchanged
+def scratch_root(hashes):
+    level = [leaf_hash(h) for h in hashes]
+    while len(level) > 1:
+        level = [node_hash(level[i], level[i + 1]) if i + 1 < len(level) else level[i] for i in range(0, len(level), 2)]
+    return level[0]
+
+# Append in uneven batches so paths are updated incrementally as the tree grows
+def grow(conn, hashes):
+    start, step = 0, 1
+    while start < len(hashes):
+        batch = hashes[start:start + step]
+        append_leaves(conn, [(start + i + 1, h) for i, h in enumerate(batch)])
+        start += len(batch)
+        step += 1
+        assert root_hash(conn) == scratch_root(hashes[:start])
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 6, 7, 8, 9, 13, 31, 33])
+def test_every_leaf_proves_against_scratch_root(conn, size):
+    hashes = block_hashes(size)
+    grow(conn, hashes)
+    root = scratch_root(hashes)
+
+    for position, block_hash in enumerate(hashes):
+        path = inclusion_path(conn, position, size)
+        assert verify_proof(block_hash, path, root), position
+        # A proof doesn't carry over to another leaf's hash
+        if size > 1:
+            assert not verify_proof(hashes[(position + 1) % size], path, root)
+
+@pytest.mark.parametrize('size', [2, 5, 13])
+def test_tampered_sibling_fails(conn, size):
+    hashes = block_hashes(size)
+    grow(conn, hashes)
+    root = scratch_root(hashes)
+
+    for position, block_hash in enumerate(hashes):
+        path = inclusion_path(conn, position, size)
+        for i, step in enumerate(path):
+            forged = [dict(s) for s in path]
+            forged[i]['hash'] = hashlib.sha256(step['hash'].encode()).hexdigest()
+            assert not verify_proof(block_hash, forged, root), (position, i)
+            swapped = [dict(s) for s in path]
+            swapped[i]['side'] = 'right' if step['side'] == 'left' else 'left'
+            assert not verify_proof(block_hash, swapped, root), (position, i)
@@ -0,0 +1,12 @@
+from app import app
+from migrations import LATEST_VERSION, current_version, migrate, slow_plans
+
+# The suite's database was created and migrated from scratch by create_schema()
+def test_fresh_database_is_fully_migrated():
+    with app.app_context():
+        assert current_version() == LATEST_VERSION
+        assert migrate() == []
+
+def test_hot_queries_use_indexes():
+    with app.app_context():
+        assert slow_plans() == {}
@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+import time
+import uuid
+from app import app, db
+from ledger import verify_chain
+from models import Block, LedgerOutbox
+from outbox import LedgerWriter, drain, pending_count, record
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (outbox id, unique_data_id, block id, block's unique_data_id) for the rows tagged `tag`
+def applied(tag):
+    with app.app_context():
+        return db.session.execute(
+            db.select(LedgerOutbox.id, LedgerOutbox.unique_data_id, Block.id, Block.unique_data_id)
+            .outerjoin(Block, Block.id == LedgerOutbox.block_id)
+            .where(LedgerOutbox.unique_data_id.like(f'{tag}-%'))
+            .order_by(LedgerOutbox.id)
+        ).all()
+
+def assert_appended_in_order(tag, count):
+    rows = applied(tag)
+    assert len(rows) == count
+    assert all(block_id is not None for _, _, block_id, _ in rows)
+    assert [row[1] for row in rows] == [row[3] for row in rows]
+    block_ids = [row[2] for row in rows]
+    assert block_ids == sorted(block_ids)
+    with app.app_context():
+        assert verify_chain(full=True)['is_valid']
+
+# Rows left pending by a process that stopped before appending them: written straight to the
+# table, so nothing wakes a writer
+def leave_pending(tag, count):
+    with app.app_context():
+        db.session.execute(LedgerOutbox.__table__.insert(), [
+            {'unique_data_id': f'{tag}-{i}', 'actor': 'test', 'event_type': 'Test Event', 'block_metadata': None}
+            for i in range(count)
+        ])
+        db.session.commit()
+
+def wait_until_drained(timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with app.app_context():
+            if pending_count() == 0:
+                return
+        time.sleep(0.05)
+    raise AssertionError('outbox was not drained')
+
+def test_blocks_follow_outbox_order():
+    tag = uuid.uuid4().hex
+    # Several transactions, several rows each
+    for batch in range(4):
+        with app.app_context():
+            for i in range(5):
+                record(f'{tag}-{batch * 5 + i:02d}', 'test', 'Test Event', {'batch': batch, 'i': i})
+            db.session.commit()
+    with app.app_context():
+        drain(batch_size=3)
+
+    assert_appended_in_order(tag, 20)
+
+def test_writer_appends_leftover_rows_on_startup():
+    tag = uuid.uuid4().hex
+    leave_pending(tag, 12)
+
+    LedgerWriter().start(app)
+    wait_until_drained()
+    assert_appended_in_order(tag, 12)
+
+def test_drain_script_appends_leftover_rows():
+    tag = uuid.uuid4().hex
+    leave_pending(tag, 7)
+
+    result = subprocess.run(
+        [sys.executable, os.path.join(BACKEND, 'drain_outbox.py')],
+        capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert 'ledger blocks' in result.stdout
+    with app.app_context():
+        assert pending_count() == 0
+    assert_appended_in_order(tag, 7)
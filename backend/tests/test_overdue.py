@@ -0,0 +1,89 @@
+import json
+import sqlite3
+from datetime import timedelta
+from app import app, db
+from models import Block, LedgerOutbox, Loan, get_ist_time
+from outbox import drain
+import overdue
+from overdue import sweep_overdue
+
+def sweep_rows(cutoff):
+    with app.app_context():
+        return db.session.execute(
+            db.select(LedgerOutbox).where(LedgerOutbox.unique_data_id == f'overdue_sweep_{cutoff.isoformat()}')
+            .order_by(LedgerOutbox.id)
+        ).scalars().all()
+
+def past_due_loans(make_account, make_loan, count):
+    lender = make_account('lender')
+    borrower = make_account('borrower')
+    due = get_ist_time().replace(tzinfo=None) - timedelta(days=1)
+    return [make_loan(borrower, 100, status='approved', lender_id=lender.id, due_date=due) for _ in range(count)]
+
+def test_sweep_records_a_block_per_batch(make_account, make_loan):
+    loan_ids = past_due_loans(make_account, make_loan, 3)
+    cutoff = get_ist_time().replace(tzinfo=None)
+
+    with app.app_context():
+        summary = sweep_overdue(now=cutoff, batch_size=2)
+    assert summary['loans'] == 3
+
+    # Queued with each batch's changes, then appended to the chain
+    rows = sweep_rows(cutoff)
+    assert [json.loads(row.block_metadata)['loans'] for row in rows] == [2, 1]
+    with app.app_context():
+        drain()
+        assert set(db.session.execute(db.select(Loan.status).where(Loan.id.in_(loan_ids))).scalars()) == {'overdue'}
+    rows = sweep_rows(cutoff)
+    assert all(row.block_id is not None for row in rows)
+    with app.app_context():
+        assert [db.session.get(Block, row.block_id).event_type for row in rows] == ['Loans Overdue'] * 2
+
+# Make the loans UPDATE of the sweep fail with "database is locked" while `locked` says so
+class LockedSweep:
+    def __init__(self, locked):
+        self.locked = locked
+        self.calls = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE loans SET status'):
+            self.calls += 1
+            if self.locked(self.calls):
+                raise sqlite3.OperationalError('database is locked')
+
+    def __enter__(self):
+        with app.app_context():
+            self._engine = db.engine
+        db.event.listen(self._engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        db.event.remove(self._engine, 'before_cursor_execute', self)
+
+def test_sweep_retries_a_locked_batch(make_account, make_loan):
+    past_due_loans(make_account, make_loan, 3)
+    cutoff = get_ist_time().replace(tzinfo=None)
+
+    # The second batch is locked on its first two attempts
+    with LockedSweep(lambda call: call in (2, 3)), app.app_context():
+        summary = sweep_overdue(now=cutoff, batch_size=1)
+
+    assert summary['loans'] == 3
+    assert 'error' not in summary
+    assert [json.loads(row.block_metadata)['loans'] for row in sweep_rows(cutoff)] == [1, 1, 1]
+
+def test_sweep_stopped_by_a_lock_reports_committed_batches(monkeypatch, make_account, make_loan):
+    loan_ids = past_due_loans(make_account, make_loan, 3)
+    cutoff = get_ist_time().replace(tzinfo=None)
+    monkeypatch.setattr(overdue, 'SWEEP_MAX_ATTEMPTS', 3)
+
+    # Every attempt after the first batch is locked
+    with LockedSweep(lambda call: call > 1), app.app_context():
+        summary = sweep_overdue(now=cutoff, batch_size=1)
+
+    assert summary['loans'] == 1
+    assert 'locked' in summary['error']
+    assert len(sweep_rows(cutoff)) == 1
+    with app.app_context():
+        statuses = db.session.execute(db.select(Loan.status).where(Loan.id.in_(loan_ids))).scalars().all()
+    assert sorted(statuses) == ['approved', 'approved', 'overdue']
@@ -0,0 +1,51 @@
+import pytest
+from app import app, db
+from models import Borrower, Loan
+
+# Every row of a list, following next_cursor from page to page
+def walk(client, url, key, limit=50):
+    rows = []
+    cursor = None
+    while True:
+        response = client.get(url + f'&limit={limit}' + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        rows += body[key]
+        cursor = body['next_cursor']
+        if cursor is None:
+            return rows
+
+# SQLite's order: NULLs first, then values, ties by id
+def expected_order(rows):
+    return [row_id for value, row_id in sorted(rows, key=lambda row: (row[0] is not None, row[0] or 0, row[1]))]
+
+@pytest.mark.parametrize('sort', ['credit_score', 'account_balance', 'created_at'])
+def test_borrower_pages_include_null_sort_values(client, login, make_account, sort):
+    login(client, make_account('admin'))
+    borrowers = [make_account('borrower', credit_score=700 + i % 3, account_balance=float(i % 4)) for i in range(12)]
+    with app.app_context():
+        column = getattr(Borrower, sort)
+        db.session.execute(
+            db.update(Borrower).where(Borrower.id.in_([b.id for b in borrowers[::3]])).values({sort: None})
+        )
+        db.session.commit()
+        rows = db.session.execute(db.select(column, Borrower.id)).all()
+
+    expected = expected_order([(value.isoformat() if hasattr(value, 'isoformat') else value, row_id) for value, row_id in rows])
+    assert [row['id'] for row in walk(client, f'/api/borrowers?sort={sort}', 'borrowers', limit=5)] == expected
+    assert [row['id'] for row in walk(client, f'/api/borrowers?sort=-{sort}', 'borrowers', limit=5)] == expected[::-1]
+
+def test_loan_pages_include_null_created_at(client, login, make_account, make_loan):
+    admin = make_account('admin')
+    borrower = make_account('borrower')
+    loan_ids = [make_loan(borrower, 100 + i) for i in range(7)]
+    with app.app_context():
+        db.session.execute(db.update(Loan).where(Loan.id.in_(loan_ids[:3])).values(created_at=None))
+        db.session.commit()
+
+    login(client, admin)
+    url = f'/api/borrowers/{borrower.id}/loans?sort=created_at'
+    ascending = [row['id'] for row in walk(client, url, 'loans', limit=2)]
+    assert ascending == loan_ids
+    descending = [row['id'] for row in walk(client, url.replace('created_at', '-created_at'), 'loans', limit=2)]
+    assert descending == loan_ids[::-1]
@@ -0,0 +1,79 @@
+import threading
+import uuid
+import pytest
+from app import app, db
+from models import Borrower, Lender, Loan, User
+
+ROWS = 1000
+
+# Statements issued by this thread (the background ledger writer runs its own)
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self._thread = threading.get_ident()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._thread:
+            self.count += 1
+
+    def __enter__(self):
+        with app.app_context():
+            self._engines = list(db.engines.values())
+        for engine in self._engines:
+            db.event.listen(engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        for engine in self._engines:
+            db.event.remove(engine, 'before_cursor_execute', self)
+
+# ROWS lenders and borrowers, and ROWS loans between one of each
+@pytest.fixture(scope='module')
+def seeded():
+    tag = uuid.uuid4().hex[:8]
+    with app.app_context():
+        users = User.__table__
+        db.session.execute(users.insert(), [
+            {'name': f'{role}-{tag}-{i}', 'email': f'{role}-{tag}-{i}@example.com', 'password': 'secret', 'role': role}
+            for role in ('lender', 'borrower') for i in range(ROWS)
+        ])
+        ids = {role: db.session.execute(
+            db.select(users.c.id).where(users.c.role == role, users.c.email.like(f'{role}-{tag}-%')).order_by(users.c.id)
+        ).scalars().all() for role in ('lender', 'borrower')}
+        db.session.execute(Lender.__table__.insert(), [{'user_id': user_id} for user_id in ids['lender']])
+        db.session.execute(Borrower.__table__.insert(), [{'user_id': user_id} for user_id in ids['borrower']])
+        lender_id = db.session.execute(db.select(Lender.id).where(Lender.user_id == ids['lender'][0])).scalar()
+        borrower_id = db.session.execute(db.select(Borrower.id).where(Borrower.user_id == ids['borrower'][0])).scalar()
+        db.session.execute(Loan.__table__.insert(), [
+            {'unique_data_id': f'{tag}-{i}', 'borrower_id': borrower_id, 'lender_id': lender_id, 'amount': 100 + i,
+             'status': 'requested'}
+            for i in range(ROWS)
+        ])
+        db.session.commit()
+    return {'lender_id': lender_id, 'borrower_id': borrower_id}
+
+# name -> (url, key of the rows in the response)
+def endpoint(name, seeded):
+    return {
+        'lenders': ('/api/lenders', 'lenders'),
+        'borrowers': ('/api/borrowers', 'borrowers'),
+        'loan requests': ('/api/loans/requests', 'loans'),
+        'lender loans': (f"/api/lenders/{seeded['lender_id']}/loans", 'loans'),
+        'borrower loans': (f"/api/borrowers/{seeded['borrower_id']}/loans", 'loans'),
+    }[name]
+
+@pytest.mark.parametrize('name', ['lenders', 'borrowers', 'loan requests', 'lender loans', 'borrower loans'])
+def test_list_query_count_is_constant(client, login, make_account, seeded, name):
+    url, key = endpoint(name, seeded)
+    login(client, make_account('admin'))
+
+    counts = {}
+    for limit in (10, ROWS):
+        with QueryCounter() as counter:
+            response = client.get(f'{url}?limit={limit}')
+        assert response.status_code == 200
+        assert len(response.get_json()[key]) == limit
+        counts[limit] = counter.count
+
+    # One statement for the page, however many rows it has
+    assert counts == {10: 1, ROWS: 1}
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from app import app, db
+from models import Borrower, Lender, Loan, LoanSchedule
+from schedules import INSTALLMENT_DAYS, build_schedules, settled, unpack
+
+AMOUNTS = [10000.0, 2500.0, 777.77, 50000.0]
+RATES = [12.0, 0.0, 7.5, 18.0]
+INSTALLMENTS = [12, 3, 7, 24]
+
+def period_rate(annual_rate):
+    return annual_rate / 100 * INSTALLMENT_DAYS / 365
+
+# Equal-installment schedule worked out one period at a time, unrounded
+def amortize(amount, annual_rate, n):
+    r = period_rate(annual_rate)
+    payment = amount * r / (1 - (1 + r) ** -n) if r else amount / n
+    balance, rows = amount, []
+    for _ in range(n):
+        interest = balance * r
+        rows.append((payment - interest, interest))
+        balance -= payment - interest
+    return payment, rows
+
+def test_equal_installments_match_closed_form():
+    principal, interest = build_schedules(AMOUNTS, RATES, INSTALLMENTS, 'equal_installment')
+
+    for i, (amount, rate, n) in enumerate(zip(AMOUNTS, RATES, INSTALLMENTS)):
+        payment, rows = amortize(amount, rate, n)
+        assert principal[i].sum() == pytest.approx(amount, abs=1e-6)
+        # Rounded to paise per installment; the last one takes up the principal remainder
+        assert np.allclose(principal[i, :n - 1], [p for p, _ in rows[:-1]], atol=0.006)
+        assert np.allclose(interest[i, :n], [x for _, x in rows], atol=0.006)
+        assert (principal[i] + interest[i]).sum() == pytest.approx(payment * n, abs=0.01 * n)
+        # Nothing is due past the last installment of a shorter loan
+        assert not principal[i, n:].any() and not interest[i, n:].any()
+
+def test_interest_only_totals():
+    principal, interest = build_schedules(AMOUNTS, RATES, INSTALLMENTS, 'interest_only')
+
+    for i, (amount, rate, n) in enumerate(zip(AMOUNTS, RATES, INSTALLMENTS)):
+        assert list(principal[i, :n]) == [0.0] * (n - 1) + [amount]
+        assert np.allclose(interest[i, :n], round(amount * period_rate(rate), 2))
+        assert (principal[i] + interest[i]).sum() == pytest.approx(amount + n * round(amount * period_rate(rate), 2))
+
+def test_partial_payments_settle_installments_in_order():
+    principal, interest = build_schedules([1200.0], [12.0], [3], 'equal_installment')
+    due = principal[0] + interest[0]
+
+    # Exactly the first installment, then halfway into the second
+    paid_principal, paid_interest, paid = settled(principal, interest, [due[0], due[0] + due[1] / 2])
+    assert list(paid) == [1, 1]
+    assert paid_principal[0] == pytest.approx(principal[0, 0], abs=0.006)
+    assert paid_interest[1] == pytest.approx(interest[0, 0] + interest[0, 1] / 2, abs=0.006)
+    assert paid_principal[1] + paid_interest[1] == pytest.approx(due[0] + due[1] / 2, abs=0.01)
+
+def schedule(loan_id):
+    with app.app_context():
+        return db.session.get(LoanSchedule, loan_id)
+
+def test_installment_repayments_through_api(client, login, make_account, make_loan):
+    admin = make_account('admin')
+    lender = make_account('lender', account_balance=10000.0, interest_rate=12.0)
+    borrower = make_account('borrower', account_balance=5000.0)
+    loan_id = make_loan(borrower, 3000)
+
+    login(client, admin)
+    response = client.put(f'/api/loans/{loan_id}/approve', json={
+        'status': 'approved', 'lender_id': lender.id, 'schedule_type': 'equal_installment', 'installments': 3
+    })
+    assert response.status_code == 200, response.get_json()
+    principal, interest = unpack(schedule(loan_id).amounts)
+    total = schedule(loan_id).total_due
+    assert total == pytest.approx((principal + interest).sum(), abs=0.006)
+
+    # One installment
+    first = round(float(principal[0] + interest[0]), 2)
+    body = client.post(f'/api/loans/{loan_id}/repay', json={'amount': first}).get_json()
+    assert body['paid_installments'] == 1
+    assert body['outstanding'] == pytest.approx(total - first, abs=0.006)
+
+    # More than is left is refused and changes nothing
+    response = client.post(f'/api/loans/{loan_id}/repay', json={'amount': total})
+    assert response.status_code == 400
+    assert schedule(loan_id).amount_paid == pytest.approx(first)
+
+    # The rest, with no amount given, pays the loan off
+    body = client.post(f'/api/loans/{loan_id}/repay').get_json()
+    assert body['message'] == 'Loan repaid successfully'
+    with app.app_context():
+        assert db.session.get(Loan, loan_id).status == 'paid'
+        lender_balance = db.session.get(Lender, lender.id).account_balance
+        borrower_balance = db.session.get(Borrower, borrower.id).account_balance
+    assert lender_balance == pytest.approx(7000.0 + total)
+    assert lender_balance + borrower_balance == pytest.approx(15000.0)
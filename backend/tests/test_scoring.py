@@ -0,0 +1,65 @@
+import json
+from datetime import timedelta
+from app import app, db
+from models import Borrower, LedgerOutbox, Loan
+from overdue import sweep_overdue
+from scoring import recompute_scores
+
+def credit_score(borrower):
+    with app.app_context():
+        return db.session.get(Borrower, borrower.id).credit_score
+
+def replayed(borrower):
+    with app.app_context():
+        for diff in recompute_scores(dry_run=True):
+            if diff['borrower_id'] == borrower.id:
+                return diff['new_score']
+    return credit_score(borrower)
+
+def approve(client, loan_id, lender):
+    response = client.put(f'/api/loans/{loan_id}/approve', json={'status': 'approved', 'lender_id': lender.id})
+    assert response.status_code == 200, response.get_json()
+
+def test_replay_matches_repaid_loan(client, login, make_account, make_loan):
+    admin = make_account('admin')
+    lender = make_account('lender')
+    borrower = make_account('borrower')
+    loan_id = make_loan(borrower, 1000)
+
+    login(client, admin)
+    approve(client, loan_id, lender)
+    assert client.post(f'/api/loans/{loan_id}/repay').status_code == 200
+
+    assert credit_score(borrower) == 750 - 25 + 15 + 5
+    assert replayed(borrower) == credit_score(borrower)
+
+def test_replay_keeps_overdue_penalty_after_repayment(client, login, make_account, make_loan):
+    admin = make_account('admin')
+    lender = make_account('lender')
+    borrower = make_account('borrower')
+    loan_id = make_loan(borrower, 1000)
+
+    login(client, admin)
+    approve(client, loan_id, lender)
+    with app.app_context():
+        loan = db.session.get(Loan, loan_id)
+        loan.due_date = loan.disbursed_at - timedelta(days=1)
+        db.session.commit()
+        sweep_overdue()
+        assert db.session.get(Loan, loan_id).status == 'overdue'
+    assert client.post(f'/api/loans/{loan_id}/repay').status_code == 200
+
+    # Taking the loan, going overdue and repaying late
+    assert credit_score(borrower) == 750 - 25 - 25 - 25
+    assert replayed(borrower) == credit_score(borrower)
+
+def test_rescore_commits_its_ledger_block(make_account):
+    borrower = make_account('borrower', credit_score=1)
+    with app.app_context():
+        diffs = recompute_scores()
+        assert {'borrower_id': borrower.id, 'old_score': 1, 'new_score': 750} in diffs
+        queued = db.session.execute(
+            db.select(LedgerOutbox).where(LedgerOutbox.event_type == 'Credit Scores Recomputed')
+        ).scalars().all()
+    assert len(queued) == 1
+    assert json.loads(queued[0].block_metadata)['changed'] == len(diffs)
@@ -0,0 +1,23 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from collateral_store import verify_collaterals
+
+# Re-hash stored collateral files and compare them with the hashes recorded in the ledger.
+# Exits non-zero when a file is missing, altered or disagrees with its ledger block.
+def main():
+    with app.app_context():
+        problems = verify_collaterals()
+
+    for collateral_id, message in problems:
+        print(f"Collateral {collateral_id}: {message}")
+    if not problems:
+        print("Collateral files match the ledger")
+        return 0
+    print(f"{len(problems)} collateral problems found")
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import sys
+import os
+import argparse
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from ledger import PARALLEL_CHUNK_SIZE, verify_chain
+
+# Full re-audit of the ledger hash chain, hashed in parallel across CPU cores.
+# Meant for nightly jobs; exits non-zero when the chain is broken.
+def main():
+    parser = argparse.ArgumentParser(description='Verify every block of the ledger')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='worker processes (default: number of CPUs)')
+    parser.add_argument('--chunk-size', type=int, default=PARALLEL_CHUNK_SIZE,
+                        help='block ids per worker task')
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.time()
+        result = verify_chain(full=True, workers=args.workers, chunk_size=args.chunk_size)
+        elapsed = time.time() - started
+
+    print(f"Verified {result['verified_blocks']} blocks in {elapsed:.2f}s")
+    if result['is_valid']:
+        print("Ledger is valid")
+        return 0
+
+    print(f"Ledger is INVALID: {result['error_message']}")
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())